@@ -1,8 +1,9 @@
 import yaml
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
+from domain_models import Scaling
 
 class DatabaseConfig(BaseModel):
     postgres_dsn: str
@@ -13,9 +14,20 @@ class PLCConnection(BaseModel):
     host: str
     port: int
     poll_interval: float
+    timeout: float = 3.0  # Modbus request/connect timeout in seconds
+    reconnect_delay: float = 1.0  # Circuit breaker open time after the first trip
+    reconnect_delay_max: float = 30.0  # Ceiling for the exponentially growing open time
+    breaker_failure_threshold: int = 3  # Consecutive failures that open the breaker
+    breaker_jitter: float = 0.2  # +/- fraction of random jitter on the open time
+    max_block_registers: int = 125  # Upper bound for one block read (protocol max 125)
+    pipeline_depth: int = 1  # Max in-flight requests on the socket; 1 = serial
+    report_by_exception: bool = True  # Only decode/dispatch tags whose registers changed
+    integrity_scan_interval: int = 60  # Every N scans decode everything anyway; 0 = never
 
 class PLCConfig(BaseModel):
     connections: List[PLCConnection]
+    broadcast_interval: float = 1.0  # Seconds between plant-wide WebSocket state pushes
+    poll_workers: int = 0  # Worker processes to shard connections across; 0 = poll in the API process
 
 class SecurityConfig(BaseModel):
     algorithm: str
@@ -24,9 +36,21 @@ class SecurityConfig(BaseModel):
 class TagConfig(BaseModel):
     name: str
     address: int
-    type: str
+    type: str  # int16 | uint16 | int32 | uint32 | float32 (float) | float64 | bool | bitfield
     unit: str
     connection_name: Optional[str] = None
+    byte_order: str = "big"  # Byte order inside each register: big | little
+    word_order: str = "big"  # Register order of multi-register values: big | little
+    bit: Optional[int] = None  # Bit index for type 'bitfield'
+    scaling: Optional[Scaling] = None  # Linear raw -> engineering conversion
+    scan_rate_ms: Optional[int] = None  # Scan class; defaults to the connection's poll_interval
+    function: str = "holding"  # holding (FC3) | input (FC4) | coil (FC1) | discrete (FC2)
+    unit_id: int = 1  # Modbus unit/slave id, e.g. an RTU device behind a gateway
+    deadband: float = 0.0  # Absolute change needed to persist; swinging-door deviation
+    deadband_percent: float = 0.0  # Change needed to persist, in % of the last persisted value
+    min_interval: float = 0.0  # Seconds; never persist more often than this
+    max_interval: float = 0.0  # Seconds; persist at least this often (heartbeat), 0 = off
+    compression: str = "deadband"  # deadband | swinging_door
 
 class AlarmConfig(BaseModel):
     tag_name: str
@@ -56,6 +80,42 @@ class VendorControlConfig(BaseModel):
     headers: Optional[dict] = None  # Optional HTTP headers (e.g., API keys)
     device_prefix: str = "nursery_"  # Device ID prefix to identify vendor devices
 
+class HistorianConfig(BaseModel):
+    flush_interval_ms: int = 500  # Max time a sample waits in the write-behind queue
+    batch_rows: int = 5000  # Flush as soon as this many rows are queued
+    max_pending_rows: int = 200000  # Queue bound; older rows spill to the SQLite buffer
+
+class StoreForwardConfig(BaseModel):
+    max_rows: int = 100000  # In-memory budget of the store-and-forward ring
+    overflow: str = "spill"  # spill (to SQLite) | drop_oldest | drop_newest
+    drain_interval: float = 5.0  # Seconds between attempts to drain into Postgres
+    drain_batch: int = 5000  # Rows per bulk write while draining
+
+class HookConfig(BaseModel):
+    timeout: float = 5.0  # Seconds a project logic hook may run before it is cancelled
+    debounce_ms: int = 0  # Wait this long after an input change before running; 0 = next loop turn
+
+class LogicStateConfig(BaseModel):
+    flush_interval_ms: int = 200  # Rule state changes are coalesced and written to Redis this often
+    batch_fields: int = 500  # Fields per HSET while flushing, and per HSCAN page while loading
+
+class ActuatorConfig(BaseModel):
+    coalesce_ms: int = 20  # Commands to one device within this window are sent as one round
+    dedupe: bool = True  # Skip commands equal to the read-back (or last commanded) value
+    command_ttl_s: float = 60.0  # Without a read-back, trust the last commanded value this long (0 = forever)
+    readback_tags: Dict[str, str] = {}  # device_id -> status tag, on top of the `*_status` tags of layout devices
+
+class SinkConfig(BaseModel):
+    max_depth: int = 100  # Pending batches before the overflow policy applies
+    overflow: str = "block"  # block (slow the scan down) | drop_oldest | conflate (merge into the newest batch)
+
+class PipelineConfig(BaseModel):
+    historian: SinkConfig = SinkConfig(max_depth=1000)
+    alarms: SinkConfig = SinkConfig()
+    logic: SinkConfig = SinkConfig(max_depth=10, overflow="conflate")
+    realtime: SinkConfig = SinkConfig(max_depth=10, overflow="conflate")
+    shards: SinkConfig = SinkConfig(max_depth=100, overflow="conflate")  # Messages from poll shard processes
+
 class AppConfig(BaseModel):
     database: DatabaseConfig
     plc: PLCConfig
@@ -64,6 +124,12 @@ class AppConfig(BaseModel):
     alarms: List[AlarmConfig]
     http_sources: Optional[List[HttpSourceConfig]] = []  # HTTP API sources
     vendor_control: Optional[VendorControlConfig] = None  # Vendor HTTP control
+    historian: HistorianConfig = HistorianConfig()
+    hooks: HookConfig = HookConfig()
+    store_forward: StoreForwardConfig = StoreForwardConfig()
+    pipeline: PipelineConfig = PipelineConfig()
+    logic_state: LogicStateConfig = LogicStateConfig()
+    actuators: ActuatorConfig = ActuatorConfig()
 
 class Settings(BaseSettings):
     SECRET_KEY: str
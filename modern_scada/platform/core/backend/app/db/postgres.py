@@ -77,3 +77,57 @@ class PostgresDB:
             res = await conn.fetchrow(query, *args)
             await cls._track_performance(start)
             return res
+
+    @classmethod
+    async def executemany(cls, query: str, args):
+        import time
+        start = time.time()
+        if not cls._pool:
+            raise ConnectionError("PostgreSQL pool is not initialized")
+        async with cls._pool.acquire() as conn:
+            res = await conn.executemany(query, args)
+            await cls._track_performance(start)
+            return res
+
+    @classmethod
+    async def stream(cls, query: str, *args, chunk_size: int = 10000):
+        """
+        Iterate over a large result in chunks of `chunk_size` records using
+        a server-side cursor, so the result never has to fit in memory.
+        """
+        if not cls._pool:
+            raise ConnectionError("PostgreSQL pool is not initialized")
+        async with cls._pool.acquire() as conn:
+            # Cursors only live inside a transaction
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(query, *args, prefetch=chunk_size)
+                while True:
+                    records = await cursor.fetch(chunk_size)
+                    if not records:
+                        break
+                    yield records
+
+    @classmethod
+    async def copy_merge(cls, table: str, columns: list, records, conflict: str):
+        """
+        Bulk load records with COPY into a session-local staging table and
+        merge them into `table`, skipping rows that conflict on `conflict`.
+        """
+        import time
+        start = time.time()
+        if not cls._pool:
+            raise ConnectionError("PostgreSQL pool is not initialized")
+        staging = f"{table}_staging"
+        column_list = ", ".join(columns)
+        async with cls._pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(
+                    f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+                )
+                await conn.copy_records_to_table(staging, records=records, columns=columns)
+                res = await conn.execute(
+                    f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+                    f"ON CONFLICT ({conflict}) DO NOTHING"
+                )
+            await cls._track_performance(start)
+            return res
@@ -32,6 +32,12 @@ class SQLiteDB:
             await db.execute(query, params)
             await db.commit()
 
+    @classmethod
+    async def executemany(cls, query: str, params_list: list):
+        async with aiosqlite.connect(cls._db_path) as db:
+            await db.executemany(query, params_list)
+            await db.commit()
+
     @classmethod
     async def fetch_all(cls, query: str, params: tuple = ()):
         async with aiosqlite.connect(cls._db_path) as db:
@@ -27,6 +27,14 @@ async def lifespan(app: FastAPI):
     logger.info("Starting SCADA Backend...")
     await PostgresDB.connect()
     await SQLiteDB.init()
+    from app.services.historian_writer import HistorianWriter
+    from app.services.store_forward import StoreForwardBuffer
+    HistorianWriter.get().start()
+    StoreForwardBuffer.get().start()
+    from app.services.modbus_read_plan import ReadPlanCache
+    ReadPlanCache.get().rebuild()
+    from app.services.event_processor import EventProcessor
+    EventProcessor().start_pipeline()
     
     # Start Background Workers
     # We use asyncio.create_task to run them in the background
@@ -52,6 +60,11 @@ async def lifespan(app: FastAPI):
         LogicLoader().load_scripts(logic_path)
     else:
         logger.warning("SCADA_PROJECT_PATH not set. Logic Loader skipped.")
+    from app.services.logic_engine import LogicEngine
+    from app.services.logic_state_store import LogicStateStore
+    await LogicEngine().load_states()
+    LogicStateStore.get().start()
+    LogicEngine().start_timers()
     
     yield
     
@@ -62,6 +75,18 @@ async def lifespan(app: FastAPI):
     forwarder_task.cancel()
     monitor_task.cancel()
     historian_task.cancel()
+    from app.services.rule_replay import ReplayJobs
+    await ReplayJobs.get().cancel_all()
+    await EventProcessor().stop_pipeline()
+    await LogicEngine().stop_timers()
+    await LogicStateStore.get().stop()
+    from app.services.actuator_dispatcher import ActuatorDispatcher
+    await ActuatorDispatcher.get().close()
+    LogicLoader().cancel_all()
+    from app.services.modbus_connection_manager import ModbusConnectionManager
+    await ModbusConnectionManager.get().close_all()
+    await HistorianWriter.get().stop()
+    await StoreForwardBuffer.get().stop()
     await PostgresDB.close()
 
 app = FastAPI(title="Modern SCADA Backend", lifespan=lifespan)
@@ -171,9 +196,8 @@ async def health_check():
 
     # Check Redis
     try:
-        from app.services.logic_engine import LogicEngine
-        engine = LogicEngine()
-        if engine.redis and engine.redis.health_check():
+        from app.services.logic_state_store import LogicStateStore
+        if await LogicStateStore.get().health_check():
             status["services"]["redis"] = "up"
         else:
             status["services"]["redis"] = "down"
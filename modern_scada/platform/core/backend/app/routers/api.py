@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List
 from app.auth.dependencies import get_current_user, RoleChecker
-from app.schemas.models import User, SensorData, Alarm, PLCWrite
+from app.schemas.models import User, SensorData, Alarm, PLCWrite, ReplayRequest
 from app.services.event_processor import EventProcessor
 from app.db.postgres import PostgresDB
 from app.config import settings
-from pymodbus.client import AsyncModbusTcpClient
+from app.services.modbus_connection_manager import ModbusConnectionManager
+from app.services.store_forward import StoreForwardBuffer
+from app.services.current_value_table import QUALITY_NAMES, CurrentValueTable
+from app.services.modbus_read_plan import ReadPlanCache
 
 router = APIRouter()
 
@@ -51,6 +54,7 @@ async def update_modbus_config(config: dict):
         from app.config import PLCConnection
         new_conns = [PLCConnection(**c) for c in config['connections']]
         settings.app_config.plc.connections = new_conns
+        ReadPlanCache.get().rebuild()
         
     with open("config.yaml", "w") as f:
         yaml.safe_dump(data, f)
@@ -72,12 +76,37 @@ async def update_tags_config(tags: List[dict]):
     from app.config import TagConfig
     new_tags = [TagConfig(**t) for t in tags]
     settings.app_config.tags = new_tags
+    ReadPlanCache.get().rebuild()
+    from app.services.tag_filter import TagFilterBank
+    TagFilterBank.get().rebuild()
         
     with open("config.yaml", "w") as f:
         yaml.safe_dump(data, f)
         
     return {"status": "success"}
 
+@router.get("/plc/read-plan", dependencies=[Depends(RoleChecker(["admin"]))])
+async def get_read_plan():
+    """
+    Active Modbus block-read plan per PLC connection. `round_trips` is the
+    number of requests a scan of every class of that PLC costs;
+    `scan_classes` maps scan rate (ms) to the tags read at that rate.
+    """
+    cache = ReadPlanCache.get()
+    result = []
+    for conn in settings.app_config.plc.connections:
+        plan = cache.plan_for(conn.name)
+        if plan is not None:
+            result.append({
+                **plan.describe(),
+                "cost_models": [
+                    {"unit": unit, "function": function, **optimizer.describe()}
+                    for (unit, function), optimizer in sorted(cache.connection_optimizers(conn.name).items())
+                ],
+                "scan_classes": {rate: [tag.name for tag in tags] for rate, tags in cache.classes.get(conn.name, {}).items()},
+            })
+    return result
+
 @router.get("/system/status")
 async def get_system_status(current_user: User = Depends(get_current_user)):
     import psutil
@@ -114,9 +143,58 @@ async def get_system_status(current_user: User = Depends(get_current_user)):
         "db_status": db_status,
         "db_stats": db_stats,
         "store_forward_status": sf_status,
-        "store_forward_count": sf_data["count"]
+        "store_forward_count": sf_data["count"],
+        "store_forward_memory": StoreForwardBuffer.get().status(),
+        "current_values": CurrentValueTable.get().status(),
+        "ingest_pipeline": EventProcessor().pipeline_status(),
+        "plc_connections": ModbusConnectionManager.get().status()
     }
     
+@router.get("/tags/current")
+async def get_current_values(since: int = 0, current_user: User = Depends(get_current_user)):
+    """
+    Current tag values with source time and quality. Pass the returned
+    `version` as `since` to get only what changed in between.
+    """
+    version, changes = CurrentValueTable.get().diff(since)
+    return {
+        "version": version,
+        "tags": {
+            name: {"value": tag.value, "time": tag.time, "quality": QUALITY_NAMES[tag.quality]}
+            for name, tag in changes.items()
+        }
+    }
+
+@router.post("/logic/replay", dependencies=[Depends(RoleChecker(["admin"]))])
+async def start_replay(request: ReplayRequest):
+    """
+    Backtest logic rules against recorded sensor data in the background.
+    Poll /logic/replay/{job_id} for progress and the would-be actions.
+    """
+    from app.services.logic_engine import LogicEngine
+    from app.services.rule_replay import ReplayJobs, RuleReplay
+    if request.end <= request.start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    engine = LogicEngine()
+    replay = RuleReplay(
+        request.start, request.end,
+        request.rules if request.rules is not None else engine.rules,
+        request.globals if request.globals is not None else engine.global_settings,
+        request.tags,
+    )
+    job_id = ReplayJobs.get().start(replay)
+    if job_id is None:
+        raise HTTPException(status_code=409, detail="A replay is already running, try again when it has finished")
+    return {"job_id": job_id}
+
+@router.get("/logic/replay/{job_id}", dependencies=[Depends(RoleChecker(["admin"]))])
+async def get_replay(job_id: str):
+    from app.services.rule_replay import ReplayJobs
+    job = ReplayJobs.get().status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Replay job '{job_id}' not found")
+    return job
+
 @router.get("/system/buffer")
 async def get_buffer_details(current_user: User = Depends(get_current_user)):
     from app.db.sqlite import SQLiteDB
@@ -146,9 +224,9 @@ async def write_plc(command: PLCWrite):
         else:
             raise HTTPException(status_code=503, detail="No PLC connections configured")
 
-    client = AsyncModbusTcpClient(target_conn.host, port=target_conn.port)
-    await client.connect()
-    if not client.connected:
+    connections = ModbusConnectionManager.get()
+    client = await connections.get_client(target_conn)
+    if client is None:
         raise HTTPException(status_code=503, detail=f"PLC {target_conn.name} unreachable")
     
     try:
@@ -159,11 +237,13 @@ async def write_plc(command: PLCWrite):
         # Unpack to 2 unsigned shorts (Big Endian)
         payload = list(struct.unpack('>HH', b))
         
-        await client.write_registers(command.address, payload, device_id=1)
+        async with connections.lock(target_conn.name):
+            await client.write_registers(command.address, payload, device_id=1)
     except Exception as e:
+        connections.invalidate(target_conn.name)
+        connections.record_failure(target_conn)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        client.close()
+    connections.record_success(target_conn)
         
     return {"status": "success"}
 
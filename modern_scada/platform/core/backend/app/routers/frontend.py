@@ -41,6 +41,9 @@ async def control_device(payload: dict = Body(...), current_user: User = Depends
     try:
         from app.services.device_control_service import DeviceControlService
         await DeviceControlService.send_control_command(device_id, command, parameter, value)
+        # Keep automatic control from deduplicating against what it wrote before
+        from app.services.actuator_dispatcher import ActuatorDispatcher
+        ActuatorDispatcher.get().record_command(device_id, parameter, value)
         
         tag_name = f"{device_id}_{parameter}"
         EventProcessor().tag_values[tag_name] = value
@@ -151,9 +154,6 @@ async def update_rules(payload: dict = Body(...), current_user: User = Depends(g
     rules = payload.get("rules", [])
     globals_settings = payload.get("globals", {})
     
-    engine = LogicEngine()
-    engine.rules = rules
-    engine.global_settings = globals_settings
-    engine.save_rules()
+    await LogicEngine().update_rules(rules, globals_settings)
     
     return {"success": True, "message": "Rules updated"}
\ No newline at end of file
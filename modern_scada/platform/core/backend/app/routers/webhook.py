@@ -72,28 +72,23 @@ async def receive_nursery_webhook(
         # Initialize EventProcessor
         processor = EventProcessor()
         
-        # Process each data point in the payload
-        processed_count = 0
+        # Collect each data point in the payload
+        samples = []
         for key, value in payload.data.items():
             # Construct tag name: device_id + parameter
             # e.g., "nursery_greenhouse_01_temperature"
             tag_name = f"{payload.device_id}_{key}"
             
-            try:
-                # Convert value to float (SCADA typically uses numeric values)
-                if isinstance(value, (int, float)):
-                    numeric_value = float(value)
-                    
-                    # Inject data into the system
-                    await processor.process_data(tag_name, numeric_value)
-                    processed_count += 1
-                    logger.debug(f"Processed webhook data: {tag_name} = {numeric_value}")
-                else:
-                    logger.warning(f"Non-numeric value for {tag_name}: {value} (type: {type(value).__name__})")
-                    
-            except Exception as e:
-                logger.error(f"Error processing tag {tag_name}: {e}", exc_info=True)
-                # Continue processing other tags even if one fails
+            # Convert value to float (SCADA typically uses numeric values)
+            if isinstance(value, (int, float)):
+                samples.append((tag_name, float(value)))
+                logger.debug(f"Processed webhook data: {tag_name} = {value}")
+            else:
+                logger.warning(f"Non-numeric value for {tag_name}: {value} (type: {type(value).__name__})")
+        
+        # Inject data into the system as one batch
+        await processor.process_batch(samples)
+        processed_count = len(samples)
         
         logger.info(f"✓ Webhook processed successfully: {processed_count}/{len(payload.data)} tags from {payload.device_id}")
         
@@ -127,21 +122,20 @@ async def receive_nursery_batch_webhook(
     """
     try:
         processor = EventProcessor()
-        total_processed = 0
         total_devices = len(payloads)
         
+        samples = []
         for payload in payloads:
             logger.debug(f"Processing batch item: {payload.device_id}")
             
             for key, value in payload.data.items():
                 tag_name = f"{payload.device_id}_{key}"
                 
-                try:
-                    if isinstance(value, (int, float)):
-                        await processor.process_data(tag_name, float(value))
-                        total_processed += 1
-                except Exception as e:
-                    logger.error(f"Batch processing error for {tag_name}: {e}")
+                if isinstance(value, (int, float)):
+                    samples.append((tag_name, float(value)))
+        
+        await processor.process_batch(samples)
+        total_processed = len(samples)
         
         logger.info(f"✓ Batch webhook processed: {total_processed} tags from {total_devices} devices")
         
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 
 class Token(BaseModel):
     access_token: str
@@ -47,3 +47,10 @@ class PLCWrite(BaseModel):
     address: int
     value: float
     connection_name: Optional[str] = None
+
+class ReplayRequest(BaseModel):
+    start: datetime
+    end: datetime
+    tags: Optional[List[str]] = None  # Default: every tag the rules read
+    rules: Optional[List[Dict[str, Any]]] = None  # Default: the loaded rules
+    globals: Optional[Dict[str, Any]] = None  # Default: the loaded global settings
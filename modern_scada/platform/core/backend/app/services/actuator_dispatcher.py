@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import yaml
+from app.config import settings
+from app.services.current_value_table import QUALITY_GOOD, CurrentValueTable
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]  # (device_id, parameter)
+
+def _collect_device_tags(node, tags: Dict[str, str]):
+    if isinstance(node, dict):
+        tag = node.get("tag")
+        # A layout `tag` is what the 3D view shows: a status for actuators, a level for tanks
+        if isinstance(node.get("id"), str) and isinstance(tag, str) and tag.endswith("_status"):
+            tags.setdefault(node["id"], tag)
+        for child in node.values():
+            _collect_device_tags(child, tags)
+    elif isinstance(node, list):
+        for child in node:
+            _collect_device_tags(child, tags)
+
+def load_readback_tags(config_path: Optional[str] = None) -> Dict[str, str]:
+    """
+    device_id -> status tag, from the `*_status` tags of the devices in the
+    project layout (config.yaml `layout`, then layout.json, then
+    site_config.json; the first file naming a device wins).
+    """
+    config_path = config_path or os.getenv("SCADA_PROJECT_PATH", "projects/greenhouse/config")
+    tags: Dict[str, str] = {}
+    for filename in ("config.yaml", "layout.json", "site_config.json"):
+        path = os.path.join(config_path, filename)
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, "r") as f:
+                data = yaml.safe_load(f) if filename.endswith(".yaml") else json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read device tags from {path}: {e}")
+            continue
+        if filename == "config.yaml":
+            data = (data or {}).get("layout")
+        _collect_device_tags(data, tags)
+    return tags
+
+class ActuatorDispatcher:
+    """
+    Front door for automatic (rule and hook) actuator commands.
+
+    - A command whose value equals the device's read-back tag in the
+      current-value table, or without a read-back the value last commanded
+      less than actuators.command_ttl_s ago, is skipped. The status
+      read-back is the `*_status` tag of the device in the project layout
+      (fan_01 -> fan_1_status) or actuators.readback_tags; other
+      parameters read back from `<device_id>_<parameter>`.
+    - Commands are queued per device and sent after actuators.coalesce_ms;
+      a newer value for the same device parameter replaces the queued
+      one, so only the latest is written.
+    - Each device has its own sender task: different devices are written
+      concurrently, commands to one device go out in submission order.
+
+    `send` resolves once the command (or the one that superseded it) was
+    written, and raises if the write failed.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ActuatorDispatcher, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.last_commanded: Dict[Key, Tuple[float, float]] = {}  # -> (value, monotonic time commanded)
+        self.device_tags: Optional[Dict[str, str]] = None  # Status read-back tags, loaded on first use
+        self.pending: Dict[str, "OrderedDict[str, Tuple[str, float, asyncio.Future]]"] = {}  # device -> parameter -> (command, value, future)
+        self.senders: Dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    def readback_tag(self, device_id: str, parameter: str) -> str:
+        if parameter == "status":
+            if self.device_tags is None:
+                self.device_tags = load_readback_tags()
+            tag = settings.app_config.actuators.readback_tags.get(device_id) or self.device_tags.get(device_id)
+            if tag:
+                return tag
+        return f"{device_id}_{parameter}"
+
+    def known_value(self, device_id: str, parameter: str) -> Optional[float]:
+        """Read-back value when the device reports one, else what we last wrote (until it expires)."""
+        readback = CurrentValueTable.get().lookup(self.readback_tag(device_id, parameter))
+        if readback is not None and readback.quality == QUALITY_GOOD:
+            return readback.value
+        commanded = self.last_commanded.get((device_id, parameter))
+        if commanded is None:
+            return None
+        value, commanded_at = commanded
+        ttl = settings.app_config.actuators.command_ttl_s
+        if ttl > 0 and time.monotonic() - commanded_at >= ttl:
+            # The device may have restarted or been switched by hand since
+            del self.last_commanded[(device_id, parameter)]
+            return None
+        return value
+
+    def record_command(self, device_id: str, parameter: str, value: float):
+        """Note a value written to a device, also by paths that bypass `send` (manual control)."""
+        self.last_commanded[(device_id, parameter)] = (value, time.monotonic())
+
+    def send(self, device_id: str, command: str, parameter: str, value: float) -> asyncio.Future:
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
+        loop = asyncio.get_running_loop()
+        device = self.pending.setdefault(device_id, OrderedDict())
+        queued = device.get(parameter)
+
+        if queued is None and settings.app_config.actuators.dedupe and self.known_value(device_id, parameter) == value:
+            metrics.actuator_commands_total.labels(result="deduplicated").inc()
+            done = loop.create_future()
+            done.set_result({"status": "unchanged", "device_id": device_id, "value": value})
+            return done
+
+        if queued is not None:
+            # Supersede the queued value; it moves behind commands submitted since
+            future = queued[2]
+            del device[parameter]
+            metrics.actuator_commands_total.labels(result="coalesced").inc()
+        else:
+            future = loop.create_future()
+        device[parameter] = (command, value, future)
+
+        sender = self.senders.get(device_id)
+        if sender is None or sender.done():
+            self.senders[device_id] = asyncio.create_task(self._drain(device_id))
+        return future
+
+    async def _drain(self, device_id: str):
+        from app.services.device_control_service import DeviceControlService
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
+        device = self.pending[device_id]
+        # Let the commands of one rule or hook run arrive first
+        await asyncio.sleep(settings.app_config.actuators.coalesce_ms / 1000)
+        while device:
+            parameter, (command, value, future) = device.popitem(last=False)
+            # Count it as commanded while in flight so a repeat is not queued behind it
+            self.record_command(device_id, parameter, value)
+            try:
+                result = await DeviceControlService.send_control_command(device_id, command, parameter, value)
+            except Exception as e:
+                metrics.actuator_commands_total.labels(result="failed").inc()
+                self.last_commanded.pop((device_id, parameter), None)
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if isinstance(result, dict) and result.get("status") == "error":
+                metrics.actuator_commands_total.labels(result="failed").inc()
+                self.last_commanded.pop((device_id, parameter), None)
+            else:
+                metrics.actuator_commands_total.labels(result="sent").inc()
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self):
+        for sender in list(self.senders.values()):
+            sender.cancel()
+        for sender in list(self.senders.values()):
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+        for device in self.pending.values():
+            for _, _, future in device.values():
+                if not future.done():
+                    future.cancel()
+            device.clear()
+        self.senders.clear()
@@ -0,0 +1,142 @@
+import logging
+from bisect import bisect_left
+from typing import Dict, List, Mapping, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class TagAlarms:
+    """
+    The high and low rules of one tag, sorted by threshold.
+
+    Triggered high rules are always a prefix of the ascending thresholds
+    (value > t), triggered low rules a prefix of the descending ones
+    (value < t), so a new value is checked with one bisect per direction
+    and only the rules between the old and new prefix length change state.
+    """
+    __slots__ = ("high_thresholds", "high_rules", "high_active", "low_thresholds", "low_rules", "low_active")
+
+    def __init__(self, high: List[Tuple[float, int]], low: List[Tuple[float, int]]):
+        high = sorted(high)
+        low = sorted((-threshold, index) for threshold, index in low)  # Negated: bisect wants ascending
+        self.high_thresholds = tuple(t for t, _ in high)
+        self.high_rules = tuple(i for _, i in high)
+        self.low_thresholds = tuple(t for t, _ in low)
+        self.low_rules = tuple(i for _, i in low)
+        self.high_active = -1  # Length of the active prefix; -1 = unknown (after a rebuild)
+        self.low_active = -1
+
+class AlarmTable:
+    """Immutable compiled alarm configuration; swapped in whole on rebuild."""
+    __slots__ = ("rules", "by_tag")
+
+    def __init__(self, rules: List):
+        self.rules = tuple(rules)
+        high: Dict[str, List[Tuple[float, int]]] = {}
+        low: Dict[str, List[Tuple[float, int]]] = {}
+        for index, rule in enumerate(self.rules):
+            if rule.type == "high":
+                high.setdefault(rule.tag_name, []).append((rule.threshold, index))
+            elif rule.type == "low":
+                low.setdefault(rule.tag_name, []).append((rule.threshold, index))
+            else:
+                logger.warning(f"Ignoring alarm on {rule.tag_name} with unknown type {rule.type}")
+        self.by_tag: Dict[str, TagAlarms] = {
+            tag_name: TagAlarms(high.get(tag_name, []), low.get(tag_name, []))
+            for tag_name in set(high) | set(low)
+        }
+
+class AlarmIndex:
+    """
+    tag_name -> alarm rules index with compact per-rule state.
+
+    `evaluate` takes the changed values of a whole scan and returns only
+    the rules that start or clear. Alarm ids of open alarms are kept per
+    rule index and carried over when the rules are rebuilt.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AlarmIndex, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.table: Optional[AlarmTable] = None
+        self.active = bytearray()  # Per rule index: 1 while the alarm is raised
+        self.alarm_ids: List[Optional[int]] = []  # Per rule index: alarm_history id of the open alarm
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    def rebuild(self, rules: Optional[List] = None):
+        rules = settings.app_config.alarms if rules is None else rules
+        table = AlarmTable(rules)
+
+        # Carry open alarms over to the matching rule of the new table
+        carried: Dict[Tuple, Optional[int]] = {}
+        if self.table is not None:
+            for index, rule in enumerate(self.table.rules):
+                if self.active[index]:
+                    carried[(rule.tag_name, rule.type, rule.threshold, rule.message)] = self.alarm_ids[index]
+
+        active = bytearray(len(table.rules))
+        alarm_ids: List[Optional[int]] = [None] * len(table.rules)
+        for index, rule in enumerate(table.rules):
+            key = (rule.tag_name, rule.type, rule.threshold, rule.message)
+            if key in carried:
+                active[index] = 1
+                alarm_ids[index] = carried.pop(key)
+
+        self.table, self.active, self.alarm_ids = table, active, alarm_ids
+        logger.info(f"Indexed {len(table.rules)} alarm rules over {len(table.by_tag)} tags")
+
+    def evaluate(self, values: Mapping[str, float]) -> List[Tuple[int, bool]]:
+        """
+        Check a batch of new tag values. Returns (rule index, raised) for
+        every rule that changed state; the per-rule state is updated.
+        """
+        if self.table is None:
+            self.rebuild()
+        by_tag = self.table.by_tag
+        transitions: List[Tuple[int, bool]] = []
+        for tag_name, value in values.items():
+            alarms = by_tag.get(tag_name)
+            if alarms is None:
+                continue
+            if alarms.high_rules:
+                count = bisect_left(alarms.high_thresholds, value)
+                alarms.high_active = self._move(alarms.high_rules, alarms.high_active, count, transitions)
+            if alarms.low_rules:
+                count = bisect_left(alarms.low_thresholds, -value)
+                alarms.low_active = self._move(alarms.low_rules, alarms.low_active, count, transitions)
+        return transitions
+
+    def _move(self, rules: Tuple[int, ...], old: int, new: int, transitions: List[Tuple[int, bool]]) -> int:
+        active = self.active
+        if old < 0:
+            # State unknown after a rebuild: compare every rule once
+            for position, index in enumerate(rules):
+                raised = position < new
+                if raised != bool(active[index]):
+                    active[index] = raised
+                    transitions.append((index, raised))
+        elif new > old:
+            for index in rules[old:new]:
+                active[index] = 1
+                transitions.append((index, True))
+        elif new < old:
+            for index in rules[new:old]:
+                active[index] = 0
+                transitions.append((index, False))
+        return new
+
+    def rule(self, index: int):
+        return self.table.rules[index]
+
+    def active_count(self) -> int:
+        return sum(self.active)
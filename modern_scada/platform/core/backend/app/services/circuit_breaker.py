@@ -0,0 +1,84 @@
+import random
+import time
+from enum import Enum
+from typing import Callable
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+# Prometheus gauge encoding
+BREAKER_STATE_VALUES = {BreakerState.CLOSED: 0, BreakerState.HALF_OPEN: 1, BreakerState.OPEN: 2}
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one PLC connection.
+
+    CLOSED: requests flow; `failure_threshold` consecutive failures trip it.
+    OPEN: requests are refused until the reset timeout (with jitter) expires.
+    HALF_OPEN: a single probe is let through; success closes the breaker,
+    failure re-opens it with the timeout doubled up to `max_reset_timeout`.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 1.0,
+                 max_reset_timeout: float = 30.0, jitter: float = 0.2,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.jitter = jitter
+        self.clock = clock
+
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.current_timeout = 0.0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.state == BreakerState.CLOSED:
+            return True
+        if self.state == BreakerState.OPEN:
+            if self.clock() < self.open_until:
+                return False
+            self.state = BreakerState.HALF_OPEN
+            self.probe_in_flight = False
+        # HALF_OPEN: exactly one probe at a time
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        self.state = BreakerState.CLOSED
+        self.failures = 0
+        self.current_timeout = 0.0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == BreakerState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._trip()
+
+    def _trip(self):
+        if self.current_timeout == 0.0:
+            self.current_timeout = self.reset_timeout
+        else:
+            self.current_timeout = min(self.current_timeout * 2, self.max_reset_timeout)
+        spread = self.current_timeout * self.jitter
+        self.open_until = self.clock() + self.current_timeout + random.uniform(-spread, spread)
+        self.state = BreakerState.OPEN
+        self.trips += 1
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state.value,
+            "failures": self.failures,
+            "trips": self.trips,
+            "retry_in": max(self.open_until - self.clock(), 0.0) if self.state == BreakerState.OPEN else 0.0
+        }
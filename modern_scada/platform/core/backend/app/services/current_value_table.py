@@ -0,0 +1,242 @@
+import sys
+import time
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Quality column values
+QUALITY_UNSET = 0  # Id assigned but never written
+QUALITY_GOOD = 1
+QUALITY_BAD = 2  # Source unreachable, value is the last good one
+
+QUALITY_NAMES = {QUALITY_UNSET: "unset", QUALITY_GOOD: "good", QUALITY_BAD: "bad"}
+
+def epoch(ts: datetime) -> float:
+    # Scan timestamps are naive UTC (datetime.utcnow())
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+class TagValue(NamedTuple):
+    value: float
+    time: float  # Epoch seconds of the source sample
+    quality: int
+
+class Snapshot(NamedTuple):
+    """Point-in-time copy of the table columns, indexed by tag id."""
+    version: int
+    names: Tuple[str, ...]
+    values: array
+    times: array
+    quality: bytes
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: self.values[i] for i, name in enumerate(self.names) if self.quality[i] != QUALITY_UNSET}
+
+class TagValuesView(MutableMapping):
+    """
+    `{tag_name: value}` view of the table for code written against the
+    old plain dict. Unwritten tags are absent; assignments are recorded
+    as good samples taken now.
+    """
+    __slots__ = ("table",)
+
+    def __init__(self, table: "CurrentValueTable"):
+        self.table = table
+
+    def __getitem__(self, name: str) -> float:
+        tag_id = self.table.ids.get(name)
+        if tag_id is None or self.table.quality[tag_id] == QUALITY_UNSET:
+            raise KeyError(name)
+        return self.table.values[tag_id]
+
+    def get(self, name: str, default=None):
+        # Hot path for rules and state building: skip the KeyError round trip
+        table = self.table
+        tag_id = table.ids.get(name)
+        if tag_id is None or table.quality[tag_id] == QUALITY_UNSET:
+            return default
+        return table.values[tag_id]
+
+    def __setitem__(self, name: str, value: float):
+        self.table.update(name, value)
+
+    def __delitem__(self, name: str):
+        if name not in self:
+            raise KeyError(name)
+        self.table.clear(name)
+
+    def __contains__(self, name) -> bool:
+        tag_id = self.table.ids.get(name)
+        return tag_id is not None and self.table.quality[tag_id] != QUALITY_UNSET
+
+    def __iter__(self) -> Iterator[str]:
+        table = self.table
+        return (name for tag_id, name in enumerate(table.names) if table.quality[tag_id] != QUALITY_UNSET)
+
+    def __len__(self) -> int:
+        return len(self.table.quality) - self.table.quality.count(QUALITY_UNSET)
+
+class CurrentValueTable:
+    """
+    The authoritative current value of every tag.
+
+    Each tag name is interned and given a stable integer id on first use;
+    value, source timestamp and quality live in parallel columns indexed
+    by that id (`array('d')`, `array('d')`, `bytearray`), so a tag costs a
+    couple of machine words plus its name instead of a dict per sample.
+    Every write bumps a table version and stamps the tag with it, which
+    lets consumers ask for only what changed since they last looked.
+
+    EventProcessor writes to it; LogicEngine, StateBuilder, hooks and the
+    API read the same columns, usually through `view`.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CurrentValueTable, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.values = array("d")
+        self.times = array("d")
+        self.quality = bytearray()
+        self.versions = array("Q")  # Per tag: table version of its last change
+        self.version = 0
+        self.view = TagValuesView(self)
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    @classmethod
+    def standalone(cls) -> "CurrentValueTable":
+        """A private table next to the process-wide one (replay sandboxes)."""
+        table = super(CurrentValueTable, cls).__new__(cls)
+        table.initialize()
+        return table
+
+    def id_of(self, name: str) -> int:
+        """Stable id of a tag, assigned on first use."""
+        tag_id = self.ids.get(name)
+        if tag_id is None:
+            name = sys.intern(name)
+            tag_id = len(self.names)
+            self.ids[name] = tag_id
+            self.names.append(name)
+            self.values.append(0.0)
+            self.times.append(0.0)
+            self.quality.append(QUALITY_UNSET)
+            self.versions.append(0)
+        return tag_id
+
+    def name_of(self, tag_id: int) -> str:
+        return self.names[tag_id]
+
+    def __len__(self):
+        return len(self.names)
+
+    def read(self, tag_id: int) -> TagValue:
+        return TagValue(self.values[tag_id], self.times[tag_id], self.quality[tag_id])
+
+    def lookup(self, name: str) -> Optional[TagValue]:
+        tag_id = self.ids.get(name)
+        if tag_id is None or self.quality[tag_id] == QUALITY_UNSET:
+            return None
+        return self.read(tag_id)
+
+    def update(self, name: str, value: float, timestamp: Optional[datetime] = None) -> bool:
+        """Write one good sample; returns True when the value changed."""
+        changed, _ = self.update_batch(((name, value),), timestamp)
+        return bool(changed)
+
+    def update_batch(self, samples: Iterable[Tuple[str, float]], timestamp: Optional[datetime] = None) -> Tuple[Dict[str, float], List[str]]:
+        """
+        Write a scan of good samples sharing one source timestamp.
+
+        Returns the samples whose value changed (first writes included)
+        and the tags whose quality went from bad back to good.
+        """
+        seconds = epoch(timestamp) if timestamp is not None else time.time()
+        self.version += 1
+        version = self.version
+        ids, values, times, quality, versions = self.ids, self.values, self.times, self.quality, self.versions
+        changed: Dict[str, float] = {}
+        recovered: List[str] = []
+        for name, value in samples:
+            tag_id = ids.get(name)
+            if tag_id is None:
+                tag_id = self.id_of(name)
+            times[tag_id] = seconds
+            previous = quality[tag_id]
+            if previous != QUALITY_GOOD:
+                quality[tag_id] = QUALITY_GOOD
+                versions[tag_id] = version
+                if previous == QUALITY_BAD:
+                    recovered.append(name)
+            if previous == QUALITY_UNSET or values[tag_id] != value:
+                values[tag_id] = value
+                versions[tag_id] = version
+                changed[name] = value
+        return changed, recovered
+
+    def set_quality(self, names: Iterable[str], quality: int) -> List[str]:
+        """Set the quality of known tags; returns those whose quality changed."""
+        self.version += 1
+        updated = []
+        for name in names:
+            tag_id = self.ids.get(name)
+            if tag_id is None or self.quality[tag_id] == quality:
+                continue
+            self.quality[tag_id] = quality
+            self.versions[tag_id] = self.version
+            updated.append(name)
+        return updated
+
+    def clear(self, name: str):
+        """Forget a tag's value; the id stays reserved."""
+        tag_id = self.ids.get(name)
+        if tag_id is not None:
+            self.version += 1
+            self.quality[tag_id] = QUALITY_UNSET
+            self.versions[tag_id] = self.version
+
+    def snapshot(self) -> Snapshot:
+        return Snapshot(
+            self.version,
+            tuple(self.names),
+            array("d", self.values),
+            array("d", self.times),
+            bytes(self.quality),
+        )
+
+    def diff(self, since: int) -> Tuple[int, Dict[str, TagValue]]:
+        """
+        Tags changed after table version `since`, and the current version
+        to pass next time. `since=0` returns everything ever written.
+        """
+        changes = {
+            name: self.read(tag_id)
+            for tag_id, name in enumerate(self.names)
+            if self.versions[tag_id] > since
+        }
+        return self.version, changes
+
+    def status(self) -> dict:
+        return {"tags": len(self.names), "version": self.version, "bytes": self.memory_bytes()}
+
+    def memory_bytes(self) -> int:
+        """Size of the column storage (excluding the interned names)."""
+        return (
+            self.values.itemsize * len(self.values)
+            + self.times.itemsize * len(self.times)
+            + len(self.quality)
+            + self.versions.itemsize * len(self.versions)
+        )
@@ -25,6 +25,15 @@ class DataService:
                 (query, params_json)
             )
 
+    @staticmethod
+    async def buffer_sensor_data_batch(rows: list):
+        """Queue (timestamp, tag_name, value) rows in the SQLite buffer for the forwarder."""
+        query = "INSERT INTO sensor_data (time, tag_name, value) VALUES ($1, $2, $3) ON CONFLICT (time, tag_name) DO NOTHING"
+        await SQLiteDB.executemany(
+            "INSERT INTO buffer (query, params) VALUES (?, ?)",
+            [(query, json.dumps([ts.isoformat(), tag_name, value])) for ts, tag_name, value in rows]
+        )
+
     @staticmethod
     async def save_alarm_event(alarm_data: dict):
         # alarm_data should match alarm_history columns
@@ -62,6 +71,16 @@ class DataService:
             )
             return None
 
+    @staticmethod
+    async def create_alarm(tag_name: str, alarm_type: str, message: str, start_time: datetime, start_value: float):
+        return await DataService.save_alarm_event({
+            "tag_name": tag_name,
+            "alarm_type": alarm_type,
+            "start_time": start_time,
+            "start_value": start_value,
+            "message": message
+        })
+
     @staticmethod
     async def update_alarm_end(alarm_id: int, end_time: datetime, end_value: float):
         if not alarm_id:
@@ -1,7 +1,7 @@
 import logging
 import httpx
 from app.config import settings
-from pymodbus.client import AsyncModbusTcpClient
+from app.services.modbus_connection_manager import ModbusConnectionManager
 
 logger = logging.getLogger(__name__)
 
@@ -96,16 +96,18 @@ class DeviceControlService:
         # Use first connection for now (MVP)
         plc_config = settings.app_config.plc.connections[0]
         
-        client = AsyncModbusTcpClient(plc_config.host, port=plc_config.port)
+        connections = ModbusConnectionManager.get()
         try:
-            await client.connect()
-            if client.connected:
+            client = await connections.get_client(plc_config)
+            if client is not None:
                 # Pack float to 2 words (Big Endian)
                 import struct
                 b = struct.pack('>f', float(value))
                 regs = list(struct.unpack('>HH', b))
                 # Removed slave=1 to avoid potential issues with pyModbusTCP
-                await client.write_registers(target_address, regs) 
+                async with connections.lock(plc_config.name):
+                    await client.write_registers(target_address, regs) 
+                connections.record_success(plc_config)
                 logger.info(f"Modbus control: Wrote {value} to {target_address} for {device_id}")
                 return {"status": "success", "device_id": device_id, "value": value}
             else:
@@ -113,6 +115,6 @@ class DeviceControlService:
                 return {"status": "error", "message": "PLC connection failed"}
         except Exception as e:
             logger.error(f"Modbus control failed: {e}")
+            connections.invalidate(plc_config.name)
+            connections.record_failure(plc_config)
             raise
-        finally:
-            client.close()
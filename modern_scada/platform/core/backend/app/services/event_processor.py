@@ -1,10 +1,18 @@
+import asyncio
 import logging
 from datetime import datetime
-from app.config import settings
+from typing import Dict, Iterable, Optional, Tuple
+from app.services.alarm_index import AlarmIndex
+from app.services.current_value_table import QUALITY_BAD, CurrentValueTable
 from app.services.data_service import DataService
+from app.services.historian_writer import HistorianWriter
+from app.services.ingest_pipeline import SinkQueue
+from app.services.tag_filter import TagFilterBank
 
 logger = logging.getLogger(__name__)
 
+HEARTBEAT_CHECK_INTERVAL = 1.0  # Seconds between max_interval heartbeat checks
+
 class EventProcessor:
     _instance = None
 
@@ -15,122 +23,153 @@ class EventProcessor:
         return cls._instance
 
     def initialize(self):
-        self.tag_values = {}  # {tag_name: value}
-        self.active_alarms = {}  # {tag_name: {alarm_type: alarm_id}}
+        self.table = CurrentValueTable.get()
+        self.tag_values = self.table.view  # {tag_name: value} over the current-value table
         self.subscribers = [] # WebSocket connections
-        self.data_buffer = [] # Store and Forward Buffer
+        self.sinks = {
+            "historian": SinkQueue("historian", self._write_history, lambda old, new: old + new),
+            "realtime": SinkQueue("realtime", self._notify_realtime, lambda old, new: (new[0], {**old[1], **new[1]})),
+            "alarms": SinkQueue("alarms", self._check_alarms, lambda old, new: ({**old[0], **new[0]}, new[1])),
+            "logic": SinkQueue("logic", self._run_logic, lambda old, new: ({**old[0], **new[0]}, old[1] | new[1])),
+        }
+        self.heartbeat_task: Optional[asyncio.Task] = None
 
     async def process_data(self, tag_name: str, value: float):
-        timestamp = datetime.utcnow()
+        await self.process_batch([(tag_name, value)])
+
+    async def process_batch(self, samples: Iterable[Tuple[str, float]], scan_timestamp: Optional[datetime] = None):
+        """
+        Ingest a whole scan at once: one change detection pass into the
+        current-value table and one deadband/compression filter pass, then
+        one batch handed to each sink queue (historian, realtime, alarms,
+        logic). Sinks run on their own tasks, so a slow database or
+        WebSocket client does not stretch the scan; see SinkQueue for the
+        overflow policies. Alarms and logic always see unfiltered values.
+
+        Report-by-exception polling leaves unchanged tags out of `samples`;
+        their max_interval heartbeats come from emit_heartbeats instead.
+        """
+        timestamp = scan_timestamp or datetime.utcnow()
         
         # 1. Check for change
-        last_value = self.tag_values.get(tag_name)
-        if last_value != value:
-            self.tag_values[tag_name] = value
-            
-            # Try to save to DB (Store and Forward)
-            try:
-                # First, try to flush any buffered data if we think we are online
-                if self.data_buffer:
-                    await self.flush_buffer()
-                
-                await DataService.save_sensor_data(tag_name, value, timestamp)
-            except Exception as e:
-                logger.error(f"DB Write Failed: {e}. Buffering data.")
-                self.data_buffer.append({
-                    "tag_name": tag_name,
-                    "value": value,
-                    "timestamp": timestamp
-                })
+        latest = dict(samples)
+        changed, recovered = self.table.update_batch(latest.items(), timestamp)
 
-            # Notify WebSockets
-            await self.broadcast({"type": "data", "tag": tag_name, "value": value, "time": timestamp.isoformat()})
+        if recovered:
+            await self.broadcast({"type": "quality", "quality": "good", "tags": recovered})
         
-        # 2. Check Alarms
-        await self.check_alarms(tag_name, value, timestamp)
+        # Unchanged samples still go through the filter for heartbeats
+        rows = TagFilterBank.get().apply(latest, timestamp)
+        if rows:
+            await self.sinks["historian"].put(rows)
+            await self.sinks["realtime"].put((timestamp, {tag_name: latest[tag_name] for _, tag_name, _ in rows}))
+
+        if changed:
+            await self.sinks["alarms"].put((changed, timestamp))
+
+        if latest:
+            await self.sinks["logic"].put((latest, set(changed)))
+        return changed
 
-        # 3. Evaluate Logic Rules (New)
+    async def _write_history(self, rows):
+        # The write-behind historian never blocks; it batches rows itself
+        HistorianWriter.get().enqueue(rows)
+
+    async def _notify_realtime(self, batch):
+        timestamp, data = batch
+        await self.broadcast({"type": "batch", "time": timestamp.isoformat(), "data": data})
+
+    async def _check_alarms(self, batch):
+        changed, timestamp = batch
+        await self.check_alarms_batch(changed, timestamp)
+
+    async def _run_logic(self, batch):
+        latest, changed = batch
         from app.services.logic_engine import LogicEngine
-        await LogicEngine().evaluate(tag_name, value)
-        
-        # 4. Execute Project Specific Logic Hooks
-        from app.services.logic_loader import LogicLoader
-        # Pass a copy of tag_values to avoid mutation issues, or pass the current update
-        # For simplicity, passing the full state
-        LogicLoader().execute_hooks(self.tag_values)
+        await LogicEngine().evaluate_batch(latest)
 
-    async def flush_buffer(self):
-        """
-        Attempt to write buffered data to the database.
-        """
-        if not self.data_buffer:
-            return
+        # Schedule Project Specific Logic Hooks whose inputs changed
+        if changed:
+            from app.services.logic_loader import LogicLoader
+            LogicLoader().trigger(changed, self.tag_values)
 
-        logger.info(f"Attempting to flush {len(self.data_buffer)} buffered items...")
-        
-        # Copy buffer to avoid modification during iteration if new errors occur
-        # (Though we are async, so single threaded, but safe practice)
-        pending_items = list(self.data_buffer)
-        self.data_buffer = [] # Clear buffer, re-add on failure
-        
-        failed_items = []
-        
-        for item in pending_items:
+    async def emit_heartbeats(self, now: Optional[datetime] = None):
+        """Archive the current value of tags whose max_interval passed without a sample."""
+        rows = TagFilterBank.get().heartbeats(self.table, now or datetime.utcnow())
+        if rows:
+            # Values did not change, so realtime clients already have them
+            await self.sinks["historian"].put(rows)
+
+    async def _heartbeats(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_CHECK_INTERVAL)
             try:
-                await DataService.save_sensor_data(item["tag_name"], item["value"], item["timestamp"])
+                await self.emit_heartbeats()
             except Exception as e:
-                logger.error(f"Flush failed for item {item}: {e}")
-                failed_items.append(item)
-        
-        if failed_items:
-            # Put back failed items (preserve order if possible, or just append)
-            # Here we prepend to keep order relative to new data if we want strict ordering,
-            # but for simplicity, we just put them back.
-            self.data_buffer = failed_items + self.data_buffer
-            raise Exception("Flush incomplete") # Signal that we are still offline
-        
-        logger.info("Buffer flushed successfully.")
+                logger.error(f"Heartbeat error: {e}")
+
+    def start_pipeline(self):
+        for sink in self.sinks.values():
+            sink.start()
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            self.heartbeat_task = asyncio.create_task(self._heartbeats())
+
+    async def stop_pipeline(self):
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            try:
+                await self.heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self.heartbeat_task = None
+        for sink in self.sinks.values():
+            await sink.stop()
+
+    def pipeline_status(self) -> dict:
+        return {name: sink.status() for name, sink in self.sinks.items()}
+
+    async def mark_bad_quality(self, tag_names: Iterable[str]):
+        """
+        Flag tags whose source device is unreachable. Last values are kept
+        but clients are told not to trust them until the next good sample.
+        """
+        newly_bad = self.table.set_quality(tag_names, QUALITY_BAD)
+        if not newly_bad:
+            return
+        await self.broadcast({"type": "quality", "quality": "bad", "tags": newly_bad})
 
     async def check_alarms(self, tag_name: str, value: float, timestamp: datetime):
-        # Find rules for this tag
-        rules = [r for r in settings.app_config.alarms if r.tag_name == tag_name]
-        
-        for rule in rules:
-            is_triggered = False
-            
-            # Check if alarm condition is met
-            if rule.type == "high" and value > rule.threshold:
-                is_triggered = True
-            elif rule.type == "low" and value < rule.threshold:
-                is_triggered = True
-            
-            # Get current alarm status
-            current_alarm_id = self.active_alarms.get(tag_name, {}).get(rule.type)
-            
-            if is_triggered and not current_alarm_id:
+        await self.check_alarms_batch({tag_name: value}, timestamp)
+
+    async def check_alarms_batch(self, values: Dict[str, float], timestamp: datetime):
+        """
+        Check a scan's changed values against the indexed alarm rules and
+        act only on the rules that started or cleared.
+        """
+        index = AlarmIndex.get()
+        for rule_index, raised in index.evaluate(values):
+            rule = index.rule(rule_index)
+            value = values[rule.tag_name]
+            if raised:
                 # New Alarm
                 logger.warning(f"ALARM TRIGGERED: {rule.message}")
-                alarm_id = await DataService.create_alarm(tag_name, rule.type, rule.message, timestamp, value)
-                if tag_name not in self.active_alarms:
-                    self.active_alarms[tag_name] = {}
-                self.active_alarms[tag_name][rule.type] = alarm_id
-                
+                index.alarm_ids[rule_index] = await DataService.create_alarm(
+                    rule.tag_name, rule.type, rule.message, timestamp, value
+                )
                 await self.broadcast({
                     "type": "alarm_start", 
-                    "tag": tag_name, 
+                    "tag": rule.tag_name, 
                     "msg": rule.message,
                     "value": value
                 })
-
-            elif not is_triggered and current_alarm_id:
+            else:
                 # Alarm Cleared
                 logger.info(f"ALARM CLEARED: {rule.message}")
-                await DataService.update_alarm_end(current_alarm_id, timestamp, value)
-                del self.active_alarms[tag_name][rule.type]
-                
+                await DataService.update_alarm_end(index.alarm_ids[rule_index], timestamp, value)
+                index.alarm_ids[rule_index] = None
                 await self.broadcast({
                     "type": "alarm_end", 
-                    "tag": tag_name, 
+                    "tag": rule.tag_name, 
                     "msg": rule.message,
                     "value": value
                 })
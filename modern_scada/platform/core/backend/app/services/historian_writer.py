@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Iterable, List, Optional, Tuple
+import asyncpg
+from app.config import settings
+from app.db.postgres import PostgresDB
+from app.services.data_service import DataService
+from app.services.store_forward import StoreForwardBuffer
+
+logger = logging.getLogger(__name__)
+
+Row = Tuple[datetime, str, float]  # (time, tag_name, value)
+
+# Errors meaning this server or role cannot do COPY into a temp staging table at all
+COPY_UNSUPPORTED_ERRORS = (asyncpg.InsufficientPrivilegeError, asyncpg.FeatureNotSupportedError)
+
+SENSOR_DATA_INSERT = "INSERT INTO sensor_data (time, tag_name, value) VALUES ($1, $2, $3) ON CONFLICT (time, tag_name) DO NOTHING"
+
+class HistorianWriter:
+    """
+    Write-behind queue for sensor_data.
+
+    Ingestion only appends rows; a background task flushes them every
+    historian.flush_interval_ms or as soon as historian.batch_rows are
+    queued. Each batch is COPY'd into a staging table and merged into
+    sensor_data in one transaction, or written with executemany when COPY
+    is unavailable. While Postgres is down batches go to the bounded
+    StoreForwardBuffer, which drains itself in bulk.
+
+    The queue is bounded by historian.max_pending_rows: beyond it the
+    oldest rows are moved to the SQLite buffer instead of growing memory.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(HistorianWriter, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.pending: Deque[Row] = deque()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.copy_supported = True  # Cleared if the server rejects COPY/temp tables
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    def enqueue(self, rows: Iterable[Row]):
+        config = settings.app_config.historian
+        self.pending.extend(rows)
+        from app.services.metrics_service import MetricsService
+        MetricsService.get().historian_queue_depth.set(len(self.pending))
+        if len(self.pending) >= config.batch_rows:
+            self.wakeup.set()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+            logger.info("Started historian writer")
+
+    async def stop(self):
+        """Stop the background task and write out everything still queued."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+        logger.info("Historian writer stopped, queue drained")
+
+    async def _run(self):
+        while True:
+            interval = settings.app_config.historian.flush_interval_ms / 1000
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Historian flush error: {e}")
+
+    async def flush(self):
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
+        config = settings.app_config.historian
+
+        overflow = len(self.pending) - config.max_pending_rows
+        if overflow > 0:
+            spilled = [self.pending.popleft() for _ in range(overflow)]
+            logger.warning(f"Historian queue full, spilling {overflow} rows to the SQLite buffer")
+            await DataService.buffer_sensor_data_batch(spilled)
+            metrics.historian_spilled_rows_total.inc(overflow)
+
+        while self.pending:
+            batch = [self.pending.popleft() for _ in range(min(len(self.pending), config.batch_rows))]
+            metrics.historian_queue_depth.set(len(self.pending))
+            await self._write(batch)
+
+    async def write_rows(self, batch: List[Row]):
+        """
+        Write one batch to Postgres: COPY + merge, or executemany when COPY
+        is not available. Raises if Postgres cannot take the rows.
+        """
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
+        start = time.monotonic()
+
+        if self.copy_supported:
+            try:
+                await PostgresDB.copy_merge("sensor_data", ["time", "tag_name", "value"], batch, "time, tag_name")
+                metrics.historian_rows_written_total.labels(method="copy").inc(len(batch))
+                metrics.historian_flush_duration.observe(time.monotonic() - start)
+                return
+            except COPY_UNSUPPORTED_ERRORS as e:
+                # The server understood us and said no: COPY will not work here.
+                # Anything else (too many connections, deadlock, ...) is raised
+                # and the batch is retried through the store-and-forward buffer.
+                logger.warning(f"Historian COPY rejected ({e}), using executemany from now on")
+                self.copy_supported = False
+
+        await PostgresDB.executemany(SENSOR_DATA_INSERT, batch)
+        metrics.historian_rows_written_total.labels(method="executemany").inc(len(batch))
+        metrics.historian_flush_duration.observe(time.monotonic() - start)
+
+    async def _write(self, batch: List[Row]):
+        buffer = StoreForwardBuffer.get()
+        if not buffer.offline:
+            try:
+                await self.write_rows(batch)
+                return
+            except Exception as e:
+                logger.error(f"Historian write of {len(batch)} rows failed: {e}. Buffering until Postgres is back.")
+        # Offline: keep rows in the store-and-forward buffer; its own task drains it
+        await buffer.push(batch)
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# SinkConfig.overflow values
+OVERFLOW_BLOCK = "block"
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_CONFLATE = "conflate"
+
+Handler = Callable[[Any], Awaitable[None]]
+Merge = Callable[[Any, Any], Any]
+
+class SinkQueue:
+    """
+    Bounded queue plus consumer task feeding one ingestion sink
+    (historian, alarms, logic, realtime) or, for poll shards, the
+    EventProcessor itself.
+
+    The scan only appends a batch and moves on; the sink works through
+    its queue at its own pace, in order. When the queue reaches
+    pipeline.<sink>.max_depth the sink's overflow policy applies:
+
+    - block: the producer waits for room, so a slow sink slows the scan
+      down instead of losing data
+    - drop_oldest: the oldest pending batch is discarded
+    - conflate: the new batch is merged into the newest pending one
+      (`merge`), so the sink only ever sees the latest values
+
+    Before `start` (scripts, tests) batches are handled inline. Once
+    `stop` begins, new batches are rejected (counted as overflow
+    action="rejected").
+    """
+
+    def __init__(self, name: str, handler: Handler, merge: Optional[Merge] = None):
+        self.name = name
+        self.handler = handler
+        self.merge = merge
+        self.items: Deque[Tuple[float, Any]] = deque()  # (queued at, batch)
+        self.ready = asyncio.Event()
+        self.space = asyncio.Event()
+        self.space.set()
+        self.idle = asyncio.Event()  # Cleared while the consumer is inside the handler
+        self.idle.set()
+        self.stopping = False
+        self.task: Optional[asyncio.Task] = None
+
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
+        self.depth = metrics.pipeline_queue_depth.labels(sink=name)
+        self.latency = metrics.pipeline_stage_latency.labels(sink=name)
+        self.overflow = metrics.pipeline_overflow_total
+
+    @property
+    def config(self):
+        return getattr(settings.app_config.pipeline, self.name)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _reject(self) -> bool:
+        if self.stopping:
+            self.overflow.labels(sink=self.name, action="rejected").inc()
+            return True
+        return False
+
+    async def put(self, batch: Any):
+        if self._reject():
+            return
+        if self.task is None:
+            await self._handle(time.monotonic(), batch)
+            return
+
+        config = self.config
+        while len(self.items) >= config.max_depth:
+            if config.overflow == OVERFLOW_CONFLATE and self.merge is not None and self.items:
+                queued_at, pending = self.items[-1]
+                self.items[-1] = (queued_at, self.merge(pending, batch))
+                self.overflow.labels(sink=self.name, action="conflated").inc()
+                return
+            if config.overflow == OVERFLOW_DROP_OLDEST:
+                self.items.popleft()
+                self.overflow.labels(sink=self.name, action="dropped").inc()
+                break
+            self.space.clear()
+            await self.space.wait()
+            if self._reject():
+                return
+
+        self.items.append((time.monotonic(), batch))
+        self.depth.set(len(self.items))
+        self.ready.set()
+
+    async def _handle(self, queued_at: float, batch: Any):
+        try:
+            await self.handler(batch)
+        except Exception as e:
+            logger.error(f"Ingestion sink {self.name} failed: {e}")
+        self.latency.observe(time.monotonic() - queued_at)
+
+    async def _run(self):
+        while True:
+            if not self.items:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            queued_at, batch = self.items.popleft()
+            self.depth.set(len(self.items))
+            self.space.set()
+            self.idle.clear()
+            try:
+                await self._handle(queued_at, batch)
+            finally:
+                self.idle.set()
+
+    def start(self):
+        self.stopping = False
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """
+        Stop accepting batches, let the sink finish the queued ones and the
+        one it is handling (up to `timeout`), then stop it.
+        """
+        if self.task is None:
+            return
+        self.stopping = True
+        self.space.set()  # Release blocked producers; they see `stopping` and give up
+        deadline = time.monotonic() + timeout
+        while (self.items or not self.idle.is_set()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        if self.items:
+            logger.warning(f"Ingestion sink {self.name} stopped with {len(self.items)} batches pending")
+            self.items.clear()
+        self.depth.set(0)
+        self.space.set()
+
+    def status(self) -> dict:
+        config = self.config
+        return {"depth": len(self.items), "max_depth": config.max_depth, "overflow": config.overflow}
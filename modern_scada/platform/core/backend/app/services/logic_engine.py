@@ -1,17 +1,26 @@
+import asyncio
 import logging
 import json
 import os
 import time
-from datetime import datetime
 from typing import Dict, List, Any, Optional
 # from app.services.data_service import DataService
-from services.redis_service import RedisService
+from app.services.current_value_table import CurrentValueTable
+from app.services.logic_state_store import LogicStateStore
+from app.services.logic_rules import STOP_HYSTERESIS, STOP_STANDARD, CompiledGlobals, CompiledRule, compile_rules, local_minute, next_boundary
+from app.services.timer_heap import TimerHeap
 
 logger = logging.getLogger(__name__)
 
+# Timer kinds, keyed as (kind, rule index)
+TIMER_MIN_RUN = 0  # A stop held back by min_run_time becomes allowed
+TIMER_SCHEDULE = 1  # A schedule window of the rule (or its global) opens or closes
+
 class LogicEngine:
     _instance = None
 
+    record_metrics = True  # Off for replay sandboxes, which must not skew live metrics
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(LogicEngine, cls).__new__(cls)
@@ -19,61 +28,47 @@ class LogicEngine:
         return cls._instance
 
     def initialize(self):
-        self.rules = []
-        self.rule_states = {}  # {rule_id: {"active": bool, "last_run": timestamp, "start_time": timestamp}}
-        self.global_settings = {"temp_threshold": 28.0, "hum_threshold": 80.0}
-        self.tag_values = {} # Cache of latest sensor values
+        self.reset(CurrentValueTable.get().view, time.time)
         
         # Path Handling
         self.rules_path = os.getenv("LOGIC_RULES_PATH", "logic_rules.json")
         
-        # Redis Integration
-        try:
-            self.redis = RedisService()
-            if self.redis.health_check():
-                logger.info("LogicEngine: Redis connected.")
-                self.load_states_from_redis()
-            else:
-                logger.warning("LogicEngine: Redis health check failed. Running in memory-only mode.")
-                self.redis = None
-        except Exception as e:
-            logger.error(f"LogicEngine: Failed to connect to Redis: {e}. Running in memory-only mode.")
-            self.redis = None
+        # Redis persistence of rule states (write-behind, async); None for sandboxes
+        self.state_store = LogicStateStore.get()
             
         self.load_rules()
 
-    def load_states_from_redis(self):
-        """Load persisted rule states from Redis."""
-        if not self.redis:
-            return
-            
-        try:
-            # Assuming we store states in a Hash named "scada:logic:states"
-            states = self.redis.client.hgetall("scada:logic:states")
-            for rule_id, state_json in states.items():
-                # Handle Redis Bytes type
-                if isinstance(rule_id, bytes):
-                    rule_id = rule_id.decode('utf-8')
-                if isinstance(state_json, bytes):
-                    state_json = state_json.decode('utf-8')
-
-                try:
-                    self.rule_states[rule_id] = json.loads(state_json)
-                except json.JSONDecodeError:
-                    logger.error(f"Failed to decode state for rule {rule_id}")
-            logger.info(f"Loaded {len(self.rule_states)} rule states from Redis.")
-        except Exception as e:
-            logger.error(f"Failed to load states from Redis: {e}")
+    def reset(self, tag_values, clock):
+        """
+        Empty rules and runtime state. Tag values are read from `tag_values`
+        (the current-value table view) and time from `clock`.
+        """
+        self.rules = []
+        self.rule_states = {}  # {rule_id: {"active": bool, "last_run": timestamp, "start_time": timestamp}}
+        self.global_settings = {"temp_threshold": 28.0, "hum_threshold": 80.0}
+        self.tag_values = tag_values # Latest sensor values, written by EventProcessor
+        self.compiled: List[Optional[CompiledRule]] = []  # Per rule index; None when disabled
+        self.globals = CompiledGlobals(self.global_settings)
+        self.clock = clock
+        self.rules_by_tag: Dict[str, List[int]] = {}  # tag -> indices of rules reading it (primary or ref)
+        self.rules_by_global: Dict[str, List[int]] = {}  # global key -> indices of rules using it
+        self.boundaries: Dict[int, List[int]] = {}  # rule index -> schedule boundaries (minute of day)
+        self.timers = TimerHeap()
+        self.timer_wakeup = asyncio.Event()
+        self.timer_task: Optional[asyncio.Task] = None
 
-    def save_state_to_redis(self, rule_id: str, state: Dict):
-        """Save a single rule state to Redis."""
-        if not self.redis:
+    async def load_states(self):
+        """Load persisted rule states from Redis (called once at startup)."""
+        if self.state_store is None:
             return
-            
-        try:
-            self.redis.client.hset("scada:logic:states", rule_id, json.dumps(state))
-        except Exception as e:
-            logger.error(f"Failed to save state for rule {rule_id} to Redis: {e}")
+        self.rule_states.update(await self.state_store.load())
+        # Running rules may be waiting for their min_run_time
+        self.schedule_timers()
+
+    def save_state(self, rule_id: str, state: Dict):
+        """Queue a rule state for Redis; never waits on the network."""
+        if self.state_store is not None:
+            self.state_store.save(rule_id, state)
 
     def load_rules(self):
         try:
@@ -91,6 +86,122 @@ class LogicEngine:
             self.rules = []
         except Exception as e:
             logger.error(f"Failed to load rules from {self.rules_path}: {e}")
+        self.index_rules()
+
+    def index_rules(self):
+        """
+        Compile the rules and globals into evaluators and build the
+        tag -> rules and global -> rules dependency index, so a batch only
+        evaluates the rules whose primary tag, referenced tag
+        (compareTo == "ref") or global threshold is part of it.
+        """
+        compiled = compile_rules(self.rules)
+        rules_by_tag: Dict[str, List[int]] = {}
+        rules_by_global: Dict[str, List[int]] = {}
+        globals_ = CompiledGlobals(self.global_settings)
+        boundaries: Dict[int, List[int]] = {}
+        for rule in compiled:
+            if rule is None:
+                continue
+            for tag_name in {rule.tag, rule.ref_tag}:
+                if tag_name:
+                    rules_by_tag.setdefault(tag_name, []).append(rule.index)
+            if rule.global_key:
+                rules_by_global.setdefault(rule.global_key, []).append(rule.index)
+            rule_boundaries = rule.schedule_boundaries(globals_)
+            if rule_boundaries:
+                boundaries[rule.index] = rule_boundaries
+        self.compiled = compiled
+        self.globals = globals_
+        self.rules_by_tag = rules_by_tag
+        self.rules_by_global = rules_by_global
+        self.boundaries = boundaries
+        self.schedule_timers()
+
+    def schedule_timers(self):
+        """
+        (Re)arm every timer after the rules were (re)compiled: the next
+        schedule boundary of each scheduled rule, and the min_run_time
+        expiry of each running rule.
+        """
+        self.timers.clear()
+        now = self.clock()
+        for index, rule_boundaries in self.boundaries.items():
+            self.timers.schedule((TIMER_SCHEDULE, index), next_boundary(now, rule_boundaries))
+        for rule in self.compiled:
+            if rule is None or not rule.min_run_time:
+                continue
+            state = self.rule_states.get(rule.id)
+            if state and state["active"] and state["start_time"] + rule.min_run_time > now:
+                self.timers.schedule((TIMER_MIN_RUN, rule.index), state["start_time"] + rule.min_run_time)
+        self.timer_wakeup.set()
+
+    def set_timer(self, key, deadline: float):
+        earliest = self.timers.next_deadline()
+        self.timers.schedule(key, deadline)
+        if earliest is None or deadline < earliest:
+            self.timer_wakeup.set()
+
+    async def fire_timers(self) -> int:
+        """
+        Re-evaluate the rules whose timers expired by now, against the
+        current tag values. Returns how many timers fired.
+        """
+        now = self.clock()
+        due = self.timers.pop_due(now)
+        if not due:
+            return 0
+        indices = set()
+        for kind, index in due:
+            indices.add(index)
+            if kind == TIMER_SCHEDULE:
+                self.timers.schedule((TIMER_SCHEDULE, index), next_boundary(now, self.boundaries[index]))
+        await self.evaluate_rules(indices, {})
+        return len(due)
+
+    async def _run_timers(self):
+        while True:
+            deadline = self.timers.next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - self.clock())
+            try:
+                await asyncio.wait_for(self.timer_wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.timer_wakeup.clear()
+            try:
+                await self.fire_timers()
+            except Exception as e:
+                logger.error(f"Logic timer error: {e}")
+
+    def start_timers(self):
+        if self.timer_task is None or self.timer_task.done():
+            self.timer_task = asyncio.create_task(self._run_timers())
+
+    async def stop_timers(self):
+        if self.timer_task is not None:
+            self.timer_task.cancel()
+            try:
+                await self.timer_task
+            except asyncio.CancelledError:
+                pass
+            self.timer_task = None
+
+    async def update_rules(self, rules: List[Dict], global_settings: Dict):
+        """
+        Replace rules and globals (/api/rules/update), persist them and
+        re-evaluate the rules that depend on globals that changed.
+        """
+        previous = self.global_settings
+        self.rules = rules
+        self.global_settings = global_settings
+        self.save_rules()
+        self.index_rules()
+
+        changed = {key for key in set(previous) | set(global_settings) if previous.get(key) != global_settings.get(key)}
+        if "schedules" in changed:
+            # Scheduled overrides can apply to any global
+            changed |= set(self.rules_by_global)
+        await self.evaluate_globals(changed)
 
     def save_rules(self):
         try:
@@ -105,69 +216,88 @@ class LogicEngine:
             logger.error(f"Failed to save rules to {self.rules_path}: {e}")
 
     async def evaluate(self, tag_name: str, value: float):
-        # Update cache
-        self.tag_values[tag_name] = value
-        
-        for rule in self.rules:
-            if not rule.get("enabled", True):
-                continue
-                
-            condition = rule.get("condition", {})
-            if condition.get("tag") != tag_name:
-                # Also check if this rule uses this tag as a REFERENCE
-                # If so, we might need to re-evaluate even if the primary tag didn't change?
-                # For simplicity, we only trigger on the primary tag for now.
-                continue
+        await self.evaluate_batch({tag_name: value})
 
-            await self.process_rule(rule, value)
+    async def evaluate_batch(self, values: Dict[str, float]):
+        """
+        Evaluate the rules that depend on any tag of one batch of samples.
+        """
+        affected = set()
+        rules_by_tag = self.rules_by_tag
+        for tag_name in values:
+            indices = rules_by_tag.get(tag_name)
+            if indices:
+                affected.update(indices)
+        await self.evaluate_rules(affected, values)
+
+    async def evaluate_globals(self, keys):
+        """Re-evaluate the rules whose threshold comes from one of these globals."""
+        affected = set()
+        for key in keys:
+            affected.update(self.rules_by_global.get(key, ()))
+        await self.evaluate_rules(affected, {})
+
+    async def evaluate_rules(self, indices, values: Dict[str, float]):
+        """
+        Run the given rules in rule order. The primary value comes from the
+        batch when present, otherwise from the current-value table (the
+        rule was woken by its reference tag or a global).
+        """
+        now = self.clock()
+        minute = local_minute(now)
+        evaluated = 0
+        for index in sorted(indices):
+            rule = self.compiled[index]
+            value = values[rule.tag] if rule.tag in values else self.tag_values.get(rule.tag)
+            if value is None:
+                continue
+            await self.process_rule(rule, value, now, minute)
+            evaluated += 1
             
         # Record Metrics
+        if not self.record_metrics:
+            return
         try:
             from app.services.metrics_service import MetricsService
-            MetricsService.get().rules_evaluated_total.inc(len(self.rules))
+            MetricsService.get().rules_evaluated_total.inc(evaluated)
         except Exception:
             pass
 
-    async def process_rule(self, rule: Dict, value: float):
-        rule_id = rule["id"]
-        state = self.rule_states.get(rule_id, {"active": False, "last_run": 0, "start_time": 0})
+    async def process_rule(self, rule: CompiledRule, value: float, now: float, minute: int):
+        rule_id = rule.id
+        state = self.rule_states.get(rule_id)
+        if state is None:
+            state = {"active": False, "last_run": 0, "start_time": 0}
         
         # 1. Check Start Condition
-        should_start = self.check_condition(rule, value)
+        threshold = rule.threshold(self.tag_values, self.globals, minute)
+        should_start = rule.check(value, threshold)
         
         # 2. Check Stop Condition (if active)
         should_stop = False
         if state["active"]:
-            stop_logic = rule.get("stop_condition", {})
-            stop_type = stop_logic.get("type", "standard")
-            
-            if stop_type == "standard":
+            if rule.stop_type == STOP_STANDARD:
                 should_stop = not should_start
-            elif stop_type == "hysteresis":
-                trigger_val = self.get_active_threshold(rule)
-                hysteresis = stop_logic.get("value", 0)
+            elif rule.stop_type == STOP_HYSTERESIS:
                 # Assuming > condition
-                if value < (trigger_val - hysteresis):
-                    should_stop = True
+                should_stop = value < (threshold - rule.hysteresis)
         
         # 3. Apply Constraints (Min Run Time)
-        constraints = rule.get("constraints", {})
-        min_run_time = constraints.get("min_run_time", 0) * 60 # convert mins to seconds
-        now = time.time()
-        
         if state["active"] and should_stop:
             # Check if we CAN stop
             run_duration = now - state["start_time"]
-            if run_duration < min_run_time:
-                logger.info(f"Rule {rule_id} wants to stop but min_run_time ({run_duration:.1f}/{min_run_time}s) not met.")
+            if run_duration < rule.min_run_time:
+                logger.info(f"Rule {rule_id} wants to stop but min_run_time ({run_duration:.1f}/{rule.min_run_time}s) not met.")
                 should_stop = False # Force keep running
+                # Look again when min_run_time is up, even if no new sample arrives
+                self.set_timer((TIMER_MIN_RUN, rule.index), state["start_time"] + rule.min_run_time)
  
         # 4. Execute Actions
         state_changed = False
         if should_start and not state["active"]:
             # START
             logger.info(f"Rule {rule_id} STARTED. Value: {value}")
-            await self.execute_actions(rule["actions"], 1.0)
+            await self.execute_actions(rule.actions, 1.0)
             state["active"] = True
             state["start_time"] = now
             self.rule_states[rule_id] = state
@@ -176,133 +306,37 @@ class LogicEngine:
         elif should_stop and state["active"]:
             # STOP
             logger.info(f"Rule {rule_id} STOPPED. Value: {value}")
-            await self.execute_actions(rule["actions"], 0.0)
+            await self.execute_actions(rule.actions, 0.0)
+            self.timers.cancel((TIMER_MIN_RUN, rule.index))
             state["active"] = False
             self.rule_states[rule_id] = state
             state_changed = True
             
         if state_changed:
-            self.save_state_to_redis(rule_id, state)
+            self.save_state(rule_id, state)
 
-    def get_active_threshold(self, rule: Dict) -> float:
-        """
-        Determine the threshold value, considering time schedules.
-        """
-        base_threshold = self.resolve_value(rule["condition"])
-        
-        schedules = rule.get("schedules", [])
-        if not schedules:
-            return base_threshold
-            
-        now = datetime.now().time()
-        current_time_str = now.strftime("%H:%M")
-        
-        for schedule in schedules:
-            start = schedule.get("start", "00:00")
-            end = schedule.get("end", "23:59")
-            threshold = float(schedule.get("threshold", base_threshold))
-            
-            # Handle overnight schedules (e.g. 22:00 to 06:00)
-            if start <= end:
-                if start <= current_time_str <= end:
-                    return threshold
-            else:
-                # Overnight
-                if current_time_str >= start or current_time_str <= end:
-                    return threshold
-                    
-        return base_threshold
-
-    def check_condition(self, rule: Dict, current_value: float) -> bool:
-        condition = rule.get("condition", {})
-        target_value = self.get_active_threshold(rule)
-        operator = condition.get("operator", ">")
-        
-        if operator == ">":
-            return current_value > target_value
-        elif operator == "<":
-            return current_value < target_value
-        elif operator == "=":
-            return current_value == target_value
-        return False
-
-    def resolve_value(self, condition: Dict) -> float:
-        """
-        Resolve the comparison value. 
-        Can be a static number, a global reference, or another sensor value (Ref).
-        """
-        # 1. Check for Global Reference
-        if "global_ref" in condition and condition["global_ref"]:
-            ref_key = condition["global_ref"]
-            # Use scheduled value if available
-            return self.get_active_global_value(ref_key)
-            
-        # 2. Check for Sensor Reference (compareTo='ref')
-        if condition.get("compareTo") == "ref":
-            ref_tag = condition.get("value") # In ref mode, 'value' holds the tag name
-            offset = float(condition.get("offset", 0))
-            ref_value = self.tag_values.get(ref_tag, 0.0) # Default to 0 if not found
-            return ref_value + offset
-
-        # 3. Static Value
-        return float(condition.get("value", 0))
-
-    def get_active_global_value(self, key: str) -> float:
-        """
-        Get global setting value, respecting time schedules.
-        """
-        base_value = float(self.global_settings.get(key, 0))
-        schedules = self.global_settings.get("schedules", [])
-        
-        if not schedules:
-            return base_value
-            
-        now = datetime.now().time()
-        current_time_str = now.strftime("%H:%M")
-        
-        for schedule in schedules:
-            start = schedule.get("start", "00:00")
-            end = schedule.get("end", "23:59")
-            
-            # Check if time matches
-            is_active = False
-            if start <= end:
-                if start <= current_time_str <= end:
-                    is_active = True
-            else:
-                if current_time_str >= start or current_time_str <= end:
-                    is_active = True
-            
-            if is_active:
-                # Check if this schedule has an override for the requested key
-                # Map key names to schedule fields if necessary
-                # key: "temp_threshold" -> schedule field: "tempThreshold"
-                # key: "hum_threshold" -> schedule field: "humThreshold"
-                
-                if key == "temp_threshold" and "tempThreshold" in schedule:
-                    return float(schedule["tempThreshold"])
-                if key == "hum_threshold" and "humThreshold" in schedule:
-                    return float(schedule["humThreshold"])
-                    
-        return base_value
+    @staticmethod
+    def action_value(action: Dict, value: float) -> float:
+        # If action has specific value (e.g. set speed to 50%), use it. 
+        # Otherwise use the on/off value (1.0/0.0) passed in.
+        # If we are stopping (value=0.0), force 0.0 unless action defines a "off_value"
+        if value == 0.0:
+            return 0.0
+        return action.get("value", value)
 
     async def execute_actions(self, actions: List[Dict], value: float):
         # Ideally, LogicEngine emits events or calls a DeviceService.
-        # For now, we'll simulate or call a helper.
+        # Commands go through the ActuatorDispatcher: unchanged values are
+        # skipped and different devices are written concurrently.
+        from app.services.actuator_dispatcher import ActuatorDispatcher
+        dispatcher = ActuatorDispatcher.get()
         
+        sends = []
         for action in actions:
             device_id = action["device_id"]
-            # If action has specific value (e.g. set speed to 50%), use it. 
-            # Otherwise use the on/off value (1.0/0.0) passed in.
-            cmd_value = action.get("value", value) 
-            
-            # If we are stopping (value=0.0), force 0.0 unless action defines a "off_value"
-            if value == 0.0:
-                cmd_value = 0.0
+            cmd_value = self.action_value(action, value)
             
             logger.info(f"EXECUTE: {device_id} -> {cmd_value}")
-            # Use Unified DeviceControlService
-            from app.services.device_control_service import DeviceControlService
             
             # Logic Engine typically controls "status" (on/off) or "setpoint"
             # We infer parameter based on value type or context, but for now default to "status"
@@ -314,5 +348,9 @@ class LogicEngine:
             parameter = "status"
             command = "SET"
             
-            await DeviceControlService.send_control_command(device_id, command, parameter, cmd_value)
+            sends.append(dispatcher.send(device_id, command, parameter, cmd_value))
 
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
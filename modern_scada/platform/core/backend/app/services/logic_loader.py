@@ -1,8 +1,11 @@
+import asyncio
 import importlib.util
+import inspect
 import os
 import sys
+import time
 import logging
-from typing import List, Callable, Dict, Any
+from typing import List, Callable, Dict, Any, Iterable, Optional, Set
 
 logger = logging.getLogger(__name__)
 
@@ -20,13 +23,49 @@ class LogicContext:
     def __getitem__(self, key):
         return self.tags[key]
 
+class Hook:
+    """
+    A loaded project script entry point and its scheduling state.
+
+    Scripts may declare module-level INPUTS (tag names the hook reads; it
+    only runs when one of them changes), DEBOUNCE_MS and TIMEOUT to override
+    the hooks config.
+    """
+    __slots__ = ("name", "func", "inputs", "debounce", "timeout", "is_async", "task", "pending")
+
+    def __init__(self, name: str, func: Callable, module=None):
+        self.name = name
+        self.func = func
+        inputs = getattr(module, "INPUTS", None)
+        self.inputs: Optional[Set[str]] = set(inputs) if inputs is not None else None
+        debounce_ms = getattr(module, "DEBOUNCE_MS", None)
+        self.debounce: Optional[float] = debounce_ms / 1000 if debounce_ms is not None else None
+        self.timeout: Optional[float] = getattr(module, "TIMEOUT", None)
+        self.is_async = inspect.iscoroutinefunction(func)
+        self.task: Optional[asyncio.Task] = None
+        self.pending = False  # Inputs changed while a run was scheduled or in flight
+
+    def wants(self, changed: Optional[Iterable[str]]) -> bool:
+        if changed is None or self.inputs is None:
+            return True
+        return not self.inputs.isdisjoint(changed)
+
 class LogicLoader:
+    """
+    Loads project logic scripts and runs them when their inputs change.
+
+    Ingestion only calls `trigger` once per scan. Each hook then runs in
+    its own task: at most one run in flight, further triggers coalesced
+    into one follow-up run, async hooks awaited under a timeout, so a slow
+    script delays only itself.
+    """
     _instance = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(LogicLoader, cls).__new__(cls)
-            cls._instance.hooks: List[Callable[[Any], None]] = []
+            cls._instance.hooks: List[Hook] = []
+            cls._instance.tags: Dict[str, Any] = {}
         return cls._instance
 
     def load_scripts(self, logic_dir: str):
@@ -35,9 +74,10 @@ class LogicLoader:
             return
 
         logger.info(f"Loading logic scripts from: {logic_dir}")
+        self.cancel_all()
         self.hooks = [] # Reset hooks
 
-        for filename in os.listdir(logic_dir):
+        for filename in sorted(os.listdir(logic_dir)):
             if filename.endswith(".py") and not filename.startswith("__"):
                 try:
                     module_name = filename[:-3]
@@ -49,10 +89,10 @@ class LogicLoader:
                         spec.loader.exec_module(module)
                         
                         if hasattr(module, "run"):
-                            self.hooks.append(module.run)
+                            self.hooks.append(Hook(module_name, module.run, module))
                             logger.info(f"✅ Loaded Logic Hook: {module_name}")
                         elif hasattr(module, "process_tags"): # 兼容舊版命名
-                            self.hooks.append(module.process_tags)
+                            self.hooks.append(Hook(module_name, module.process_tags, module))
                             logger.info(f"✅ Loaded Logic Hook (legacy): {module_name}")
                         else:
                             logger.debug(f"Skipped {filename}: No 'run' or 'process_tags' function found.")
@@ -60,11 +100,56 @@ class LogicLoader:
                     logger.error(f"❌ Failed to load script {filename}: {e}")
 
     def execute_hooks(self, tags: Dict[str, Any]):
+        """Schedule every hook regardless of its declared inputs."""
+        self.trigger(None, tags)
+
+    def trigger(self, changed: Optional[Iterable[str]], tags: Dict[str, Any]):
+        """
+        Schedule the hooks whose inputs are among `changed` (all hooks when
+        None). `tags` is the live tag table the hooks read through
+        LogicContext. Returns immediately.
+        """
+        self.tags = tags
+        if changed is not None and not isinstance(changed, (set, frozenset)):
+            changed = set(changed)
+        for hook in self.hooks:
+            if not hook.wants(changed):
+                continue
+            hook.pending = True
+            if hook.task is None or hook.task.done():
+                hook.task = asyncio.create_task(self._drive(hook))
+
+    async def _drive(self, hook: Hook):
+        from app.config import settings
+        config = settings.app_config.hooks
+        debounce = hook.debounce if hook.debounce is not None else config.debounce_ms / 1000
+        while hook.pending:
+            # Let triggers of the same scan or debounce window pile up into one run
+            await asyncio.sleep(debounce)
+            hook.pending = False
+            await self._run(hook, hook.timeout if hook.timeout is not None else config.timeout)
+
+    async def _run(self, hook: Hook, timeout: float):
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
         # [修正] 將 dict 包裝成 Context 物件再傳給腳本
-        context = LogicContext(tags)
-        
+        context = LogicContext(self.tags)
+        start = time.monotonic()
+        try:
+            if hook.is_async:
+                await asyncio.wait_for(hook.func(context), timeout=timeout)
+            else:
+                hook.func(context)
+        except asyncio.TimeoutError:
+            logger.error(f"❌ Logic Hook {hook.name} timed out after {timeout}s")
+            metrics.hook_failures_total.labels(hook=hook.name, reason="timeout").inc()
+        except Exception as e:
+            logger.error(f"❌ Logic Hook Error in {hook.name}: {e}")
+            metrics.hook_failures_total.labels(hook=hook.name, reason="error").inc()
+        finally:
+            metrics.hook_duration.labels(hook=hook.name).observe(time.monotonic() - start)
+
+    def cancel_all(self):
         for hook in self.hooks:
-            try:
-                hook(context)
-            except Exception as e:
-                logger.error(f"❌ Logic Hook Error: {e}")
\ No newline at end of file
+            if hook.task is not None and not hook.task.done():
+                hook.task.cancel()
@@ -0,0 +1,202 @@
+import logging
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Condition operators
+OP_GT = 1
+OP_LT = 2
+OP_EQ = 3
+OPERATORS = {">": OP_GT, "<": OP_LT, "=": OP_EQ}
+
+# Where a rule's comparison value comes from
+SOURCE_STATIC = 0
+SOURCE_REF = 1  # Another tag plus an offset (compareTo == "ref")
+SOURCE_GLOBAL = 2  # A global setting, possibly overridden by a global schedule
+
+# Stop conditions
+STOP_STANDARD = 0  # Stop as soon as the start condition is false
+STOP_HYSTERESIS = 1  # Stop once the value falls `hysteresis` below the threshold
+STOP_NEVER = 2  # Unknown stop type: only a restart can stop the rule
+STOP_TYPES = {"standard": STOP_STANDARD, "hysteresis": STOP_HYSTERESIS}
+
+MINUTES_PER_DAY = 24 * 60
+
+# Global setting key -> field that overrides it in a global schedule
+GLOBAL_SCHEDULE_FIELDS = {"temp_threshold": "tempThreshold", "hum_threshold": "humThreshold"}
+
+def parse_minute(hhmm: str) -> int:
+    """'HH:MM' -> minute of day."""
+    hours, minutes = hhmm.split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+def local_minute(now: float) -> int:
+    """Local minute of day of an epoch timestamp."""
+    local = time.localtime(now)
+    return local.tm_hour * 60 + local.tm_min
+
+def next_boundary(now: float, boundaries: List[int]) -> float:
+    """
+    Epoch time of the first boundary minute after the current local minute.
+    Goes through the local calendar (mktime), so days of a DST change are
+    23 or 25 hours long; a boundary inside a skipped hour fires when local
+    time jumps over it.
+    """
+    local = time.localtime(now)
+    minute = local.tm_hour * 60 + local.tm_min
+    ahead = min((boundary - minute) % MINUTES_PER_DAY or MINUTES_PER_DAY for boundary in boundaries)
+    days, target = divmod(minute + ahead, MINUTES_PER_DAY)
+    # mktime normalises the day overflow; tm_isdst=-1 lets it pick the offset in force then
+    deadline = time.mktime((local.tm_year, local.tm_mon, local.tm_mday + days, target // 60, target % 60, 0, 0, 0, -1))
+    minute_start = now - local.tm_sec - (now % 1)
+    return max(deadline, minute_start + 60)
+
+class ScheduleWindow:
+    """
+    A daily [start, end] window in minutes of day; both ends inclusive,
+    end < start wraps over midnight (22:00 - 06:00).
+    """
+    __slots__ = ("start", "end", "value")
+
+    def __init__(self, start: int, end: int, value: Optional[float]):
+        self.start = start
+        self.end = end
+        self.value = value  # None: the window applies but does not override
+
+    @classmethod
+    def from_config(cls, schedule: Dict, value: Optional[float]) -> "ScheduleWindow":
+        return cls(parse_minute(schedule.get("start", "00:00")), parse_minute(schedule.get("end", "23:59")), value)
+
+    def contains(self, minute: int) -> bool:
+        if self.start <= self.end:
+            return self.start <= minute <= self.end
+        return minute >= self.start or minute <= self.end
+
+class CompiledGlobals:
+    """Global settings with their schedule overrides pre-parsed per key."""
+    __slots__ = ("base", "windows")
+
+    def __init__(self, global_settings: Dict):
+        self.base: Dict[str, float] = {}
+        for key, value in global_settings.items():
+            if key == "schedules":
+                continue
+            try:
+                self.base[key] = float(value)
+            except (TypeError, ValueError):
+                pass
+
+        # Per key, every schedule window in order; `value` takes the first
+        # active window that overrides the key (value is not None)
+        self.windows: Dict[str, Tuple[ScheduleWindow, ...]] = {}
+        schedules = global_settings.get("schedules") or []
+        for key, field in GLOBAL_SCHEDULE_FIELDS.items():
+            self.windows[key] = tuple(
+                ScheduleWindow.from_config(schedule, float(schedule[field]) if field in schedule else None)
+                for schedule in schedules
+            )
+
+    def value(self, key: str, minute: int) -> float:
+        for window in self.windows.get(key, ()):
+            if window.contains(minute) and window.value is not None:
+                return window.value
+        return self.base.get(key, 0.0)
+
+class CompiledRule:
+    """
+    One logic rule with everything parsed at load time: operator code,
+    comparison source and constants, schedule windows in minutes of day,
+    stop condition and min run time in seconds. `check` and `threshold`
+    only compare floats and ints.
+    """
+    __slots__ = (
+        "index", "id", "config", "tag", "operator", "source", "static_value", "ref_tag", "offset",
+        "global_key", "windows", "hysteresis", "stop_type", "min_run_time", "actions",
+    )
+
+    def __init__(self, index: int, rule: Dict):
+        condition = rule.get("condition", {})
+        self.index = index
+        self.id = rule["id"]
+        self.config = rule
+        self.tag = condition.get("tag")
+        self.operator = OPERATORS.get(condition.get("operator", ">"), 0)
+        if not self.operator:
+            logger.warning(f"Rule {self.id} has unknown operator {condition.get('operator')}, it will never start")
+
+        self.static_value = 0.0
+        self.ref_tag = None
+        self.offset = 0.0
+        self.global_key = None
+        if condition.get("global_ref"):
+            self.source = SOURCE_GLOBAL
+            self.global_key = condition["global_ref"]
+        elif condition.get("compareTo") == "ref":
+            self.source = SOURCE_REF
+            self.ref_tag = condition.get("value")  # In ref mode, 'value' holds the tag name
+            self.offset = float(condition.get("offset", 0))
+        else:
+            self.source = SOURCE_STATIC
+            self.static_value = float(condition.get("value", 0))
+
+        self.windows = tuple(
+            ScheduleWindow.from_config(schedule, float(schedule["threshold"]) if "threshold" in schedule else None)
+            for schedule in rule.get("schedules", [])
+        )
+
+        stop_logic = rule.get("stop_condition", {})
+        self.stop_type = STOP_TYPES.get(stop_logic.get("type", "standard"), STOP_NEVER)
+        self.hysteresis = float(stop_logic.get("value", 0))
+        self.min_run_time = float(rule.get("constraints", {}).get("min_run_time", 0)) * 60  # Minutes -> seconds
+        self.actions = tuple(rule.get("actions", []))
+
+    def base_threshold(self, values: Mapping[str, float], globals_: CompiledGlobals, minute: int) -> float:
+        if self.source == SOURCE_STATIC:
+            return self.static_value
+        if self.source == SOURCE_REF:
+            return values.get(self.ref_tag, 0.0) + self.offset  # Default to 0 if not found
+        return globals_.value(self.global_key, minute)
+
+    def threshold(self, values: Mapping[str, float], globals_: CompiledGlobals, minute: int) -> float:
+        """Comparison value at this minute of day, schedule windows first."""
+        for window in self.windows:
+            if window.contains(minute):
+                if window.value is not None:
+                    return window.value
+                break
+        return self.base_threshold(values, globals_, minute)
+
+    def schedule_boundaries(self, globals_: CompiledGlobals) -> List[int]:
+        """Minutes of day at which this rule's threshold can change."""
+        windows = self.windows
+        if self.source == SOURCE_GLOBAL:
+            windows += globals_.windows.get(self.global_key, ())
+        boundaries = set()
+        for window in windows:
+            boundaries.add(window.start)
+            boundaries.add((window.end + 1) % MINUTES_PER_DAY)  # The end minute is inclusive
+        return sorted(boundaries)
+
+    def check(self, value: float, threshold: float) -> bool:
+        if self.operator == OP_GT:
+            return value > threshold
+        if self.operator == OP_LT:
+            return value < threshold
+        if self.operator == OP_EQ:
+            return value == threshold
+        return False
+
+def compile_rules(rules: List[Dict]) -> List[Optional[CompiledRule]]:
+    """Compile rules by index; disabled or invalid rules compile to None."""
+    compiled: List[Optional[CompiledRule]] = []
+    for index, rule in enumerate(rules):
+        if not rule.get("enabled", True):
+            compiled.append(None)
+            continue
+        try:
+            compiled.append(CompiledRule(index, rule))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Skipping invalid logic rule {rule.get('id', index)}: {e}")
+            compiled.append(None)
+    return compiled
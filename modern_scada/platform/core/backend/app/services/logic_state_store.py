@@ -0,0 +1,145 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional
+from app.config import settings
+from services.redis_service import RedisService
+
+logger = logging.getLogger(__name__)
+
+STATES_KEY = "scada:logic:states"
+
+class LogicStateStore:
+    """
+    Write-behind persistence of LogicEngine rule states in the Redis hash
+    scada:logic:states, over the async Redis client.
+
+    `save` only records the latest state of a rule; a background task
+    flushes the changed rules every logic_state.flush_interval_ms as HSETs
+    of up to logic_state.batch_fields fields, pipelined in one round trip.
+    A rule that changes several times between flushes is written once.
+    If Redis is unreachable the states stay queued and are retried.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LogicStateStore, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.redis = RedisService()
+        self.client = None
+        self.dirty: Dict[str, str] = {}  # {rule_id: state JSON} not written yet
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.available = True  # Cleared while Redis is unreachable, to log once
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    async def _client(self):
+        if self.client is None:
+            self.client = await self.redis.get_async_client()
+        return self.client
+
+    def save(self, rule_id: str, state: Dict):
+        self.dirty[rule_id] = json.dumps(state)
+        self.wakeup.set()
+
+    async def load(self) -> Dict[str, Dict]:
+        """All persisted states, read in HSCAN pages instead of one HGETALL."""
+        states: Dict[str, Dict] = {}
+        try:
+            client = await self._client()
+            async for rule_id, state_json in client.hscan_iter(STATES_KEY, count=settings.app_config.logic_state.batch_fields):
+                try:
+                    states[rule_id] = json.loads(state_json)
+                except json.JSONDecodeError:
+                    logger.error(f"Failed to decode state for rule {rule_id}")
+            logger.info(f"Loaded {len(states)} rule states from Redis.")
+        except Exception as e:
+            logger.error(f"Failed to load states from Redis: {e}")
+        return states
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
+        batch_fields = settings.app_config.logic_state.batch_fields
+        pending, self.dirty = self.dirty, {}
+        start = time.monotonic()
+        saved = False
+        try:
+            client = await self._client()
+            items = list(pending.items())
+            async with client.pipeline(transaction=False) as pipe:
+                for i in range(0, len(items), batch_fields):
+                    pipe.hset(STATES_KEY, mapping=dict(items[i:i + batch_fields]))
+                await pipe.execute()
+            saved = True
+        except Exception as e:
+            if self.available:
+                logger.error(f"Failed to save {len(pending)} rule states to Redis: {e}. Retrying in the background.")
+            self.available = False
+        finally:
+            if not saved:
+                # Keep what did not make it, also when cancelled mid-write,
+                # unless the rule changed again meanwhile
+                for rule_id, state_json in pending.items():
+                    self.dirty.setdefault(rule_id, state_json)
+        if saved:
+            if not self.available:
+                logger.info("Redis is back, rule states saved")
+            self.available = True
+            metrics.logic_state_flush_duration.observe(time.monotonic() - start)
+        metrics.logic_state_pending.set(len(self.dirty))
+
+    async def _run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Logic state flush error: {e}")
+            # Coalesce everything that changes until the next flush
+            await asyncio.sleep(settings.app_config.logic_state.flush_interval_ms / 1000)
+            if self.dirty:
+                self.wakeup.set()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stop the background task and write out what is still queued,
+        including the states of a flush the cancel interrupted.
+        """
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        # The pool belongs to this store's RedisService
+        await self.redis.close_async_pool()
+
+    async def health_check(self) -> bool:
+        try:
+            client = await self._client()
+            return await client.ping()
+        except Exception:
+            return False
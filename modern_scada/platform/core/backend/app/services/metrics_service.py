@@ -21,6 +21,84 @@ class MetricsService:
             "Time spent polling PLCs",
             ["connection"]
         )
+        self.scan_overruns_total = Counter(
+            "scada_scan_overruns_total",
+            "Total number of scan ticks missed because a scan ran past its deadline",
+            ["connection"]
+        )
+        self.scan_jitter = Histogram(
+            "scada_scan_jitter_seconds",
+            "Delay between a scan's scheduled and actual start time",
+            ["connection"],
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+        )
+
+        # Modbus Connection Metrics
+        self.modbus_connection_reuse_total = Counter(
+            "scada_modbus_connection_reuse_total",
+            "Total number of Modbus requests served by an already open connection",
+            ["connection"]
+        )
+        self.modbus_reconnects_total = Counter(
+            "scada_modbus_reconnects_total",
+            "Total number of Modbus reconnects after a dropped connection",
+            ["connection"]
+        )
+        self.modbus_connect_duration = Histogram(
+            "scada_modbus_connect_duration_seconds",
+            "Time spent establishing Modbus TCP connections",
+            ["connection"]
+        )
+        self.plc_breaker_state = Gauge(
+            "scada_plc_breaker_state",
+            "PLC circuit breaker state (0=closed, 1=half-open, 2=open)",
+            ["connection"]
+        )
+
+        # Historian Metrics
+        self.historian_queue_depth = Gauge(
+            "scada_historian_queue_depth",
+            "Rows waiting in the historian write-behind queue"
+        )
+        self.historian_rows_written_total = Counter(
+            "scada_historian_rows_written_total",
+            "Total number of rows written to the historian",
+            ["method"]
+        )
+        self.historian_spilled_rows_total = Counter(
+            "scada_historian_spilled_rows_total",
+            "Total number of rows moved to the SQLite buffer because the queue was full"
+        )
+        self.historian_flush_duration = Histogram(
+            "scada_historian_flush_duration_seconds",
+            "Time spent writing one historian batch"
+        )
+
+        # Store & Forward Metrics
+        self.store_forward_depth = Gauge(
+            "scada_store_forward_depth",
+            "Rows held in the in-memory store-and-forward buffer"
+        )
+        self.store_forward_spilled_total = Counter(
+            "scada_store_forward_spilled_total",
+            "Total number of rows moved from memory to the SQLite buffer"
+        )
+        self.store_forward_dropped_total = Counter(
+            "scada_store_forward_dropped_total",
+            "Total number of rows discarded by the store-and-forward overflow policy"
+        )
+
+        # Tag Filter Metrics (compression ratio = received / archived)
+        self.tag_samples_received_total = Counter(
+            "scada_tag_samples_received_total",
+            "Total number of samples offered to the tag persistence filter",
+            ["tag"]
+        )
+        self.tag_samples_archived_total = Counter(
+            "scada_tag_samples_archived_total",
+            "Total number of samples the tag persistence filter let through",
+            ["tag"]
+        )
 
         # Logic Engine Metrics
         self.rules_evaluated_total = Counter(
@@ -33,6 +111,49 @@ class MetricsService:
             ["severity"]
         )
 
+        self.logic_state_pending = Gauge(
+            "scada_logic_state_pending",
+            "Rule states changed but not written to Redis yet"
+        )
+        self.logic_state_flush_duration = Histogram(
+            "scada_logic_state_flush_duration_seconds",
+            "Time taken to write a batch of rule states to Redis"
+        )
+
+        self.actuator_commands_total = Counter(
+            "scada_actuator_commands_total",
+            "Actuator commands by outcome (sent, deduplicated, coalesced, failed)",
+            ["result"]
+        )
+
+        self.hook_duration = Histogram(
+            "scada_hook_duration_seconds",
+            "Run time of project logic hooks",
+            ["hook"]
+        )
+        self.hook_failures_total = Counter(
+            "scada_hook_failures_total",
+            "Total number of project logic hook runs that raised or timed out",
+            ["hook", "reason"]
+        )
+
+        # Ingestion Pipeline Metrics
+        self.pipeline_queue_depth = Gauge(
+            "scada_pipeline_queue_depth",
+            "Batches waiting in an ingestion sink queue",
+            ["sink"]
+        )
+        self.pipeline_stage_latency = Histogram(
+            "scada_pipeline_stage_latency_seconds",
+            "Time from a scan being queued for a sink to the sink finishing it",
+            ["sink"]
+        )
+        self.pipeline_overflow_total = Counter(
+            "scada_pipeline_overflow_total",
+            "Total number of batches dropped or conflated because a sink queue was full",
+            ["sink", "action"]
+        )
+
         # Integration Metrics
         self.external_sync_errors = Counter(
             "scada_external_sync_errors", 
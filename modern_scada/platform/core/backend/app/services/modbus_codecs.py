@@ -0,0 +1,173 @@
+import struct
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# TagConfig.type -> (struct format char, register count)
+TYPE_FORMATS = {
+    "int16": ("h", 1),
+    "uint16": ("H", 1),
+    "int32": ("i", 2),
+    "uint32": ("I", 2),
+    "float32": ("f", 2),
+    "float": ("f", 2),  # Legacy name used by existing configs
+    "float64": ("d", 4),
+    "double": ("d", 4),
+    "bool": ("H", 1),
+    "bitfield": ("H", 1),
+}
+
+# TagConfig.function -> Modbus read function code
+FUNCTION_CODES = {"coil": 1, "discrete": 2, "holding": 3, "input": 4}
+BIT_FUNCTIONS = ("coil", "discrete")
+
+def is_bit_function(function: str) -> bool:
+    return function in BIT_FUNCTIONS
+
+def register_count(tag) -> int:
+    """Registers (or bits, for coils/discrete inputs) a tag occupies."""
+    if is_bit_function(tag.function):
+        return 1
+    return TYPE_FORMATS.get(tag.type, TYPE_FORMATS["float32"])[1]
+
+def _byteswap(register: int) -> int:
+    return ((register & 0xFF) << 8) | (register >> 8)
+
+def _post_processor(tag) -> Optional[Callable[[float], float]]:
+    """
+    Build the raw -> engineering conversion for a tag, or None when the raw
+    value is used as-is.
+    """
+    if tag.type == "bool":
+        return lambda raw: 1.0 if raw else 0.0
+    if tag.type == "bitfield":
+        bit = tag.bit or 0
+        return lambda raw: float((raw >> bit) & 1)
+    if tag.scaling is not None:
+        s = tag.scaling
+        span = s.raw_max - s.raw_min
+        gain = (s.eng_max - s.eng_min) / span if span else 0.0
+        offset = s.eng_min - s.raw_min * gain
+        return lambda raw: raw * gain + offset
+    return None
+
+class TagCodec:
+    """
+    Decoder for a single tag. Registers are normalised to big-endian byte
+    and word order before unpacking, so one struct format serves every
+    byte/word order combination. Coil and discrete input tags are a
+    single bit.
+    """
+    __slots__ = ("fmt", "count", "bits", "swap_words", "swap_bytes", "post", "_struct")
+
+    def __init__(self, tag):
+        self.bits = is_bit_function(tag.function)
+        self.fmt, self.count = ("?", 1) if self.bits else TYPE_FORMATS.get(tag.type, TYPE_FORMATS["float32"])
+        self.swap_words = tag.word_order == "little" and self.count > 1
+        self.swap_bytes = tag.byte_order == "little"
+        self.post = _post_processor(tag)
+        self._struct = struct.Struct(f">{self.fmt}")
+
+    def normalise(self, registers: Sequence[int]) -> List[int]:
+        regs = list(registers)
+        if self.swap_words:
+            regs.reverse()
+        if self.swap_bytes:
+            regs = [_byteswap(r) for r in regs]
+        return regs
+
+    def decode(self, registers: Sequence[int]) -> float:
+        if self.bits:
+            return 1.0 if registers[0] else 0.0
+        raw = self._struct.unpack(struct.pack(f">{self.count}H", *self.normalise(registers)))[0]
+        return float(raw) if self.post is None else self.post(raw)
+
+class BlockDecoder:
+    """
+    Decodes every tag of a block read in one pass: the register block is
+    permuted/byte-swapped once, packed once and unpacked with a single
+    precompiled struct format that skips unmapped registers with pad bytes.
+    """
+    __slots__ = ("count", "names", "perm", "swap", "posts", "slots", "_pack", "_unpack", "_overlapping")
+
+    def __init__(self, count: int, slots: Sequence[Tuple[str, int, TagCodec]]):
+        self.count = count
+        self.slots = tuple(slots)
+        perm = list(range(count))
+        swap = []
+        fmt = [">"]
+        cursor = 0
+        names = []
+        posts = []
+        overlapping = []
+        for name, offset, codec in sorted(slots, key=lambda s: s[1]):
+            if offset < cursor or offset + codec.count > count:
+                # Overlaps a previous tag (or runs off the block); cannot share the format
+                overlapping.append((name, offset, codec))
+                continue
+            if offset > cursor:
+                fmt.append(f"{(offset - cursor) * 2}x")
+            fmt.append(codec.fmt)
+            if codec.swap_words:
+                perm[offset:offset + codec.count] = reversed(perm[offset:offset + codec.count])
+            if codec.swap_bytes:
+                swap.extend(range(offset, offset + codec.count))
+            names.append(name)
+            posts.append(codec.post)
+            cursor = offset + codec.count
+
+        self.names = tuple(names)
+        self.posts = tuple(posts)
+        self.perm = None if perm == list(range(count)) else tuple(perm)
+        self.swap = tuple(swap) or None
+        self._pack = struct.Struct(f">{count}H").pack
+        self._unpack = struct.Struct("".join(fmt)).unpack_from
+        self._overlapping = tuple(overlapping)
+
+    def decode(self, registers: Sequence[int]) -> List[Tuple[str, float]]:
+        regs = registers if self.perm is None else [registers[i] for i in self.perm]
+        if self.swap is not None:
+            regs = list(regs)
+            for i in self.swap:
+                regs[i] = _byteswap(regs[i])
+        raw = self._unpack(self._pack(*regs))
+        values = [
+            (name, float(v) if post is None else post(v))
+            for name, v, post in zip(self.names, raw, self.posts)
+        ]
+        for name, offset, codec in self._overlapping:
+            regs = registers[offset:offset + codec.count]
+            if len(regs) == codec.count:
+                values.append((name, codec.decode(regs)))
+        return values
+
+    def decode_changed(self, registers: Sequence[int], previous: Sequence[int]) -> List[Tuple[str, float]]:
+        """
+        Decode only the tags whose registers differ from the previous scan's
+        buffer. Falls back to the one-pass block decode when most tags changed.
+        """
+        changed = [
+            (name, offset, codec) for name, offset, codec in self.slots
+            if registers[offset:offset + codec.count] != previous[offset:offset + codec.count]
+        ]
+        if not changed:
+            return []
+        if len(changed) * 2 > len(self.slots):
+            names = {name for name, _, _ in changed}
+            return [sample for sample in self.decode(registers) if sample[0] in names]
+        return [(name, codec.decode(registers[offset:offset + codec.count])) for name, offset, codec in changed]
+
+class BitBlockDecoder:
+    """BlockDecoder counterpart for coil and discrete input blocks."""
+    __slots__ = ("count", "slots")
+
+    def __init__(self, count: int, slots: Sequence[Tuple[str, int, TagCodec]]):
+        self.count = count
+        self.slots = tuple(slots)
+
+    def decode(self, bits: Sequence[bool]) -> List[Tuple[str, float]]:
+        return [(name, 1.0 if bits[offset] else 0.0) for name, offset, _ in self.slots]
+
+    def decode_changed(self, bits: Sequence[bool], previous: Sequence[bool]) -> List[Tuple[str, float]]:
+        return [
+            (name, 1.0 if bits[offset] else 0.0) for name, offset, _ in self.slots
+            if bits[offset] != previous[offset]
+        ]
@@ -0,0 +1,184 @@
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Dict, Optional
+from pymodbus.client import AsyncModbusTcpClient
+from app.services.circuit_breaker import BREAKER_STATE_VALUES, CircuitBreaker
+from app.services.modbus_pipeline import PipelinedModbusClient
+
+logger = logging.getLogger(__name__)
+
+class ModbusConnectionManager:
+    """
+    Long-lived Modbus TCP connections keyed by PLCConnection.name.
+
+    Sockets stay open between scans and are shared by the polling worker
+    and the control write paths. Each connection has a CircuitBreaker:
+    after repeated connect or transport failures it opens and callers fail
+    fast instead of waiting on a connect timeout every scan.
+
+    Connections with pipeline_depth > 1 use PipelinedModbusClient, which
+    limits in-flight requests itself; the others use pymodbus and are
+    serialised with a per-connection lock.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ModbusConnectionManager, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.clients: Dict[str, AsyncModbusTcpClient] = {}
+        self.endpoints: Dict[str, tuple] = {}  # {name: (host, port, pipeline_depth)} the client was built for
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.connect_counts: Dict[str, int] = {}
+        self.serial_only = set()  # Connections whose device could not handle pipelining
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    def lock(self, name: str):
+        """
+        Per-connection lock. Hold it around each request so reads from the
+        poller and writes from the API do not interleave on the socket.
+        Pipelined connections match responses by transaction id and need
+        no lock.
+        """
+        if isinstance(self.clients.get(name), PipelinedModbusClient):
+            return contextlib.nullcontext()
+        if name not in self.locks:
+            self.locks[name] = asyncio.Lock()
+        return self.locks[name]
+
+    def breaker_for(self, connection) -> CircuitBreaker:
+        breaker = self.breakers.get(connection.name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                connection.name,
+                failure_threshold=connection.breaker_failure_threshold,
+                reset_timeout=connection.reconnect_delay,
+                max_reset_timeout=connection.reconnect_delay_max,
+                jitter=connection.breaker_jitter,
+            )
+            self.breakers[connection.name] = breaker
+        return breaker
+
+    def _publish_breaker(self, breaker: CircuitBreaker):
+        from app.services.metrics_service import MetricsService
+        MetricsService.get().plc_breaker_state.labels(connection=breaker.name).set(BREAKER_STATE_VALUES[breaker.state])
+
+    def record_success(self, connection):
+        breaker = self.breaker_for(connection)
+        breaker.record_success()
+        self._publish_breaker(breaker)
+
+    def record_failure(self, connection):
+        breaker = self.breaker_for(connection)
+        previous = breaker.state
+        breaker.record_failure()
+        self._publish_breaker(breaker)
+        if breaker.state != previous:
+            logger.warning(f"Circuit breaker for PLC {connection.name} opened, retrying in {breaker.describe()['retry_in']:.1f}s")
+
+    def _create_client(self, connection):
+        if connection.pipeline_depth > 1 and connection.name not in self.serial_only:
+            return PipelinedModbusClient(
+                connection.host,
+                port=connection.port,
+                timeout=connection.timeout,
+                depth=connection.pipeline_depth,
+                name=connection.name,
+            )
+        return AsyncModbusTcpClient(
+            connection.host,
+            port=connection.port,
+            timeout=connection.timeout,
+            reconnect_delay=0,  # Reconnects are handled here, not by pymodbus
+        )
+
+    async def get_client(self, connection):
+        """
+        Return a connected client for the given PLCConnection, reconnecting
+        if needed. Returns None while the circuit breaker is open or when
+        the connect attempt fails. Callers report the outcome of their
+        requests with record_success / record_failure, which also settles
+        a half-open probe.
+        """
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
+        name = connection.name
+
+        client = self.clients.get(name)
+        endpoint = (connection.host, connection.port, connection.pipeline_depth)
+        if client is not None and self.endpoints.get(name) != endpoint:
+            # Host/port/depth changed via /api/config/modbus
+            self.invalidate(name)
+            client = None
+
+        # Checked for open sockets too: a device can accept TCP and still
+        # time out every request, which is what tripped the breaker
+        breaker = self.breaker_for(connection)
+        if not breaker.allow_request():
+            return None
+        self._publish_breaker(breaker)
+
+        if client is not None and client.connected:
+            metrics.modbus_connection_reuse_total.labels(connection=name).inc()
+            return client
+
+        if client is not None:
+            self.invalidate(name)
+
+        client = self._create_client(connection)
+
+        start = time.monotonic()
+        try:
+            await client.connect()
+        except Exception as e:
+            logger.error(f"Modbus connect error on {name}: {e}")
+        metrics.modbus_connect_duration.labels(connection=name).observe(time.monotonic() - start)
+
+        if not client.connected:
+            client.close()
+            self.clients.pop(name, None)
+            logger.warning(f"PLC {name} unreachable")
+            self.record_failure(connection)
+            return None
+
+        if self.connect_counts.get(name, 0) > 0:
+            metrics.modbus_reconnects_total.labels(connection=name).inc()
+            logger.info(f"Reconnected to PLC {name}")
+        self.connect_counts[name] = self.connect_counts.get(name, 0) + 1
+
+        self.clients[name] = client
+        self.endpoints[name] = endpoint
+        # Not a success yet: a device can accept TCP and never answer. The
+        # caller settles the breaker once its request completes or fails.
+        return client
+
+    def status(self) -> list:
+        return [breaker.describe() for breaker in self.breakers.values()]
+
+    def invalidate(self, name: str):
+        """
+        Drop the socket for a connection after a transport error so the next
+        request reconnects.
+        """
+        client = self.clients.pop(name, None)
+        self.endpoints.pop(name, None)
+        if client is not None:
+            if getattr(client, "fell_back", False):
+                self.serial_only.add(name)
+            client.close()
+
+    async def close_all(self):
+        for name in list(self.clients):
+            self.invalidate(name)
+        logger.info("Closed all Modbus connections")
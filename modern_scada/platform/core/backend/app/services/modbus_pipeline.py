@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MBAP_HEADER = struct.Struct(">HHHB")  # transaction id, protocol id, length, unit id
+LATE_ANSWER_TIMEOUTS = 4  # A timed-out transaction id is remembered this many timeouts for its late answer
+
+class PipelineResponse:
+    """Minimal response object mirroring the pymodbus attributes the poller uses."""
+    __slots__ = ("function_code", "registers", "bits", "exception_code", "elapsed")
+
+    def __init__(self, function_code: int, registers: Optional[List[int]] = None,
+                 bits: Optional[List[bool]] = None, exception_code: Optional[int] = None):
+        self.function_code = function_code
+        self.registers = registers or []
+        self.bits = bits or []
+        self.exception_code = exception_code
+        self.elapsed: Optional[float] = None  # Seconds from sending the request to its answer
+
+    def isError(self) -> bool:
+        return self.exception_code is not None
+
+    def __repr__(self):
+        if self.isError():
+            return f"PipelineResponse(fc={self.function_code}, exception_code={self.exception_code})"
+        return f"PipelineResponse(fc={self.function_code}, registers={len(self.registers)})"
+
+def _parse_pdu(pdu: bytes) -> PipelineResponse:
+    function_code = pdu[0]
+    if function_code & 0x80:
+        return PipelineResponse(function_code & 0x7F, exception_code=pdu[1])
+    if function_code in (3, 4):
+        byte_count = pdu[1]
+        registers = list(struct.unpack(f">{byte_count // 2}H", pdu[2:2 + byte_count]))
+        return PipelineResponse(function_code, registers=registers)
+    if function_code in (1, 2):
+        byte_count = pdu[1]
+        data = pdu[2:2 + byte_count]
+        bits = [bool(byte >> bit & 1) for byte in data for bit in range(8)]
+        return PipelineResponse(function_code, bits=bits)
+    return PipelineResponse(function_code)
+
+class PipelinedModbusClient:
+    """
+    Modbus TCP client that keeps up to `depth` requests in flight on one
+    socket and matches responses by MBAP transaction id.
+
+    pymodbus serialises every request on a client behind a lock, so on
+    high-latency links a scan costs one full round-trip per block. This
+    client only implements the function codes the platform uses.
+
+    Late answers to requests that already timed out are recognised by
+    their transaction id and dropped. If the device answers with any other
+    transaction id that is not pending before it has ever echoed one, or
+    drops the socket while several requests are in flight, the client falls
+    back to serial mode (depth 1) for good. In serial mode, on a device that
+    does not echo ids, an answer is matched to the one outstanding request
+    if its function code fits.
+    """
+
+    def __init__(self, host: str, port: int = 502, timeout: float = 3.0, depth: int = 4, name: str = ""):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.depth = max(depth, 1)
+        self.name = name or host
+        self.fell_back = False
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, Tuple[asyncio.Future, int]] = {}  # {tid: (future, function code)}
+        self._timed_out: Dict[int, float] = {}  # {tid: monotonic time its late answer is forgotten}
+        self.echoes_tids: Optional[bool] = None  # Unknown until the first answer is matched
+        self._next_tid = 0
+        self._slots = asyncio.Semaphore(self.depth)
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def connect(self) -> bool:
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), timeout=self.timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            logger.debug(f"Pipelined connect to {self.host}:{self.port} failed: {e}")
+            self._reader = self._writer = None
+            return False
+        self._reader_task = asyncio.create_task(self._read_responses())
+        return True
+
+    def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._fail_pending(ConnectionError(f"Connection to {self.name} closed"))
+
+    def _fail_pending(self, exc: Exception):
+        pending, self._pending = self._pending, {}
+        for future, _ in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def _fall_back(self, reason: str):
+        if self.depth > 1:
+            logger.warning(f"{self.name}: {reason}; falling back to serial Modbus requests")
+            self.depth = 1
+            self.fell_back = True
+            self._slots = asyncio.Semaphore(1)
+
+    def _late(self, tid: int) -> bool:
+        expires = self._timed_out.pop(tid, None)
+        return expires is not None and expires >= time.monotonic()
+
+    def _match(self, tid: int, function_code: int) -> Optional[asyncio.Future]:
+        entry = self._pending.get(tid)
+        if entry is not None:
+            if entry[1] != function_code:
+                return None
+            self.echoes_tids = True
+            return self._pending.pop(tid)[0]
+        if self.depth == 1 and len(self._pending) == 1 and self.echoes_tids is not True:
+            # Serial mode on a device that does not echo ids: one candidate
+            candidate, (future, expected) = next(iter(self._pending.items()))
+            if expected == function_code:
+                self.echoes_tids = False
+                del self._pending[candidate]
+                return future
+        return None
+
+    async def _read_responses(self):
+        try:
+            while True:
+                header = await self._reader.readexactly(MBAP_HEADER.size)
+                tid, _, length, _ = MBAP_HEADER.unpack(header)
+                pdu = await self._reader.readexactly(length - 1)
+                if self._late(tid):
+                    logger.debug(f"{self.name}: dropping late answer to transaction {tid}")
+                    continue
+                future = self._match(tid, pdu[0] & 0x7F)
+                if future is None:
+                    if self.in_flight > 0 and self.echoes_tids is not True:
+                        self._fall_back(f"unexpected transaction id {tid}")
+                    else:
+                        logger.debug(f"{self.name}: dropping unmatched answer with transaction id {tid}")
+                    continue
+                if not future.done():
+                    future.set_result(_parse_pdu(pdu))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.in_flight > 1:
+                self._fall_back(f"connection dropped with {self.in_flight} requests in flight")
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            self._fail_pending(ConnectionError(f"Connection to {self.name} lost: {e}"))
+
+    async def execute(self, device_id: int, pdu: bytes) -> PipelineResponse:
+        async with self._slots:
+            if not self.connected:
+                raise ConnectionError(f"{self.name} is not connected")
+            self._next_tid = (self._next_tid + 1) & 0xFFFF
+            tid = self._next_tid
+            self._timed_out.pop(tid, None)
+            future = asyncio.get_running_loop().create_future()
+            self._pending[tid] = (future, pdu[0])
+            self._writer.write(MBAP_HEADER.pack(tid, 0, len(pdu) + 1, device_id) + pdu)
+            sent = time.monotonic()
+            try:
+                response = await asyncio.wait_for(future, timeout=self.timeout)
+                # Wire time only, without the wait for a free slot
+                response.elapsed = time.monotonic() - sent
+                return response
+            except asyncio.TimeoutError:
+                self._pending.pop(tid, None)
+                now = time.monotonic()
+                self._timed_out = {t: expires for t, expires in self._timed_out.items() if expires >= now}
+                self._timed_out[tid] = now + self.timeout * LATE_ANSWER_TIMEOUTS
+                raise TimeoutError(f"{self.name}: no response to transaction {tid} within {self.timeout}s")
+
+    async def read_holding_registers(self, address: int, count: int = 1, device_id: int = 1) -> PipelineResponse:
+        return await self.execute(device_id, struct.pack(">BHH", 3, address, count))
+
+    async def read_input_registers(self, address: int, count: int = 1, device_id: int = 1) -> PipelineResponse:
+        return await self.execute(device_id, struct.pack(">BHH", 4, address, count))
+
+    async def read_coils(self, address: int, count: int = 1, device_id: int = 1) -> PipelineResponse:
+        return await self.execute(device_id, struct.pack(">BHH", 1, address, count))
+
+    async def read_discrete_inputs(self, address: int, count: int = 1, device_id: int = 1) -> PipelineResponse:
+        return await self.execute(device_id, struct.pack(">BHH", 2, address, count))
+
+    async def write_registers(self, address: int, values: List[int], device_id: int = 1) -> PipelineResponse:
+        pdu = struct.pack(f">BHHB{len(values)}H", 16, address, len(values), len(values) * 2, *values)
+        return await self.execute(device_id, pdu)
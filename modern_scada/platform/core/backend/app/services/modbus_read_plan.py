@@ -0,0 +1,401 @@
+import logging
+import math
+from dataclasses import dataclass
+from functools import reduce
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+from app.config import settings
+from app.services.modbus_codecs import BitBlockDecoder, BlockDecoder, TagCodec, is_bit_function
+
+logger = logging.getLogger(__name__)
+
+# Modbus limits for a single read request
+PROTOCOL_MAX_REGISTERS = 125  # FC3/FC4
+PROTOCOL_MAX_BITS = 2000  # FC1/FC2
+
+# Cost model used until a PLC has been measured
+DEFAULT_REQUEST_COST = 0.010  # Seconds of fixed round-trip overhead per request
+DEFAULT_REGISTER_COST = 0.00005  # Seconds per register transferred
+
+# Scan rates are rounded to this granularity so the scheduler tick stays sane
+SCAN_RATE_RESOLUTION_MS = 10
+
+@dataclass(frozen=True)
+class TagSlot:
+    """Where a tag lives inside a block read and how to decode it."""
+    name: str
+    offset: int  # Register offset relative to the block start
+    count: int  # Number of registers the tag occupies
+    decoder: TagCodec
+
+@dataclass(frozen=True)
+class ReadBlock:
+    start: int
+    count: int
+    slots: Tuple[TagSlot, ...]
+    decoder: BlockDecoder  # Decodes all slots of the block in one pass
+    unit: int = 1
+    function: str = "holding"
+
+    @property
+    def key(self) -> Tuple[int, str, int, int]:
+        return (self.unit, self.function, self.start, self.count)
+
+    def split(self) -> Tuple["ReadBlock", "ReadBlock"]:
+        """Split into two blocks with half of the slots each."""
+        members = [(self.start + s.offset, s.decoder, s.name) for s in self.slots]
+        mid = len(members) // 2
+        return (
+            make_block(members[:mid], self.unit, self.function),
+            make_block(members[mid:], self.unit, self.function),
+        )
+
+@dataclass(frozen=True)
+class ReadPlan:
+    """
+    Immutable block-read plan for one PLC connection, compiled from the tag
+    configuration. The poll loop only executes it.
+    """
+    connection_name: str
+    version: int
+    blocks: Tuple[ReadBlock, ...]
+    estimated_scan_time: float = 0.0
+    excluded_tags: Tuple[str, ...] = ()
+
+    def describe(self) -> dict:
+        return {
+            "connection": self.connection_name,
+            "version": self.version,
+            "round_trips": len(self.blocks),
+            "registers": sum(block.count for block in self.blocks),
+            "tags": sum(len(block.slots) for block in self.blocks),
+            "estimated_scan_time": self.estimated_scan_time,
+            "excluded_tags": list(self.excluded_tags),
+            "blocks": [
+                {
+                    "unit": block.unit,
+                    "function": block.function,
+                    "start": block.start,
+                    "count": block.count,
+                    "tags": [{"name": s.name, "offset": s.offset, "count": s.count} for s in block.slots]
+                }
+                for block in self.blocks
+            ]
+        }
+
+class BlockOptimizer:
+    """
+    Per-PLC cost model for block reads.
+
+    Each read is timed and fed into an exponentially weighted least-squares
+    fit of `duration = request_cost + register_cost * count`, so the planner
+    learns whether reading dead registers is cheaper than another
+    round-trip. Address ranges the device rejects with an
+    illegal-data-address exception are remembered and never read again.
+
+    One optimizer covers one (unit, function) address space of a
+    connection; for coils and discrete inputs counts are in bits.
+    """
+    DECAY = 0.05
+    MIN_SAMPLES = 10
+    REPLAN_THRESHOLD = 0.2  # Relative change of the break-even gap that triggers a replan
+
+    def __init__(self, max_block: int = PROTOCOL_MAX_REGISTERS, bits: bool = False):
+        self.bits = bits
+        self.max_block = PROTOCOL_MAX_BITS if bits else min(max_block, PROTOCOL_MAX_REGISTERS)
+        self.request_cost = DEFAULT_REQUEST_COST
+        self.register_cost = DEFAULT_REGISTER_COST / 16 if bits else DEFAULT_REGISTER_COST
+        self.bad_ranges: List[Tuple[int, int]] = []  # [start, end) register ranges
+        self.samples = 0
+        self._w = self._sx = self._sy = self._sxx = self._sxy = 0.0
+        self.planned_gap = self.break_even_gap()
+        self.dirty = False
+
+    def break_even_gap(self) -> float:
+        """Number of dead registers worth reading to save one round-trip."""
+        if self.register_cost <= 0:
+            return float(self.max_block)
+        return min(self.request_cost / self.register_cost, float(self.max_block))
+
+    def observe(self, count: int, seconds: float):
+        keep = 1.0 - self.DECAY
+        self._w = self._w * keep + 1.0
+        self._sx = self._sx * keep + count
+        self._sy = self._sy * keep + seconds
+        self._sxx = self._sxx * keep + count * count
+        self._sxy = self._sxy * keep + count * seconds
+        self.samples += 1
+        if self.samples < self.MIN_SAMPLES:
+            return
+
+        mean_x = self._sx / self._w
+        mean_y = self._sy / self._w
+        var_x = self._sxx / self._w - mean_x * mean_x
+        if var_x > 1e-6:
+            # Block sizes vary enough to separate fixed and per-register cost
+            self.register_cost = max((self._sxy / self._w - mean_x * mean_y) / var_x, 0.0)
+        self.request_cost = max(mean_y - self.register_cost * mean_x, 0.0)
+
+        gap = self.break_even_gap()
+        if abs(gap - self.planned_gap) > self.REPLAN_THRESHOLD * max(self.planned_gap, 1.0):
+            self.dirty = True
+
+    def mark_bad(self, start: int, end: int):
+        if (start, end) not in self.bad_ranges:
+            self.bad_ranges.append((start, end))
+            self.bad_ranges.sort()
+            self.dirty = True
+
+    def limit_block(self, count: int):
+        """The device rejected a fully mapped range: its request limit is lower than ours."""
+        if 0 < count < self.max_block:
+            self.max_block = count
+            self.dirty = True
+
+    def is_bad(self, start: int, end: int) -> bool:
+        return any(b_start < end and start < b_end for b_start, b_end in self.bad_ranges)
+
+    def block_cost(self, count: int) -> float:
+        return self.request_cost + self.register_cost * count
+
+    def describe(self) -> dict:
+        return {
+            "request_cost": self.request_cost,
+            "register_cost": self.register_cost,
+            "break_even_gap": self.break_even_gap(),
+            "max_block": self.max_block,
+            "samples": self.samples,
+            "bad_ranges": [list(r) for r in self.bad_ranges]
+        }
+
+def make_block(members: List[Tuple[int, TagCodec, str]], unit: int = 1, function: str = "holding") -> ReadBlock:
+    """Build a ReadBlock from (address, codec, name) members sorted by address."""
+    start = members[0][0]
+    end = max(address + codec.count for address, codec, _ in members)
+    slots = tuple(TagSlot(name, address - start, codec.count, codec) for address, codec, name in members)
+    decoder_cls = BitBlockDecoder if is_bit_function(function) else BlockDecoder
+    return ReadBlock(
+        start=start,
+        count=end - start,
+        slots=slots,
+        decoder=decoder_cls(end - start, [(s.name, s.offset, s.decoder) for s in slots]),
+        unit=unit,
+        function=function
+    )
+
+def _partition(members: List[Tuple[int, TagCodec, str]], optimizer: BlockOptimizer) -> Tuple[List, float]:
+    """
+    Split address-sorted members of one address space into groups that
+    minimise the estimated read cost. Returns the groups and their cost.
+    """
+    # best[j]: minimal cost to read members[:j]; cut[j]: start index of the last block
+    n = len(members)
+    best = [0.0] + [math.inf] * n
+    cut = [0] * (n + 1)
+    for j in range(1, n + 1):
+        end = 0
+        for i in range(j - 1, -1, -1):
+            start = members[i][0]
+            end = max(end, start + members[i][1].count)
+            length = end - start
+            # Widening further left only grows the block, so stop at the first violation
+            if length > optimizer.max_block and i < j - 1:
+                break
+            if i < j - 1 and optimizer.is_bad(start, end):
+                break
+            cost = best[i] + optimizer.block_cost(length)
+            if cost < best[j]:
+                best[j] = cost
+                cut[j] = i
+
+    groups = []
+    j = n
+    while j > 0:
+        groups.append(members[cut[j]:j])
+        j = cut[j]
+    groups.reverse()
+    return groups, best[n]
+
+def build_read_plan(connection_name: str, tags: List, version: int = 0,
+                    optimizer: Optional[BlockOptimizer] = None,
+                    optimizers: Optional[Callable[[int, str], BlockOptimizer]] = None) -> ReadPlan:
+    """
+    Partition the tags of one connection into block reads that minimise the
+    estimated scan time under the optimizer's cost model, without exceeding
+    the block limit or reading a known-bad address.
+
+    Each (unit, function) pair is its own address space and is planned
+    separately, with the optimizer returned by `optimizers(unit, function)`
+    (or the single `optimizer`) for that space.
+    """
+    space_optimizers: Dict[Tuple[int, str], BlockOptimizer] = {}
+
+    def optimizer_for(unit: int, function: str) -> BlockOptimizer:
+        key = (unit, function)
+        if key not in space_optimizers:
+            if optimizers is not None:
+                space_optimizers[key] = optimizers(unit, function)
+            elif optimizer is not None:
+                space_optimizers[key] = optimizer
+            else:
+                space_optimizers[key] = BlockOptimizer(bits=is_bit_function(function))
+        return space_optimizers[key]
+
+    spaces: Dict[Tuple[int, str], List] = {}
+    excluded = []
+    for tag in tags:
+        if tag.connection_name != connection_name:
+            continue
+        codec = TagCodec(tag)
+        if optimizer_for(tag.unit_id, tag.function).is_bad(tag.address, tag.address + codec.count):
+            excluded.append(tag.name)
+            continue
+        spaces.setdefault((tag.unit_id, tag.function), []).append((tag.address, codec, tag.name))
+
+    blocks = []
+    estimated = 0.0
+    for (unit, function), members in sorted(spaces.items()):
+        members.sort(key=lambda m: m[0])
+        groups, cost = _partition(members, optimizer_for(unit, function))
+        blocks.extend(make_block(group, unit, function) for group in groups)
+        estimated += cost
+
+    for space_optimizer in space_optimizers.values():
+        space_optimizer.planned_gap = space_optimizer.break_even_gap()
+        space_optimizer.dirty = False
+    return ReadPlan(
+        connection_name=connection_name,
+        version=version,
+        blocks=tuple(blocks),
+        estimated_scan_time=estimated,
+        excluded_tags=tuple(excluded)
+    )
+
+def tag_scan_rate(tag, connection) -> int:
+    """Scan class of a tag in milliseconds."""
+    rate = tag.scan_rate_ms or connection.poll_interval * 1000
+    return max(SCAN_RATE_RESOLUTION_MS, round(rate / SCAN_RATE_RESOLUTION_MS) * SCAN_RATE_RESOLUTION_MS)
+
+def scan_classes(connection, tags: List) -> Dict[int, List]:
+    """Group a connection's tags by scan rate (ms)."""
+    classes: Dict[int, List] = {}
+    for tag in tags:
+        if tag.connection_name == connection.name:
+            classes.setdefault(tag_scan_rate(tag, connection), []).append(tag)
+    return classes
+
+def scan_tick(rates: List[int]) -> int:
+    """Scheduler tick (ms) that lands on every scan class deadline."""
+    return reduce(math.gcd, rates)
+
+def due_classes(rates: List[int], tick_index: int, tick: int) -> FrozenSet[int]:
+    elapsed = tick_index * tick
+    return frozenset(rate for rate in rates if elapsed % rate == 0)
+
+class ReadPlanCache:
+    """
+    Holds the active ReadPlan per connection. Rebuilt at startup, whenever
+    the tag or PLC configuration changes, and when a connection's
+    BlockOptimizer learns something that changes the best partition.
+
+    Tags are grouped into scan classes by scan rate. The scheduler asks for
+    the plan of the classes due on a tick; that plan covers the union of
+    their tags, so classes coming due together share block reads.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ReadPlanCache, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.version = 0
+        self.plans: Dict[str, ReadPlan] = {}  # Plan over all of a connection's tags
+        self.classes: Dict[str, Dict[int, List]] = {}  # {name: {scan_rate_ms: [TagConfig]}}
+        self.due_plans: Dict[Tuple[str, FrozenSet[int]], ReadPlan] = {}
+        self.optimizers: Dict[Tuple[str, int, str], BlockOptimizer] = {}  # {(name, unit, function): optimizer}
+        self.built = False
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    def optimizer_for(self, connection, unit: int = 1, function: str = "holding") -> BlockOptimizer:
+        key = (connection.name, unit, function)
+        optimizer = self.optimizers.get(key)
+        if optimizer is None:
+            optimizer = BlockOptimizer(connection.max_block_registers, bits=is_bit_function(function))
+            self.optimizers[key] = optimizer
+        return optimizer
+
+    def _space_optimizers(self, connection) -> Callable[[int, str], BlockOptimizer]:
+        return lambda unit, function: self.optimizer_for(connection, unit, function)
+
+    def connection_optimizers(self, connection_name: str) -> Dict[Tuple[int, str], BlockOptimizer]:
+        return {(unit, function): o for (name, unit, function), o in self.optimizers.items() if name == connection_name}
+
+    def needs_replan(self, connection_name: str) -> bool:
+        return any(o.dirty for o in self.connection_optimizers(connection_name).values())
+
+    def rebuild(self):
+        self.version += 1
+        tags = settings.app_config.tags
+        connections = settings.app_config.plc.connections
+        names = {conn.name for conn in connections}
+        for key in list(self.optimizers):
+            if key[0] not in names:
+                del self.optimizers[key]
+        # Build into a new dict and swap it in so readers never see a half-built set
+        self.plans = {
+            conn.name: build_read_plan(conn.name, tags, self.version, optimizers=self._space_optimizers(conn))
+            for conn in connections
+        }
+        self.classes = {conn.name: scan_classes(conn, tags) for conn in connections}
+        self.due_plans = {}
+        self.built = True
+        logger.info(
+            f"Compiled Modbus read plans v{self.version}: "
+            + ", ".join(f"{name}={len(plan.blocks)} blocks" for name, plan in self.plans.items())
+        )
+
+    def replan(self, connection):
+        """Rebuild one connection's plan after its cost model or bad ranges changed."""
+        self.version += 1
+        plan = build_read_plan(connection.name, settings.app_config.tags, self.version, optimizers=self._space_optimizers(connection))
+        self.plans = {**self.plans, connection.name: plan}
+        self.due_plans = {key: p for key, p in self.due_plans.items() if key[0] != connection.name}
+        logger.info(f"Re-planned {connection.name} v{self.version}: {len(plan.blocks)} blocks, est. {plan.estimated_scan_time * 1000:.1f} ms/scan")
+
+    def scan_rates(self, connection_name: str) -> List[int]:
+        if not self.built:
+            self.rebuild()
+        return sorted(self.classes.get(connection_name, {}))
+
+    def plan_for(self, connection_name: str, due: Optional[FrozenSet[int]] = None) -> Optional[ReadPlan]:
+        """
+        Plan for a connection, restricted to the scan classes in `due`
+        (all classes when None).
+        """
+        if not self.built:
+            self.rebuild()
+        classes = self.classes.get(connection_name, {})
+        if due is None or due.issuperset(classes):
+            return self.plans.get(connection_name)
+
+        key = (connection_name, due)
+        plan = self.due_plans.get(key)
+        if plan is None:
+            tags = [tag for rate in sorted(due) for tag in classes.get(rate, [])]
+            optimizers = self.connection_optimizers(connection_name)
+            dirty = {space: o.dirty for space, o in optimizers.items()}
+            plan = build_read_plan(
+                connection_name, tags, self.version,
+                optimizers=lambda unit, function: optimizers.get((unit, function)) or BlockOptimizer(bits=is_bit_function(function))
+            )
+            for space, o in optimizers.items():
+                o.dirty = dirty[space]  # Only a full replan clears pending learning
+            self.due_plans = {**self.due_plans, key: plan}
+        return plan
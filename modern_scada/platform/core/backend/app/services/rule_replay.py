@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from app.db.postgres import PostgresDB
+from app.services.current_value_table import CurrentValueTable, epoch
+from app.services.logic_engine import LogicEngine
+
+logger = logging.getLogger(__name__)
+
+REPLAY_QUERY = (
+    "SELECT time, tag_name, value FROM sensor_data "
+    "WHERE time >= $1 AND time < $2 AND tag_name = ANY($3::text[]) ORDER BY time"
+)
+
+def _iso(seconds: float) -> str:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat()
+
+class VirtualClock:
+    """Replay time; only moves when the replay moves it."""
+    __slots__ = ("now",)
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+class SandboxLogicEngine(LogicEngine):
+    """
+    A LogicEngine on its own current-value table and a virtual clock.
+    Actions are recorded instead of sent and rule states are not
+    persisted; the live engine singleton is left untouched.
+    """
+    record_metrics = False
+
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, rules: List[Dict], global_settings: Dict, clock: VirtualClock):
+        self.table = CurrentValueTable.standalone()
+        self.reset(self.table.view, clock)
+        self.rules_path = None
+        self.state_store = None
+        self.rules = rules
+        self.global_settings = global_settings
+        self.actions: List[Dict] = []
+        self.current_rule: Optional[str] = None
+        self.index_rules()
+
+    async def process_rule(self, rule, value: float, now: float, minute: int):
+        self.current_rule = rule.id
+        await super().process_rule(rule, value, now, minute)
+
+    async def execute_actions(self, actions: List[Dict], value: float):
+        for action in actions:
+            self.actions.append({
+                "time": self.clock(),
+                "rule": self.current_rule,
+                "device_id": action["device_id"],
+                "value": self.action_value(action, value),
+            })
+
+class RuleReplay:
+    """
+    Backtest logic rules against recorded sensor_data.
+
+    Rows for the time range and tags (by default every tag the rules
+    depend on) are streamed from Postgres with a server-side cursor, a
+    chunk at a time, and fed scan by scan (rows sharing a timestamp) to a
+    SandboxLogicEngine. Between scans the virtual clock jumps straight to
+    each expiring timer, so min_run_time and schedule windows behave as
+    they would live, and the replay runs as fast as the rows can be read.
+    """
+
+    def __init__(self, start: datetime, end: datetime, rules: List[Dict], global_settings: Dict,
+                 tags: Optional[List[str]] = None, chunk_size: int = 10000):
+        self.start = start if start.tzinfo else start.replace(tzinfo=timezone.utc)
+        self.end = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+        self.clock = VirtualClock(epoch(self.start))
+        self.engine = SandboxLogicEngine(rules, global_settings, self.clock)
+        self.tags = sorted(tags or self.engine.rules_by_tag)
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.scans = 0
+
+    async def _advance(self, until: float):
+        """Move the virtual clock to `until`, firing every timer due on the way."""
+        engine = self.engine
+        deadline = engine.timers.next_deadline()
+        while deadline is not None and deadline <= until:
+            self.clock.now = deadline
+            await engine.fire_timers()
+            deadline = engine.timers.next_deadline()
+        self.clock.now = until
+
+    async def _scan(self, timestamp: datetime, values: Dict[str, float]):
+        await self._advance(epoch(timestamp))
+        self.engine.table.update_batch(values.items(), timestamp)
+        await self.engine.evaluate_batch(values)
+        self.scans += 1
+
+    async def run(self, progress: Optional[Callable[[float], None]] = None) -> Dict:
+        wall_start = time.monotonic()
+        span = max(epoch(self.end) - epoch(self.start), 1e-9)
+
+        if self.tags:
+            scan_time = None
+            values: Dict[str, float] = {}
+            async for records in PostgresDB.stream(REPLAY_QUERY, self.start, self.end, self.tags, chunk_size=self.chunk_size):
+                for timestamp, tag_name, value in records:
+                    if timestamp != scan_time:
+                        if values:
+                            await self._scan(scan_time, values)
+                        scan_time, values = timestamp, {}
+                    values[tag_name] = value
+                self.rows += len(records)
+                if progress is not None:
+                    progress((self.clock.now - epoch(self.start)) / span)
+                # Sandbox evaluation never suspends; let the API serve requests between chunks
+                await asyncio.sleep(0)
+            if values:
+                await self._scan(scan_time, values)
+        await self._advance(epoch(self.end))
+
+        elapsed = time.monotonic() - wall_start
+        if progress is not None:
+            progress(1.0)
+        return {
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "tags": self.tags,
+            "rows": self.rows,
+            "scans": self.scans,
+            "actions": [{**action, "time": _iso(action["time"])} for action in self.engine.actions],
+            "final_states": self.engine.rule_states,
+            "elapsed_seconds": round(elapsed, 3),
+            "speedup": round(span / elapsed, 1) if elapsed > 0 else None,
+        }
+
+class ReplayJobs:
+    """
+    Replays started through the API, run in the background and polled by
+    id. Each running job holds a Postgres pool connection and evaluates
+    rules on the API event loop, so only MAX_RUNNING run at once.
+    """
+    _instance = None
+
+    MAX_RUNNING = 1  # Concurrent replays; further requests are refused
+    MAX_FINISHED = 20  # Finished jobs kept for polling
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ReplayJobs, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.jobs: Dict[str, Dict] = {}
+        self.ids = itertools.count(1)
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    def running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job["status"] == "running")
+
+    def start(self, replay: RuleReplay) -> Optional[str]:
+        """Start `replay` in the background; None when MAX_RUNNING replays are already running."""
+        if self.running() >= self.MAX_RUNNING:
+            return None
+        self._prune()
+        job_id = str(next(self.ids))
+        job = {"id": job_id, "status": "running", "progress": 0.0, "result": None, "error": None}
+
+        def progress(fraction: float):
+            job["progress"] = round(fraction, 4)
+
+        async def run():
+            try:
+                job["result"] = await replay.run(progress)
+                job["status"] = "done"
+            except asyncio.CancelledError:
+                job["status"] = "cancelled"
+                raise
+            except Exception as e:
+                logger.error(f"Replay job {job_id} failed: {e}")
+                job["status"] = "failed"
+                job["error"] = str(e)
+
+        job["task"] = asyncio.create_task(run())
+        self.jobs[job_id] = job
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key != "task"}
+
+    async def cancel_all(self):
+        """Cancel running replays (shutdown), releasing their pool connections."""
+        tasks = [job["task"] for job in self.jobs.values() if not job["task"].done()]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job["status"] != "running"]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED + 1)]:
+            del self.jobs[job_id]
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+async def _main(args):
+    if args.rules:
+        with open(args.rules) as f:
+            data = json.load(f)
+        rules, global_settings = data.get("rules", []), data.get("globals", {})
+    else:
+        engine = LogicEngine()
+        rules, global_settings = engine.rules, engine.global_settings
+
+    tags = args.tags.split(",") if args.tags else None
+    await PostgresDB.connect()
+    try:
+        replay = RuleReplay(args.start, args.end, rules, global_settings, tags, args.chunk_size)
+        result = await replay.run()
+    finally:
+        await PostgresDB.close()
+
+    output = json.dumps(result, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    logger.info(f"Replayed {result['rows']} rows, {len(result['actions'])} actions in {result['elapsed_seconds']}s ({result['speedup']}x real time)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sensor_data through logic rules")
+    parser.add_argument("--start", required=True, type=_parse_time, help="ISO time, UTC unless an offset is given")
+    parser.add_argument("--end", required=True, type=_parse_time, help="ISO time, exclusive")
+    parser.add_argument("--rules", help="Rules file (logic_rules.json format); default: the configured rules")
+    parser.add_argument("--tags", help="Comma separated tags; default: every tag the rules read")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows fetched per cursor round trip")
+    parser.add_argument("--output", help="Write the JSON result here instead of stdout")
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("app.services.logic_engine").setLevel(logging.WARNING)  # One line per transition is too much here
+    asyncio.run(_main(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
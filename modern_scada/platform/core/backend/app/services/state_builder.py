@@ -1,11 +1,10 @@
-from app.services.event_processor import EventProcessor
+from app.services.current_value_table import CurrentValueTable
 from app.config import settings
 
 class StateBuilder:
     @staticmethod
     def build_system_state():
-        processor = EventProcessor()
-        tags = processor.tag_values
+        tags = CurrentValueTable.get().view
         
         def get_val(name, default=0.0):
             return tags.get(name, default)
@@ -99,5 +98,5 @@ class StateBuilder:
             "weather": weather,
             "mixer": mixer,
             "rackTanks": rack_tanks,
-            "rawTags": tags
+            "rawTags": dict(tags)
         }
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from array import array
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Row = Tuple[datetime, str, float]  # (time, tag_name, value)
+
+# StoreForwardConfig.overflow values
+OVERFLOW_SPILL = "spill"  # Move the oldest rows to the SQLite buffer
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+
+def _epoch(ts: datetime) -> float:
+    # Scan timestamps are naive UTC (datetime.utcnow())
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+def _from_epoch(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(tzinfo=None)
+
+class StoreForwardBuffer:
+    """
+    Bounded in-memory store-and-forward buffer for historian rows that
+    could not be written to Postgres.
+
+    Rows live in a fixed-size ring of parallel columns (epoch seconds and
+    values in `array('d')`, tag names as shared string references), so a
+    buffered row costs a few machine words instead of a dict. When the ring
+    is full the overflow policy applies; with `spill` the oldest quarter is
+    moved to the SQLite buffer in one bulk insert, where the forwarder
+    worker picks it up.
+
+    While rows are buffered the historian is considered offline and new
+    rows are appended here directly; a background task drains the ring in
+    bulk (oldest first) once Postgres accepts writes again.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(StoreForwardBuffer, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self, capacity: Optional[int] = None):
+        self.capacity = capacity or settings.app_config.store_forward.max_rows
+        self.times = array("d", bytes(8 * self.capacity))
+        self.values = array("d", bytes(8 * self.capacity))
+        self.tags: List[Optional[str]] = [None] * self.capacity
+        self.head = 0  # Index of the oldest row
+        self.size = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    @property
+    def offline(self) -> bool:
+        return self.size > 0
+
+    def __len__(self):
+        return self.size
+
+    async def push(self, rows: List[Row]):
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
+        policy = settings.app_config.store_forward.overflow
+
+        free = self.capacity - self.size
+        if len(rows) > free:
+            if policy == OVERFLOW_DROP_NEWEST:
+                metrics.store_forward_dropped_total.inc(len(rows) - free)
+                rows = rows[:free]
+            elif policy == OVERFLOW_DROP_OLDEST:
+                dropped = min(len(rows) - free, self.size)
+                self._pop(dropped)
+                metrics.store_forward_dropped_total.inc(dropped)
+                rows = rows[-self.capacity:]
+            else:
+                # Spill a quarter of the ring on top of what is needed, so the
+                # next few scans do not each trigger a small SQLite write
+                needed = min(len(rows) - free + self.capacity // 4, self.size)
+                spilled = self._pop(needed)
+                if len(rows) > self.capacity:
+                    spilled.extend(rows[:-self.capacity])
+                    rows = rows[-self.capacity:]
+                await self._spill(spilled)
+
+        times, values, tags = self.times, self.values, self.tags
+        capacity = self.capacity
+        index = (self.head + self.size) % capacity
+        for ts, tag_name, value in rows:
+            times[index] = _epoch(ts)
+            values[index] = value
+            tags[index] = tag_name
+            index += 1
+            if index == capacity:
+                index = 0
+        self.size += len(rows)
+        metrics.store_forward_depth.set(self.size)
+
+    def peek(self, count: int) -> List[Row]:
+        """Oldest `count` rows, without removing them."""
+        count = min(count, self.size)
+        rows = []
+        index = self.head
+        for _ in range(count):
+            rows.append((_from_epoch(self.times[index]), self.tags[index], self.values[index]))
+            index = (index + 1) % self.capacity
+        return rows
+
+    def _pop(self, count: int) -> List[Row]:
+        rows = self.peek(count)
+        index = self.head
+        for _ in range(len(rows)):
+            self.tags[index] = None
+            index = (index + 1) % self.capacity
+        self.head = index
+        self.size -= len(rows)
+        return rows
+
+    async def _spill(self, rows: List[Row]):
+        if not rows:
+            return
+        from app.services.data_service import DataService
+        from app.services.metrics_service import MetricsService
+        logger.warning(f"Store & forward memory budget exceeded, spilling {len(rows)} rows to SQLite")
+        try:
+            await DataService.buffer_sensor_data_batch(rows)
+            MetricsService.get().store_forward_spilled_total.inc(len(rows))
+        except Exception as e:
+            logger.error(f"Spilling {len(rows)} rows to SQLite failed, dropping them: {e}")
+            MetricsService.get().store_forward_dropped_total.inc(len(rows))
+
+    async def drain(self) -> int:
+        """Write buffered rows to Postgres in bulk until empty or a write fails."""
+        from app.services.historian_writer import HistorianWriter
+        from app.services.metrics_service import MetricsService
+        batch_rows = settings.app_config.store_forward.drain_batch
+        writer = HistorianWriter.get()
+        drained = 0
+        while self.size:
+            batch = self.peek(batch_rows)
+            try:
+                await writer.write_rows(batch)
+            except Exception as e:
+                logger.debug(f"Store & forward drain paused: {e}")
+                break
+            self._pop(len(batch))
+            drained += len(batch)
+        MetricsService.get().store_forward_depth.set(self.size)
+        if drained:
+            logger.info(f"Store & forward drained {drained} rows, {self.size} left")
+        return drained
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.app_config.store_forward.drain_interval)
+            if self.size:
+                try:
+                    await self.drain()
+                except Exception as e:
+                    logger.error(f"Store & forward drain error: {e}")
+
+    async def stop(self):
+        """Stop draining and park whatever is still in memory in SQLite."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.size:
+            await self.drain()
+        if self.size:
+            await self._spill(self._pop(self.size))
+
+    def status(self) -> dict:
+        return {
+            "count": self.size,
+            "capacity": self.capacity,
+            "policy": settings.app_config.store_forward.overflow,
+        }
@@ -0,0 +1,201 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Mapping, Optional, Tuple
+from app.config import settings
+from app.services.current_value_table import QUALITY_GOOD
+
+logger = logging.getLogger(__name__)
+
+Point = Tuple[datetime, float]
+
+HEARTBEAT_GRACE = 5.0  # Seconds a timer heartbeat waits past its due time for a scan still in flight
+
+class TagFilter:
+    """
+    Decides which samples of one tag are persisted and fanned out.
+
+    deadband mode: a sample passes when it moved more than `deadband`
+    (absolute) or `deadband_percent` (of the last persisted value) away
+    from the last persisted value. With both at 0 any change passes.
+
+    swinging_door mode: the classic historian compression. A sample is
+    held while every sample since the last archived point fits inside a
+    door of +/- `deadband` around a straight line; when the door closes the
+    held (previous) point is archived.
+
+    In both modes `min_interval` suppresses archiving more often than that
+    and `max_interval` forces a point through as a heartbeat. With report
+    by exception a tag that does not change is not offered again until the
+    next integrity scan, so TagFilterBank.heartbeats also emits them on a
+    timer from the current-value table.
+    """
+    __slots__ = (
+        "name", "deadband", "deadband_percent", "min_interval", "max_interval", "swinging_door",
+        "last_time", "last_value", "held", "slope_max", "slope_min", "received", "archived",
+    )
+
+    def __init__(self, name: str, deadband: float = 0.0, deadband_percent: float = 0.0,
+                 min_interval: float = 0.0, max_interval: float = 0.0, compression: str = "deadband"):
+        self.name = name
+        self.deadband = deadband
+        self.deadband_percent = deadband_percent
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.swinging_door = compression == "swinging_door"
+
+        self.last_time: Optional[datetime] = None  # Last archived point
+        self.last_value = 0.0
+        self.held: Optional[Point] = None  # Swinging door: newest point not archived yet
+        self.slope_max = float("inf")
+        self.slope_min = float("-inf")
+
+        from app.services.metrics_service import MetricsService
+        metrics = MetricsService.get()
+        self.received = metrics.tag_samples_received_total.labels(tag=name)
+        self.archived = metrics.tag_samples_archived_total.labels(tag=name)
+
+    @classmethod
+    def from_config(cls, tag) -> "TagFilter":
+        return cls(tag.name, tag.deadband, tag.deadband_percent, tag.min_interval, tag.max_interval, tag.compression)
+
+    def offer(self, timestamp: datetime, value: float) -> Optional[Point]:
+        """Feed one sample; returns the point to archive, if any."""
+        self.received.inc()
+        if self.last_time is None:
+            return self._archive(timestamp, value)
+
+        elapsed = (timestamp - self.last_time).total_seconds()
+        if elapsed <= 0:
+            return None
+        if self.max_interval and elapsed >= self.max_interval:
+            return self._archive(timestamp, value)
+        if elapsed < self.min_interval:
+            if self.swinging_door:
+                self._narrow_door(timestamp, value, elapsed)
+            return None
+
+        if self.swinging_door:
+            return self._swinging_door(timestamp, value, elapsed)
+
+        delta = abs(value - self.last_value)
+        threshold = max(self.deadband, abs(self.last_value) * self.deadband_percent / 100)
+        if delta > threshold or (threshold == 0 and value != self.last_value):
+            return self._archive(timestamp, value)
+        return None
+
+    def heartbeat(self, now: datetime, value: float) -> Optional[Point]:
+        """
+        Archive `value` at the heartbeat's due time when nothing was
+        archived for max_interval and the due time is HEARTBEAT_GRACE old.
+        """
+        if not self.max_interval or self.last_time is None:
+            return None
+        due = self.last_time + timedelta(seconds=self.max_interval)
+        if (now - due).total_seconds() < HEARTBEAT_GRACE:
+            return None
+        return self._archive(due, value)
+
+    def _narrow_door(self, timestamp: datetime, value: float, elapsed: float):
+        """
+        Within min_interval nothing may be archived, so a sample is only
+        held if the door stays open with it; one that would close the door
+        is dropped, keeping the held point on a line through the corridor.
+        """
+        slope_max = min(self.slope_max, (value + self.deadband - self.last_value) / elapsed)
+        slope_min = max(self.slope_min, (value - self.deadband - self.last_value) / elapsed)
+        if slope_min <= slope_max:
+            self.slope_max, self.slope_min = slope_max, slope_min
+            self.held = (timestamp, value)
+
+    def _swinging_door(self, timestamp: datetime, value: float, elapsed: float) -> Optional[Point]:
+        self.slope_max = min(self.slope_max, (value + self.deadband - self.last_value) / elapsed)
+        self.slope_min = max(self.slope_min, (value - self.deadband - self.last_value) / elapsed)
+        if self.slope_min <= self.slope_max:
+            self.held = (timestamp, value)
+            return None
+
+        # Door closed: the held point is the last one on the line, archive it
+        # and restart the door from there through the current sample
+        held_time, held_value = self.held or (timestamp, value)
+        point = self._archive(held_time, held_value)
+        elapsed = (timestamp - held_time).total_seconds()
+        if elapsed > 0:
+            self.slope_max = (value + self.deadband - held_value) / elapsed
+            self.slope_min = (value - self.deadband - held_value) / elapsed
+            self.held = (timestamp, value)
+        return point
+
+    def _archive(self, timestamp: datetime, value: float) -> Point:
+        self.last_time = timestamp
+        self.last_value = value
+        self.held = None
+        self.slope_max = float("inf")
+        self.slope_min = float("-inf")
+        self.archived.inc()
+        return timestamp, value
+
+class TagFilterBank:
+    """
+    One TagFilter per tag, configured from the tag list. Tags without a
+    TagConfig (HTTP sources, webhooks) get a plain change filter.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TagFilterBank, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.configs: Dict[str, object] = {}
+        self.filters: Dict[str, TagFilter] = {}
+        self.built = False
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls()
+        return cls._instance
+
+    def rebuild(self):
+        self.configs = {tag.name: tag for tag in settings.app_config.tags}
+        self.filters = {}
+        self.built = True
+
+    def filter_for(self, tag_name: str) -> TagFilter:
+        tag_filter = self.filters.get(tag_name)
+        if tag_filter is None:
+            if not self.built:
+                self.rebuild()
+            config = self.configs.get(tag_name)
+            tag_filter = TagFilter.from_config(config) if config is not None else TagFilter(tag_name)
+            self.filters[tag_name] = tag_filter
+        return tag_filter
+
+    def heartbeats(self, table, now: datetime) -> List[Tuple[datetime, str, float]]:
+        """
+        Heartbeat rows for tags with a max_interval that were not offered a
+        sample for that long, from their good values in the current-value
+        `table`. Bad-quality values are not repeated.
+        """
+        rows = []
+        for tag_name, tag_filter in self.filters.items():
+            if not tag_filter.max_interval:
+                continue
+            current = table.lookup(tag_name)
+            if current is None or current.quality != QUALITY_GOOD:
+                continue
+            point = tag_filter.heartbeat(now, current.value)
+            if point is not None:
+                rows.append((point[0], tag_name, point[1]))
+        return rows
+
+    def apply(self, samples: Mapping[str, float], timestamp: datetime) -> List[Tuple[datetime, str, float]]:
+        """Run a scan through the filters; returns the historian rows to write."""
+        rows = []
+        for tag_name, value in samples.items():
+            point = self.filter_for(tag_name).offer(timestamp, value)
+            if point is not None:
+                rows.append((point[0], tag_name, point[1]))
+        return rows
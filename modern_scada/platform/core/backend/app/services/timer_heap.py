@@ -0,0 +1,60 @@
+import heapq
+import itertools
+from typing import Dict, Hashable, List, Optional, Tuple
+
+class TimerHeap:
+    """
+    Deadlines keyed by an arbitrary hashable (rule index, alarm id, ...).
+
+    A min-heap ordered by deadline: scheduling and popping are O(log n)
+    and `pop_due` touches only timers that actually expired. Re-scheduling
+    or cancelling a key leaves its old heap entry behind; stale entries
+    are recognised by their deadline and skipped when they surface.
+    """
+    __slots__ = ("heap", "deadlines", "counter")
+
+    def __init__(self):
+        self.heap: List[Tuple[float, int, Hashable]] = []
+        self.deadlines: Dict[Hashable, float] = {}
+        self.counter = itertools.count()  # Tie-break: equal deadlines fire in scheduling order
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key) -> bool:
+        return key in self.deadlines
+
+    def schedule(self, key: Hashable, deadline: float):
+        """Set (or move) the deadline of `key`."""
+        if self.deadlines.get(key) == deadline:
+            return
+        self.deadlines[key] = deadline
+        heapq.heappush(self.heap, (deadline, next(self.counter), key))
+
+    def cancel(self, key: Hashable):
+        self.deadlines.pop(key, None)
+
+    def clear(self):
+        self.heap.clear()
+        self.deadlines.clear()
+
+    def _discard_stale(self):
+        heap, deadlines = self.heap, self.deadlines
+        while heap and deadlines.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_deadline(self) -> Optional[float]:
+        self._discard_stale()
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now: float) -> List[Hashable]:
+        """Remove and return the keys whose deadline is <= now, earliest first."""
+        due = []
+        heap, deadlines = self.heap, self.deadlines
+        while True:
+            self._discard_stale()
+            if not heap or heap[0][0] > now:
+                return due
+            _, _, key = heapq.heappop(heap)
+            del deadlines[key]
+            due.append(key)
@@ -3,7 +3,7 @@ import json
 import logging
 from datetime import datetime
 from services.redis_service import RedisService
-from app.services.data_service import DataService
+from app.services.historian_writer import HistorianWriter
 
 logger = logging.getLogger(__name__)
 
@@ -48,8 +48,8 @@ async def historian_loop():
                             else:
                                 timestamp = datetime.utcnow()
                                 
-                            # Save to DB
-                            await DataService.save_sensor_data(tag_name, value, timestamp)
+                            # Queue for the batched historian writer
+                            HistorianWriter.get().enqueue([(timestamp, tag_name, value)])
                             # logger.debug(f"Historian saved {tag_name}={value}")
                             
                 except Exception as e:
@@ -83,7 +83,8 @@ async def poll_single_http_source(source_config, processor: EventProcessor, clie
         # Parse JSON response
         json_data = response.json()
         
-        # Extract and process each tag
+        # Extract each tag, then ingest the response as one batch
+        samples = []
         for tag in source_config.tags:
             value = get_nested_value(json_data, tag.json_key)
             
@@ -91,14 +92,17 @@ async def poll_single_http_source(source_config, processor: EventProcessor, clie
                 # Convert to float if possible (SCADA typically uses numeric values)
                 try:
                     numeric_value = float(value)
-                    await processor.process_data(tag.name, numeric_value)
+                    samples.append((tag.name, numeric_value))
                     logger.debug(f"Processed {tag.name} = {numeric_value} from {source_config.url}")
                 except (ValueError, TypeError):
                     logger.warning(f"Could not convert value '{value}' to float for tag {tag.name}")
             else:
                 logger.warning(f"Tag {tag.name} returned None from key '{tag.json_key}'")
         
-        logger.info(f"✓ Successfully polled {source_config.url} - {len(source_config.tags)} tags processed")
+        if samples:
+            await processor.process_batch(samples)
+        
+        logger.info(f"✓ Successfully polled {source_config.url} - {len(samples)}/{len(source_config.tags)} tags processed")
                 
     except httpx.TimeoutException:
         logger.error(f"Timeout polling {source_config.url}")
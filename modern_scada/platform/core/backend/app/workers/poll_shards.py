@@ -0,0 +1,179 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.services.ingest_pipeline import SinkQueue
+
+logger = logging.getLogger(__name__)
+
+def assign_shards(connections: List, tags: List, workers: int) -> List[List[str]]:
+    """
+    Split connection names across `workers` shards, balancing by tag count
+    (largest first onto the least loaded shard). Deterministic, so the same
+    config always produces the same assignment.
+    """
+    workers = max(1, min(workers, len(connections)))
+    weights = {conn.name: 0 for conn in connections}
+    for tag in tags:
+        if tag.connection_name in weights:
+            weights[tag.connection_name] += 1
+
+    shards: List[List[str]] = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for name in sorted(weights, key=lambda n: (-weights[n], n)):
+        target = loads.index(min(loads))
+        shards[target].append(name)
+        loads[target] += max(weights[name], 1)
+    return shards
+
+def shard_config(app_config) -> dict:
+    """
+    Picklable config for a shard process; `AppConfig.model_validate` must
+    accept it back, so aliased fields (Scaling) are dumped by alias.
+    """
+    return app_config.model_dump(mode="json", by_alias=True)
+
+def merge_shard_messages(old: List, new: List) -> List:
+    """
+    Conflate queued shard messages: consecutive sample batches merge per
+    tag (newest value and scan time win); quality changes keep their order.
+    """
+    last, first = old[-1], new[0]
+    if last[0] == "batch" and first[0] == "batch":
+        samples = {**dict(last[1]), **dict(first[1])}
+        return old[:-1] + [("batch", list(samples.items()), max(last[2], first[2]))] + new[1:]
+    return old + new
+
+class ShardSink:
+    """
+    Stands in for EventProcessor inside a shard process: decoded scans are
+    pickled onto the pipe to the API process instead of being processed.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def process_batch(self, samples: Iterable[Tuple[str, float]], scan_timestamp: Optional[datetime] = None):
+        samples = list(samples)
+        if samples:
+            self.conn.send(("batch", samples, scan_timestamp or datetime.utcnow()))
+
+    async def mark_bad_quality(self, tag_names: Iterable[str]):
+        self.conn.send(("bad_quality", list(tag_names)))
+
+def run_shard(shard_id: int, config: dict, connection_names: List[str], conn):
+    """Entry point of a shard process."""
+    logging.basicConfig(level=logging.INFO)
+    from app.config import AppConfig, settings
+    from app.services.modbus_read_plan import ReadPlanCache
+    from app.workers.polling import scan_scheduler
+
+    settings.app_config = AppConfig.model_validate(config)
+    ReadPlanCache.get().rebuild()
+    sink = ShardSink(conn)
+
+    async def main():
+        logger.info(f"Poll shard {shard_id} scanning {', '.join(connection_names)}")
+        await asyncio.gather(*(scan_scheduler(name, sink) for name in connection_names))
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+class ShardSupervisor:
+    """
+    Runs polling in a pool of worker processes, each owning a subset of
+    plc.connections. Shards decode their own scans and send sample batches
+    back over a pipe; the API process only runs EventProcessor on them.
+
+    Messages wait in a SinkQueue (pipeline.shards) until EventProcessor
+    takes them, so a slow processor either conflates them per tag or, with
+    overflow "block", backs up the pipes and slows the shards down.
+
+    Config changes (ReadPlanCache version bumps) and dead shards restart the
+    pool with the current config.
+    """
+    def __init__(self, processor):
+        self.processor = processor
+        self.ctx = multiprocessing.get_context("spawn")  # Never fork a running event loop
+        self.processes: List = []
+        self.readers: List[threading.Thread] = []
+        self.queue: Optional[SinkQueue] = None
+        self.config_version = None
+
+    def healthy(self, config_version) -> bool:
+        return (
+            self.config_version == config_version
+            and bool(self.processes)
+            and all(p.is_alive() for p in self.processes)
+        )
+
+    def start(self, app_config, workers: int, config_version):
+        loop = asyncio.get_running_loop()
+        if self.queue is None:
+            self.queue = SinkQueue("shards", self._consume, merge_shard_messages)
+            self.queue.start()
+
+        config = shard_config(app_config)
+        for shard_id, names in enumerate(assign_shards(app_config.plc.connections, app_config.tags, workers)):
+            parent_conn, child_conn = self.ctx.Pipe(duplex=False)
+            process = self.ctx.Process(
+                target=run_shard,
+                args=(shard_id, config, names, child_conn),
+                name=f"poll-shard-{shard_id}",
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            reader = threading.Thread(target=self._read, args=(parent_conn, loop), daemon=True)
+            reader.start()
+            self.processes.append(process)
+            self.readers.append(reader)
+            logger.info(f"Started poll shard {shard_id} (pid {process.pid}) for {', '.join(names)}")
+        self.config_version = config_version
+
+    def _read(self, conn, loop):
+        # Blocking recv() lives on a thread so the event loop never waits on a pipe
+        queue = self.queue
+        try:
+            while True:
+                message = conn.recv()
+                # Waits while a "block" queue is full; the pipe then fills up and the shard waits too
+                asyncio.run_coroutine_threadsafe(queue.put([message]), loop).result()
+        except (EOFError, OSError, RuntimeError, concurrent.futures.CancelledError):
+            pass
+        finally:
+            conn.close()
+
+    async def _consume(self, messages: List):
+        for kind, *payload in messages:
+            try:
+                if kind == "batch":
+                    await self.processor.process_batch(payload[0], payload[1])
+                elif kind == "bad_quality":
+                    await self.processor.mark_bad_quality(payload[0])
+            except Exception as e:
+                logger.error(f"Error processing shard {kind}: {e}")
+
+    async def stop(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            # join() blocks; keep the API event loop free while shards exit
+            await asyncio.to_thread(process.join, 5)
+        self.processes = []
+        self.readers = []
+        self.config_version = None
+
+    async def close(self):
+        await self.stop()
+        if self.queue is not None:
+            await self.queue.stop()
+            self.queue = None
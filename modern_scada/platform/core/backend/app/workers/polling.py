@@ -1,148 +1,341 @@
 import asyncio
 import logging
-from pymodbus.client import AsyncModbusTcpClient
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Optional, Tuple
 from app.config import settings
 from app.services.event_processor import EventProcessor
+from app.services.modbus_codecs import is_bit_function
+from app.services.modbus_connection_manager import ModbusConnectionManager
+from app.services.modbus_read_plan import ReadPlanCache, due_classes, scan_tick
 from app.services.websocket_manager import manager
 from app.services.state_builder import StateBuilder
 
 logger = logging.getLogger(__name__)
 
-import struct
 import time
 
-async def poll_single_plc(connection_config, processor):
-    client = AsyncModbusTcpClient(connection_config.host, port=connection_config.port)
+# Modbus exception code returned for reads that touch unmapped registers
+ILLEGAL_DATA_ADDRESS = 2
+
+# TagConfig.function -> client read method
+READ_METHODS = {
+    "holding": "read_holding_registers",
+    "input": "read_input_registers",
+    "coil": "read_coils",
+    "discrete": "read_discrete_inputs",
+}
+
+class RegisterSnapshot:
+    """
+    Raw register buffers of the previous scan, per block, for one connection.
+    Used to decode and dispatch only the tags whose bytes changed.
+
+    Every `integrity_interval` reads of a block all of its tags are decoded
+    anyway. Counting per block keeps slow scan classes from missing their
+    integrity scans when they only come due on some ticks.
+    """
+    def __init__(self, integrity_interval: int = 0):
+        self.plan_version = None
+        self.integrity_interval = integrity_interval
+        self.buffers: Dict[Tuple, List[int]] = {}  # {ReadBlock.key: registers or bits}
+        self.reads: Dict[Tuple, int] = {}
+
+    def reset(self, plan_version=None):
+        self.plan_version = plan_version
+        self.buffers = {}
+        self.reads = {}
+
+    def decode(self, block, registers: List[int], integrity: bool) -> List:
+        key = block.key
+        previous = self.buffers.get(key)
+        self.buffers[key] = registers
+        reads = self.reads.get(key, 0) + 1
+        self.reads[key] = reads
+        if self.integrity_interval > 0 and reads % self.integrity_interval == 0:
+            integrity = True
+        if integrity or previous is None:
+            return block.decoder.decode(registers)
+        if registers == previous:
+            return []
+        return block.decoder.decode_changed(registers, previous)
+
+snapshots: Dict[str, RegisterSnapshot] = {}
+
+async def read_block(client, connection_config, block, optimizer,
+                     snapshot: Optional[RegisterSnapshot] = None, integrity: bool = True) -> Tuple[List, bool]:
+    """
+    Read and decode one block. When the device rejects the range with an
+    illegal-data-address exception, split the block, keep reading the
+    halves and teach the optimizer which range to avoid.
+
+    With a snapshot, only tags whose registers changed since the previous
+    scan are decoded unless this is an integrity scan.
+
+    Returns the decoded samples and whether the range read cleanly.
+    """
+    connections = ModbusConnectionManager.get()
+    async with connections.lock(connection_config.name):
+        # Timed once the lock is held; pipelined clients report their own
+        # wire time, excluding the wait for a free in-flight slot
+        start = time.monotonic()
+        read = getattr(client, READ_METHODS[block.function])
+        rr = await read(block.start, count=block.count, device_id=block.unit)
+        elapsed = getattr(rr, "elapsed", None)
+        optimizer.observe(block.count, elapsed if isinstance(elapsed, float) else time.monotonic() - start)
+
+    if rr.isError():
+        if getattr(rr, "exception_code", None) != ILLEGAL_DATA_ADDRESS:
+            logger.error(f"Modbus Error on {connection_config.name} unit {block.unit} {block.function} {block.start}-{block.start+block.count}: {rr}")
+            return [], True
+
+        if len(block.slots) == 1:
+            slot = block.slots[0]
+            logger.warning(f"{connection_config.name}: tag {slot.name} at {block.start} is an illegal address, excluding it")
+            optimizer.mark_bad(block.start, block.start + block.count)
+            return [], False
+
+        left, right = block.split()
+        left_samples, left_clean = await read_block(client, connection_config, left, optimizer, snapshot, integrity)
+        right_samples, right_clean = await read_block(client, connection_config, right, optimizer, snapshot, integrity)
+        if left_clean and right_clean:
+            gap_start, gap_end = left.start + left.count, right.start
+            if gap_end > gap_start:
+                logger.warning(f"{connection_config.name}: registers {gap_start}-{gap_end} are unmapped, no longer bridging them")
+                optimizer.mark_bad(gap_start, gap_end)
+            else:
+                optimizer.limit_block(block.count - 1)
+        return left_samples + right_samples, False
+    
+    # Bit reads come back padded to whole bytes
+    registers = rr.bits[:block.count] if is_bit_function(block.function) else rr.registers
+    if len(registers) != block.count:
+        logger.error(f"Short read on {connection_config.name} unit {block.unit} {block.function} {block.start}: {len(registers)}/{block.count}")
+        return [], True
+
+    if snapshot is not None:
+        return snapshot.decode(block, registers, integrity), True
+    # Decode the whole block in one pass
+    return block.decoder.decode(registers), True
+
+async def poll_single_plc(connection_config, processor, due: Optional[FrozenSet[int]] = None):
+    """
+    Scan one PLC. `due` restricts the scan to those scan classes (ms);
+    None scans every tag of the connection.
+    """
+    connections = ModbusConnectionManager.get()
+    plans = ReadPlanCache.get()
     
     try:
-        await client.connect()
-        if client.connected:
-            # Filter tags for this connection
-            connection_tags = [
-                tag for tag in settings.app_config.tags 
-                if tag.connection_name == connection_config.name
-            ]
-            
-            if not connection_tags:
-                return
-
-            # 1. Sort tags by address
-            connection_tags.sort(key=lambda x: x.address)
-
-            # 2. Dynamic Grouping
-            groups = []
-            if connection_tags:
-                current_group_tags = [connection_tags[0]]
-                current_start = connection_tags[0].address
-                # Assuming float32 takes 2 registers
-                current_end = current_start + 2
-                
-                for tag in connection_tags[1:]:
-                    tag_start = tag.address
-                    tag_end = tag_start + 2
-                    
-                    # Calculate gap from the end of the previous tag
-                    prev_tag = current_group_tags[-1]
-                    prev_end = prev_tag.address + 2
-                    gap = tag_start - prev_end
-                    
-                    # Calculate potential new length of the group
-                    new_group_end = max(current_end, tag_end)
-                    total_len = new_group_end - current_start
-                    
-                    # Grouping rules: Gap <= 20 AND Total Length <= 100
-                    if gap <= 20 and total_len <= 100:
-                        current_group_tags.append(tag)
-                        current_end = new_group_end
-                    else:
-                        # Finalize current group
-                        groups.append((current_start, current_end - current_start, current_group_tags))
-                        # Start new group
-                        current_group_tags = [tag]
-                        current_start = tag_start
-                        current_end = tag_end
-                
-                # Append the last group
-                groups.append((current_start, current_end - current_start, current_group_tags))
+        plan = plans.plan_for(connection_config.name, due)
+        if plan is None or not plan.blocks:
+            return
 
-            # 3. Optimized Reading
-            for start_addr, count, group_tags in groups:
-                try:
-                    rr = await client.read_holding_registers(start_addr, count=count, device_id=1)
-                    
-                    if rr.isError():
-                        logger.error(f"Modbus Error on {connection_config.name} group {start_addr}-{start_addr+count}: {rr}")
-                        continue
-                    
-                    registers = rr.registers
-                    
-                    # 4. Map Data
-                    for tag in group_tags:
-                        # Calculate relative offset in the read buffer
-                        offset = tag.address - start_addr
-                        
-                        # Ensure we have enough data for this tag (2 registers for float32)
-                        if offset >= 0 and offset + 1 < len(registers):
-                            regs = registers[offset:offset+2]
-                            try:
-                                b = struct.pack('>HH', regs[0], regs[1])
-                                val = struct.unpack('>f', b)[0]
-                                await processor.process_data(tag.name, val)
-                            except Exception as e:
-                                logger.error(f"Error decoding tag {tag.name}: {e}")
-                                
-                except Exception as e:
-                    logger.error(f"Error reading group starting at {start_addr} on {connection_config.name}: {e}")
-                    # Continue to next group instead of breaking
+        client = await connections.get_client(connection_config)
+        if client is not None:
+            snapshot = snapshots.setdefault(connection_config.name, RegisterSnapshot())
+            if snapshot.plan_version != plan.version:
+                snapshot.reset(plan.version)
+            snapshot.integrity_interval = connection_config.integrity_scan_interval
+            integrity = not connection_config.report_by_exception
+
+            samples = []
+            scan_timestamp = datetime.utcnow()
+            # Issue every block at once; pipelined clients keep up to
+            # pipeline_depth of them in flight, serial clients queue on the lock
+            results = await asyncio.gather(
+                *(
+                    read_block(client, connection_config, block,
+                               plans.optimizer_for(connection_config, block.unit, block.function), snapshot, integrity)
+                    for block in plan.blocks
+                ),
+                return_exceptions=True
+            )
+            failed = 0
+            for block, result in zip(plan.blocks, results):
+                if isinstance(result, Exception):
+                    # Continue with the other groups instead of dropping the scan
+                    logger.error(f"Error reading group starting at {block.start} on {connection_config.name}: {result}")
+                    failed += 1
+                    continue
+                samples.extend(result[0])
+
+            if not client.connected:
+                # Transport dropped mid-scan, reconnect on the next scan
+                connections.invalidate(connection_config.name)
+                snapshot.reset()
+            if failed == len(plan.blocks) or not client.connected:
+                connections.record_failure(connection_config)
+            else:
+                connections.record_success(connection_config)
+            if failed == len(plan.blocks):
+                # Connected but not answering: the last values are stale, and
+                # the next good scan has to decode everything to restore them
+                snapshot.reset(plan.version)
+                await processor.mark_bad_quality(connection_tags(connection_config.name))
+
+            if samples:
+                from app.services.metrics_service import MetricsService
+                MetricsService.get().tags_read_total.labels(connection=connection_config.name).inc(len(samples))
+                await processor.process_batch(samples, scan_timestamp)
+
+            if plans.needs_replan(connection_config.name):
+                plans.replan(connection_config)
                     
         else:
             logger.warning(f"PLC {connection_config.name} disconnected")
+            # Values may have moved while we were away; decode everything on reconnect
+            snapshots.pop(connection_config.name, None)
+            await processor.mark_bad_quality(connection_tags(connection_config.name))
             
     except Exception as e:
         logger.error(f"Polling error on {connection_config.name}: {e}")
-    finally:
-        client.close()
+        connections.invalidate(connection_config.name)
+        connections.record_failure(connection_config)
+        snapshots.pop(connection_config.name, None)
+        try:
+            await processor.mark_bad_quality(connection_tags(connection_config.name))
+        except Exception as mark_error:
+            logger.error(f"Failed to mark {connection_config.name} tags bad: {mark_error}")
+
+def connection_tags(name: str) -> List[str]:
+    return [tag.name for tag in settings.app_config.tags if tag.connection_name == name]
+
+def find_connection(name: str):
+    for conn in settings.app_config.plc.connections:
+        if conn.name == name:
+            return conn
+    return None
+
+async def scan_scheduler(connection_name: str, processor):
+    """
+    Scan one PLC on the monotonic clock, honouring each tag's scan class.
+
+    The scheduler ticks at the greatest common divisor of the connection's
+    scan rates and on every tick reads the classes that are due, merged
+    into one plan. Deadlines advance by a fixed tick from the first scan,
+    so scan duration does not accumulate as drift. A scan that runs past
+    its next deadline is counted as an overrun; the missed ticks are
+    skipped rather than fired back-to-back, and the classes they would
+    have read are carried into the next scan.
+    """
+    from app.services.metrics_service import MetricsService
+    metrics = MetricsService.get()
+    plans = ReadPlanCache.get()
+
+    rates = None
+    tick_index = 0
+    pending = frozenset()
+    next_deadline = time.monotonic()
+    while True:
+        # Re-read the config every scan so interval/host/class changes apply live
+        connection = find_connection(connection_name)
+        if connection is None:
+            logger.info(f"PLC {connection_name} removed from config, stopping its scheduler")
+            return
+        current = plans.scan_rates(connection_name) or [round(connection.poll_interval * 1000)]
+        if current != rates:
+            rates, tick_index = current, 0
+            tick = scan_tick(rates)
+            interval = tick / 1000
+            logger.info(f"Scan classes for {connection_name}: {', '.join(f'{r} ms' for r in rates)} (tick {tick} ms)")
+
+        due = due_classes(rates, tick_index, tick) | pending
+        pending = frozenset()
+
+        start = time.monotonic()
+        metrics.scan_jitter.labels(connection=connection_name).observe(max(start - next_deadline, 0.0))
+
+        try:
+            await poll_single_plc(connection, processor, due)
+        except Exception as e:
+            logger.error(f"Scan error on {connection_name}: {e}")
+
+        now = time.monotonic()
+        metrics.polling_duration.labels(connection=connection_name).observe(now - start)
+
+        next_deadline += interval
+        tick_index += 1
+        if now > next_deadline:
+            missed = int((now - next_deadline) // interval) + 1
+            metrics.scan_overruns_total.labels(connection=connection_name).inc(missed)
+            logger.warning(f"Scan overrun on {connection_name}: {now - start:.3f}s > {interval}s, skipping {missed} tick(s)")
+            for skipped in range(tick_index, tick_index + min(missed, max(rates) // tick)):
+                pending |= due_classes(rates, skipped, tick)
+            next_deadline += missed * interval
+            tick_index += missed
+
+        await asyncio.sleep(next_deadline - time.monotonic())
+
+async def broadcast_loop():
+    """
+    Push the plant-wide state to WebSocket clients at plc.broadcast_interval,
+    independent of how often individual PLCs are scanned.
+    """
+    while True:
+        try:
+            system_state = StateBuilder.build_system_state()
+            await manager.broadcast({"type": "update", "data": system_state})
+        except Exception as e:
+            logger.error(f"State broadcast error: {e}")
+        await asyncio.sleep(settings.app_config.plc.broadcast_interval)
 
 async def polling_loop():
     print("DEBUG: polling_loop started!")
+    schedulers = {}  # {connection_name: Task}
+    broadcaster = None
+    shards = None
     try:
         logger.info("Starting Polling Worker")
         processor = EventProcessor()
-        
-        from app.services.metrics_service import MetricsService
-        metrics = MetricsService.get()
+        broadcaster = asyncio.create_task(broadcast_loop())
 
         while True:
             try:
                 connections = settings.app_config.plc.connections
+                workers = settings.app_config.plc.poll_workers
                 if not connections:
                     logger.warning("No PLC connections configured")
-                    await asyncio.sleep(5)
-                    continue
 
-                start_time = time.time()
-                tasks = [poll_single_plc(conn, processor) for conn in connections]
-                await asyncio.gather(*tasks)
-                duration = time.time() - start_time
-                
-                # Record Metrics
-                for conn in connections:
-                    metrics.polling_duration.labels(connection=conn.name).observe(duration)
-                
-                # Broadcast updates after polling all PLCs
-                system_state = StateBuilder.build_system_state()
-                await manager.broadcast({"type": "update", "data": system_state})
+                if workers > 0 and connections:
+                    # Sharded mode: worker processes scan, this process only ingests
+                    for name in list(schedulers):
+                        schedulers.pop(name).cancel()
+                    if shards is None:
+                        from app.workers.poll_shards import ShardSupervisor
+                        shards = ShardSupervisor(processor)
+                    version = ReadPlanCache.get().version
+                    if not shards.healthy(version):
+                        await shards.stop()
+                        shards.start(settings.app_config, workers, version)
+                else:
+                    if shards is not None:
+                        await shards.close()
+                        shards = None
+
+                    # Reconcile one scheduler task per configured connection
+                    for conn in connections:
+                        task = schedulers.get(conn.name)
+                        if task is None or task.done():
+                            logger.info(f"Starting scan scheduler for {conn.name} ({conn.poll_interval}s)")
+                            schedulers[conn.name] = asyncio.create_task(scan_scheduler(conn.name, processor))
+                    for name in list(schedulers):
+                        if find_connection(name) is None:
+                            schedulers.pop(name).cancel()
                     
             except Exception as e:
                 logger.error(f"Global polling loop error: {e}")
                 print(f"DEBUG: Global polling loop error: {e}")
-            
-            # Use the poll interval from the first connection or default
-            interval = 1.0
-            if settings.app_config.plc.connections:
-                interval = settings.app_config.plc.connections[0].poll_interval
                 
-            await asyncio.sleep(interval)
+            await asyncio.sleep(5)
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         print(f"DEBUG: CRITICAL polling_loop startup error: {e}")
         logger.error(f"CRITICAL polling_loop startup error: {e}")
+    finally:
+        for task in schedulers.values():
+            task.cancel()
+        if shards is not None:
+            await shards.close()
+        if broadcaster:
+            broadcaster.cancel()
@@ -1,22 +1,32 @@
+import asyncio
+import logging
 import time
 import math
 import random
 import sys
 import os
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
 
 # Add parent directory to path to allow imports if running standalone
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from domain_models import Equipment, ParameterConfig, AlarmRule, AlarmType, ActiveAlarmState, AlarmStatus
 from services.redis_service import RedisService
+from app.services.timer_heap import TimerHeap
+
+logger = logging.getLogger(__name__)
 
 class LogicEngine:
-    def __init__(self, redis_service: Optional[RedisService] = None):
+    def __init__(self, redis_service: Optional[RedisService] = None, clock: Callable[[], float] = time.time):
         # State storage
         self.last_logged_values: Dict[str, float] = {} # Key: param_id
         self.alarm_start_times: Dict[str, float] = {} # Key: rule_id (for On-Delay)
         self.active_alarms: Dict[str, ActiveAlarmState] = {} # Key: rule_id
+        self.alarm_timers = TimerHeap() # On-Delay deadlines, Key: rule_id
+        self.pending_alarms: Dict[str, tuple] = {} # Key: rule_id -> (rule, value) waiting for its On-Delay
+        self.clock = clock
+        self.timer_wakeup = asyncio.Event() # Set when an earlier On-Delay deadline is scheduled
+        self.timer_task: Optional[asyncio.Task] = None
         
         # Redis Integration
         self.redis = redis_service
@@ -61,7 +71,7 @@ class LogicEngine:
         Handles On-Delay and Hysteresis.
         Updates Redis with active alarms.
         """
-        current_time = time.time()
+        current_time = self.clock()
         triggered_events = []
 
         for rule in rules:
@@ -85,19 +95,11 @@ class LogicEngine:
                 if duration >= rule.on_delay_seconds:
                     # Condition met for long enough -> Raise Alarm
                     if rule.id not in self.active_alarms:
-                        new_alarm = ActiveAlarmState(
-                            ruleId=rule.id,
-                            triggerTime=current_time,
-                            valueAtTrigger=current_val,
-                            status=AlarmStatus.ACTIVE_UNACKED
-                        )
-                        self.active_alarms[rule.id] = new_alarm
-                        triggered_events.append(new_alarm)
-                        
-                        # Sync to Redis
-                        if self.redis:
-                            # Convert Pydantic model to dict (using alias)
-                            self.redis.set_active_alarms(rule.id, new_alarm.model_dump(by_alias=True))
+                        triggered_events.append(self._raise_alarm(rule, current_val, current_time))
+                elif rule.id not in self.active_alarms:
+                    # Raise it when the delay runs out, even if no new sample arrives
+                    self.pending_alarms[rule.id] = (rule, current_val)
+                    self._schedule_alarm(rule.id, self.alarm_start_times[rule.id] + rule.on_delay_seconds)
                             
             else:
                 # Condition NOT met (or cleared)
@@ -130,5 +132,81 @@ class LogicEngine:
                 # Reset Timer if condition is not met
                 if rule.id in self.alarm_start_times:
                      del self.alarm_start_times[rule.id]
+                self.alarm_timers.cancel(rule.id)
+                self.pending_alarms.pop(rule.id, None)
 
         return triggered_events
+
+    def _raise_alarm(self, rule: AlarmRule, current_val: float, current_time: float) -> ActiveAlarmState:
+        self.alarm_timers.cancel(rule.id)
+        self.pending_alarms.pop(rule.id, None)
+        new_alarm = ActiveAlarmState(
+            ruleId=rule.id,
+            triggerTime=current_time,
+            valueAtTrigger=current_val,
+            status=AlarmStatus.ACTIVE_UNACKED
+        )
+        self.active_alarms[rule.id] = new_alarm
+        
+        # Sync to Redis
+        if self.redis:
+            # Convert Pydantic model to dict (using alias)
+            self.redis.set_active_alarms(rule.id, new_alarm.model_dump(by_alias=True))
+        return new_alarm
+
+    def _schedule_alarm(self, rule_id: str, deadline: float):
+        earliest = self.alarm_timers.next_deadline()
+        self.alarm_timers.schedule(rule_id, deadline)
+        if earliest is None or deadline < earliest:
+            self.timer_wakeup.set()
+
+    def next_timer(self) -> Optional[float]:
+        """Deadline of the next pending On-Delay, for the caller to sleep until."""
+        return self.alarm_timers.next_deadline()
+
+    def check_timers(self, now: Optional[float] = None) -> List[ActiveAlarmState]:
+        """
+        Raise the alarms whose On-Delay expired by `now` while their
+        condition kept holding (no sample cleared them in between).
+        """
+        current_time = self.clock() if now is None else now
+        triggered_events = []
+        for rule_id in self.alarm_timers.pop_due(current_time):
+            rule, current_val = self.pending_alarms.pop(rule_id)
+            if rule_id not in self.active_alarms:
+                triggered_events.append(self._raise_alarm(rule, current_val, current_time))
+        return triggered_events
+
+    async def run_timers(self, on_alarm: Optional[Callable[[ActiveAlarmState], None]] = None):
+        """
+        Sleep until the next On-Delay deadline and raise the alarms that
+        expired, so they fire without waiting for another sample.
+        `on_alarm` receives each alarm raised this way.
+        """
+        while True:
+            deadline = self.next_timer()
+            timeout = None if deadline is None else max(0.0, deadline - self.clock())
+            try:
+                await asyncio.wait_for(self.timer_wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self.timer_wakeup.clear()
+            try:
+                for alarm in self.check_timers():
+                    if on_alarm is not None:
+                        on_alarm(alarm)
+            except Exception as e:
+                logger.error(f"Alarm timer error: {e}")
+
+    def start_timers(self, on_alarm: Optional[Callable[[ActiveAlarmState], None]] = None):
+        if self.timer_task is None or self.timer_task.done():
+            self.timer_task = asyncio.create_task(self.run_timers(on_alarm))
+
+    async def stop_timers(self):
+        if self.timer_task is not None:
+            self.timer_task.cancel()
+            try:
+                await self.timer_task
+            except asyncio.CancelledError:
+                pass
+            self.timer_task = None
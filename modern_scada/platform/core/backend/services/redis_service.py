@@ -10,6 +10,7 @@ class RedisService:
         self.port = int(os.getenv("REDIS_PORT", port))
         self.db = int(os.getenv("REDIS_DB", db))
         self.client = redis.Redis(host=self.host, port=self.port, db=self.db, decode_responses=True)
+        self.async_pool = None  # Shared by every async client of this service, created on first use
 
     def set_parameter(self, equipment_id: str, param_id: str, value_data: Dict[str, Any]):
         """
@@ -85,9 +86,24 @@ class RedisService:
     async def get_async_client(self):
         """
         Returns an async Redis client for FastAPI/AsyncIO context.
+        All clients of this service share one connection pool.
         """
         import redis.asyncio as aioredis
-        return aioredis.Redis(host=self.host, port=self.port, db=self.db, decode_responses=True)
+        if self.async_pool is None:
+            max_connections = int(os.getenv("REDIS_MAX_CONNECTIONS", 16))
+            self.async_pool = aioredis.ConnectionPool(
+                host=self.host, port=self.port, db=self.db, decode_responses=True, max_connections=max_connections
+            )
+        return aioredis.Redis(connection_pool=self.async_pool)
+
+    async def close_async_pool(self):
+        """
+        Disconnects the shared async connection pool. Call it from the
+        owner of this service once its async clients are closed.
+        """
+        if self.async_pool is not None:
+            await self.async_pool.disconnect()
+            self.async_pool = None
 
     def health_check(self) -> bool:
         try:
@@ -0,0 +1,90 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import patch
+from app.services.actuator_dispatcher import ActuatorDispatcher, load_readback_tags
+from app.services.current_value_table import CurrentValueTable
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = ActuatorDispatcher.get()
+    dispatcher.initialize()
+    CurrentValueTable.get().initialize()
+    sent = []
+    in_flight = {"now": 0, "max": 0}
+
+    async def send_control_command(device_id, command, parameter, value):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        if device_id == "broken":
+            raise ConnectionError("plc down")
+        sent.append((device_id, parameter, value))
+        return {"status": "success"}
+
+    with patch("app.services.device_control_service.DeviceControlService.send_control_command", side_effect=send_control_command):
+        dispatcher.sent = sent
+        dispatcher.in_flight = in_flight
+        yield dispatcher
+    dispatcher.initialize()
+    CurrentValueTable.get().initialize()
+
+@pytest.mark.asyncio
+async def test_devices_are_written_concurrently_and_repeats_skipped(dispatcher):
+    await asyncio.gather(*(dispatcher.send(device, "SET", "status", 1.0) for device in ("fan_01", "fan_02", "ww_01", "ww_02")))
+    assert len(dispatcher.sent) == 4
+    assert dispatcher.in_flight["max"] == 4
+
+    await asyncio.gather(*(dispatcher.send(device, "SET", "status", 1.0) for device in ("fan_01", "fan_02", "ww_01", "ww_02")))
+    assert len(dispatcher.sent) == 4
+
+def test_status_readback_tags_come_from_the_project_layout(dispatcher):
+    # The greenhouse layout reports fan_01 through fan_1_status
+    assert load_readback_tags()["fan_01"] == "fan_1_status"
+    assert dispatcher.readback_tag("fan_01", "status") == "fan_1_status"
+    assert dispatcher.readback_tag("fan_01", "speed") == "fan_01_speed"
+    assert dispatcher.readback_tag("mixer_main", "status") == "mixer_main_status"
+
+@pytest.mark.asyncio
+async def test_readback_wins_over_last_command(dispatcher):
+    await dispatcher.send("fan_01", "SET", "status", 1.0)
+    # Someone switched the fan off by hand
+    CurrentValueTable.get().update_batch([("fan_1_status", 0.0)])
+    await dispatcher.send("fan_01", "SET", "status", 1.0)
+    assert dispatcher.sent == [("fan_01", "status", 1.0), ("fan_01", "status", 1.0)]
+
+    CurrentValueTable.get().update_batch([("fan_1_status", 1.0)])
+    await dispatcher.send("fan_01", "SET", "status", 1.0)
+    assert len(dispatcher.sent) == 2
+
+@pytest.mark.asyncio
+async def test_last_command_expires_and_tracks_manual_writes(dispatcher):
+    await dispatcher.send("mixer_main", "SET", "cmd_mix_start", 1.0)
+    # A manual stop through the frontend bypasses the dispatcher
+    dispatcher.record_command("mixer_main", "cmd_mix_start", 0.0)
+    await dispatcher.send("mixer_main", "SET", "cmd_mix_start", 1.0)
+    assert len(dispatcher.sent) == 2
+
+    # Without a read-back, a PLC restart goes unnoticed until the TTL expires
+    value, _ = dispatcher.last_commanded[("mixer_main", "cmd_mix_start")]
+    dispatcher.last_commanded[("mixer_main", "cmd_mix_start")] = (value, time.monotonic() - 3600)
+    await dispatcher.send("mixer_main", "SET", "cmd_mix_start", 1.0)
+    assert len(dispatcher.sent) == 3
+
+@pytest.mark.asyncio
+async def test_same_device_is_coalesced_and_ordered(dispatcher):
+    first = dispatcher.send("mixer", "SET", "valve", 1.0)
+    second = dispatcher.send("mixer", "SET", "pump", 1.0)
+    third = dispatcher.send("mixer", "SET", "valve", 0.0)
+    await asyncio.gather(first, second, third)
+
+    assert dispatcher.sent == [("mixer", "pump", 1.0), ("mixer", "valve", 0.0)]
+    assert dispatcher.in_flight["max"] == 1
+
+@pytest.mark.asyncio
+async def test_failed_write_raises_and_is_retried(dispatcher):
+    with pytest.raises(ConnectionError):
+        await dispatcher.send("broken", "SET", "status", 1.0)
+    with pytest.raises(ConnectionError):
+        await dispatcher.send("broken", "SET", "status", 1.0)
@@ -0,0 +1,41 @@
+from app.config import AlarmConfig
+from app.services.alarm_index import AlarmIndex
+
+def make_rules():
+    return [
+        AlarmConfig(tag_name="temp", type="high", threshold=30.0, message="warm"),
+        AlarmConfig(tag_name="temp", type="high", threshold=35.0, message="hot"),
+        AlarmConfig(tag_name="temp", type="low", threshold=10.0, message="cold"),
+        AlarmConfig(tag_name="hum", type="high", threshold=90.0, message="wet"),
+    ]
+
+def make_index():
+    index = AlarmIndex.__new__(AlarmIndex)
+    index.initialize()
+    index.rebuild(make_rules())
+    return index
+
+def messages(index, transitions):
+    return [(index.rule(i).message, raised) for i, raised in transitions]
+
+def test_only_state_changes_are_reported():
+    index = make_index()
+
+    assert messages(index, index.evaluate({"temp": 20.0, "hum": 50.0})) == []
+    assert messages(index, index.evaluate({"temp": 36.0})) == [("warm", True), ("hot", True)]
+    assert messages(index, index.evaluate({"temp": 37.0, "other": 1.0})) == []
+    assert messages(index, index.evaluate({"temp": 32.0})) == [("hot", False)]
+    assert messages(index, index.evaluate({"temp": 5.0, "hum": 95.0})) == [("warm", False), ("cold", True), ("wet", True)]
+    assert index.active_count() == 2
+
+def test_rebuild_keeps_open_alarms():
+    index = make_index()
+    index.evaluate({"temp": 36.0})
+    index.alarm_ids[1] = 42
+
+    rules = make_rules()
+    index.rebuild([rules[1], rules[0]])
+
+    assert index.alarm_ids[0] == 42
+    assert messages(index, index.evaluate({"temp": 36.0})) == []
+    assert messages(index, index.evaluate({"temp": 20.0})) == [("warm", False), ("hot", False)]
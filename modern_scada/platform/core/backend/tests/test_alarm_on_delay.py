@@ -0,0 +1,44 @@
+import asyncio
+import time
+import pytest
+from domain_models import AlarmRule, AlarmType, Severity
+from logic.logic_engine import LogicEngine
+
+RULE = AlarmRule(id="temp_hi", type=AlarmType.HI, setpoint=30.0, severity=Severity.WARNING,
+                 onDelaySeconds=1, message="Temperature high")
+
+@pytest.mark.asyncio
+async def test_on_delay_expires_without_a_new_sample():
+    # The condition started 0.9 s ago, so the On-Delay runs out in 0.1 s
+    engine = LogicEngine(clock=lambda: time.time() - 0.9)
+    assert engine.check_alarms("zone_a", "temp", 31.0, [RULE]) == []
+    engine.clock = time.time
+
+    raised = []
+    engine.start_timers(raised.append)
+    try:
+        for _ in range(50):
+            if raised:
+                break
+            await asyncio.sleep(0.02)
+    finally:
+        await engine.stop_timers()
+
+    assert [alarm.rule_id for alarm in raised] == ["temp_hi"]
+    assert "temp_hi" in engine.active_alarms
+    assert engine.next_timer() is None
+
+@pytest.mark.asyncio
+async def test_cleared_condition_cancels_on_delay():
+    engine = LogicEngine(clock=lambda: time.time() - 0.9)
+    engine.check_alarms("zone_a", "temp", 31.0, [RULE])
+    engine.check_alarms("zone_a", "temp", 29.0, [RULE])
+    engine.clock = time.time
+
+    raised = []
+    engine.start_timers(raised.append)
+    await asyncio.sleep(0.2)
+    await engine.stop_timers()
+
+    assert raised == []
+    assert engine.active_alarms == {}
@@ -0,0 +1,46 @@
+from app.services.circuit_breaker import BreakerState, CircuitBreaker
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_breaker(clock):
+    return CircuitBreaker("plc", failure_threshold=2, reset_timeout=1.0, max_reset_timeout=4.0, jitter=0.0, clock=clock)
+
+def test_opens_after_threshold_and_probes_once():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow_request()
+
+    clock.now = 1.0
+    assert breaker.allow_request()
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert not breaker.allow_request()  # Only one probe in flight
+
+    breaker.record_success()
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.allow_request()
+
+def test_failed_probe_doubles_timeout_up_to_max():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    timeouts = []
+    for _ in range(4):
+        clock.now = breaker.open_until
+        assert breaker.allow_request()
+        breaker.record_failure()
+        timeouts.append(breaker.open_until - clock.now)
+
+    assert timeouts == [2.0, 4.0, 4.0, 4.0]
+    assert breaker.trips == 5
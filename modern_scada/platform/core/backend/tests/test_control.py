@@ -39,7 +39,9 @@ async def test_vendor_routing(mock_settings):
 @pytest.mark.asyncio
 async def test_modbus_routing(mock_settings):
     """Test that standard devices are routed to Modbus."""
-    with patch("app.services.device_control_service.AsyncModbusTcpClient") as mock_modbus_cls:
+    from app.services.modbus_connection_manager import ModbusConnectionManager
+    ModbusConnectionManager.get().initialize()
+    with patch("app.services.modbus_connection_manager.AsyncModbusTcpClient") as mock_modbus_cls:
         mock_client = AsyncMock()
         mock_modbus_cls.return_value = mock_client
         mock_client.connect = AsyncMock()
@@ -0,0 +1,63 @@
+from datetime import datetime
+from app.services.current_value_table import epoch, QUALITY_BAD, QUALITY_GOOD, QUALITY_UNSET, CurrentValueTable
+
+def make_table():
+    table = CurrentValueTable.get()
+    table.initialize()
+    return table
+
+def test_ids_are_stable_and_lookup_works_both_ways():
+    table = make_table()
+    ts = datetime(2025, 1, 1)
+
+    changed, _ = table.update_batch([("a", 1.0), ("b", 2.0)], ts)
+    assert changed == {"a": 1.0, "b": 2.0}
+    assert table.id_of("a") == 0 and table.id_of("b") == 1
+    assert table.name_of(1) == "b"
+    assert table.read(table.id_of("b")) == (2.0, epoch(ts), QUALITY_GOOD)
+    assert table.lookup("missing") is None
+
+    changed, _ = table.update_batch([("a", 1.0), ("b", 3.0)], ts)
+    assert changed == {"b": 3.0}
+    assert table.id_of("b") == 1
+
+def test_quality_and_recovery():
+    table = make_table()
+    table.update_batch([("a", 1.0), ("b", 2.0)])
+    assert table.set_quality(["a", "unknown"], QUALITY_BAD) == ["a"]
+    assert table.set_quality(["a"], QUALITY_BAD) == []
+    assert table.lookup("a").value == 1.0  # Last value is kept
+
+    changed, recovered = table.update_batch([("a", 1.0)])
+    assert changed == {}
+    assert recovered == ["a"]
+    assert table.lookup("a").quality == QUALITY_GOOD
+
+def test_diff_and_snapshot():
+    table = make_table()
+    table.update_batch([("a", 1.0), ("b", 2.0)])
+    version, changes = table.diff(0)
+    assert set(changes) == {"a", "b"}
+
+    snapshot = table.snapshot()
+    table.update_batch([("a", 1.0), ("b", 5.0)])
+    version, changes = table.diff(version)
+    assert list(changes) == ["b"]
+    assert table.diff(version)[1] == {}
+
+    # The snapshot is a copy
+    assert snapshot.as_dict() == {"a": 1.0, "b": 2.0}
+
+def test_view_behaves_like_the_old_dict():
+    table = make_table()
+    table.id_of("reserved")
+    view = table.view
+    view["x"] = 4.0
+
+    assert view.get("x") == 4.0
+    assert view.get("reserved", 0.0) == 0.0
+    assert "reserved" not in view
+    assert dict(view) == {"x": 4.0}
+    del view["x"]
+    assert len(view) == 0
+    assert table.quality[table.id_of("x")] == QUALITY_UNSET
@@ -0,0 +1,62 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.config import TagConfig
+from app.services.current_value_table import CurrentValueTable
+from app.services.event_processor import EventProcessor
+from app.services.tag_filter import TagFilterBank
+
+@pytest.fixture
+def processor():
+    CurrentValueTable.get().initialize()
+    processor = EventProcessor()
+    processor.initialize()
+    TagFilterBank.get().initialize()
+    with patch("app.services.event_processor.HistorianWriter") as mock_writer, \
+         patch("app.services.logic_engine.LogicEngine") as mock_engine, \
+         patch("app.services.logic_loader.LogicLoader") as mock_loader:
+        mock_engine.return_value.evaluate_batch = AsyncMock()
+        mock_loader.return_value = MagicMock()
+        processor.mock_writer = mock_writer.get.return_value
+        processor.mock_engine = mock_engine.return_value
+        processor.mock_loader = mock_loader.return_value
+        yield processor
+    CurrentValueTable.get().initialize()
+
+@pytest.mark.asyncio
+async def test_batch_writes_only_changed_samples_once(processor):
+    await processor.process_batch([("a", 1.0)], datetime(2025, 1, 1))
+    ts = datetime(2025, 1, 1, 0, 0, 1)
+
+    changed = await processor.process_batch([("a", 1.0), ("b", 2.0), ("c", 3.0)], ts)
+
+    assert changed == {"b": 2.0, "c": 3.0}
+    assert processor.mock_writer.enqueue.call_args[0][0] == [(ts, "b", 2.0), (ts, "c", 3.0)]
+    processor.mock_engine.evaluate_batch.assert_awaited_with({"a": 1.0, "b": 2.0, "c": 3.0})
+
+@pytest.mark.asyncio
+async def test_bad_quality_is_kept_in_the_value_table(processor):
+    processor.broadcast = AsyncMock()
+    await processor.process_batch([("a", 1.0)], datetime(2025, 1, 1))
+
+    await processor.mark_bad_quality(["a"])
+    await processor.mark_bad_quality(["a"])
+    assert processor.broadcast.await_count == 2  # batch + one quality message
+
+    await processor.process_batch([("a", 1.0)], datetime(2025, 1, 1, 0, 0, 1))
+    processor.broadcast.assert_any_await({"type": "quality", "quality": "good", "tags": ["a"]})
+    assert processor.tag_values["a"] == 1.0
+
+@pytest.mark.asyncio
+async def test_heartbeats_reach_the_historian_without_new_samples(processor):
+    bank = TagFilterBank.get()
+    bank.configs = {"a": TagConfig(name="a", address=0, type="float", unit="", max_interval=5.0)}
+    bank.built = True
+    t0 = datetime(2025, 1, 1)
+    await processor.process_batch([("a", 1.0)], t0)
+    historian = processor.sinks["historian"]
+    historian.put = AsyncMock()
+
+    await processor.emit_heartbeats(t0 + timedelta(minutes=1))
+
+    historian.put.assert_awaited_once_with([(t0 + timedelta(seconds=5), "a", 1.0)])
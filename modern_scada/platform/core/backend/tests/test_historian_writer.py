@@ -0,0 +1,89 @@
+import asyncpg
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+from app.config import settings
+from app.services.historian_writer import HistorianWriter
+from app.services.store_forward import StoreForwardBuffer
+
+TS = datetime(2025, 1, 1)
+
+@pytest.fixture
+def writer():
+    writer = HistorianWriter()
+    writer.initialize()
+    StoreForwardBuffer.get().initialize(capacity=100)
+    with patch("app.services.historian_writer.PostgresDB") as mock_db, \
+         patch("app.services.historian_writer.DataService") as mock_data:
+        mock_db.copy_merge = AsyncMock()
+        mock_db.executemany = AsyncMock()
+        mock_data.buffer_sensor_data_batch = AsyncMock()
+        writer.mock_db, writer.mock_data = mock_db, mock_data
+        yield writer
+    writer.initialize()
+    StoreForwardBuffer.get().initialize()
+
+@pytest.mark.asyncio
+async def test_flush_copies_in_batches(writer):
+    with patch.object(settings.app_config.historian, "batch_rows", 2):
+        writer.enqueue([(TS, f"t{i}", float(i)) for i in range(3)])
+        assert writer.wakeup.is_set()
+        await writer.flush()
+
+    batches = [call.args[2] for call in writer.mock_db.copy_merge.await_args_list]
+    assert batches == [[(TS, "t0", 0.0), (TS, "t1", 1.0)], [(TS, "t2", 2.0)]]
+    assert not writer.pending
+
+@pytest.mark.asyncio
+async def test_rejected_copy_falls_back_to_executemany(writer):
+    writer.mock_db.copy_merge.side_effect = asyncpg.InsufficientPrivilegeError("no temp tables")
+    writer.enqueue([(TS, "a", 1.0)])
+    await writer.flush()
+    writer.enqueue([(TS, "b", 2.0)])
+    await writer.flush()
+
+    assert writer.mock_db.copy_merge.await_count == 1
+    assert writer.mock_db.executemany.await_count == 2
+
+@pytest.mark.asyncio
+async def test_transient_copy_error_keeps_copy(writer):
+    writer.mock_db.copy_merge.side_effect = [asyncpg.TooManyConnectionsError("too many clients"), None]
+    writer.enqueue([(TS, "a", 1.0)])
+    await writer.flush()
+
+    assert writer.copy_supported
+    writer.mock_db.executemany.assert_not_awaited()
+    buffer = StoreForwardBuffer.get()
+    assert buffer.peek(10) == [(TS, "a", 1.0)]
+
+    # The retry still goes through COPY
+    assert await buffer.drain() == 1
+    assert writer.mock_db.copy_merge.await_count == 2
+    writer.mock_db.executemany.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_queue_overflow_spills_oldest_rows(writer):
+    with patch.object(settings.app_config.historian, "max_pending_rows", 2):
+        writer.enqueue([(TS, f"t{i}", float(i)) for i in range(5)])
+        await writer.flush()
+
+    writer.mock_data.buffer_sensor_data_batch.assert_awaited_once_with(
+        [(TS, "t0", 0.0), (TS, "t1", 1.0), (TS, "t2", 2.0)]
+    )
+    writer.mock_db.copy_merge.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_outage_buffers_rows_until_drained(writer):
+    writer.mock_db.copy_merge.side_effect = ConnectionError("down")
+    writer.enqueue([(TS, "a", 1.0)])
+    await writer.flush()
+    writer.enqueue([(TS, "b", 2.0)])
+    await writer.flush()
+
+    buffer = StoreForwardBuffer.get()
+    assert buffer.peek(10) == [(TS, "a", 1.0), (TS, "b", 2.0)]
+    assert writer.mock_db.copy_merge.await_count == 1  # No retry on the flush path while offline
+
+    writer.mock_db.copy_merge.side_effect = None
+    assert await buffer.drain() == 2
+    assert not buffer.offline
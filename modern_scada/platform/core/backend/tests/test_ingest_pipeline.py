@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from app.config import PipelineConfig, SinkConfig, settings
+from app.services.ingest_pipeline import SinkQueue
+
+@pytest.fixture
+def pipeline_config():
+    original = settings.app_config.pipeline
+    settings.app_config.pipeline = PipelineConfig()
+    yield settings.app_config.pipeline
+    settings.app_config.pipeline = original
+
+def slow_sink(name, merge=None):
+    handled = []
+    gate = asyncio.Event()
+
+    async def handler(batch):
+        await gate.wait()
+        handled.append(batch)
+
+    return SinkQueue(name, handler, merge), handled, gate
+
+async def settle(sink):
+    while sink.items:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+@pytest.mark.asyncio
+async def test_inline_until_started(pipeline_config):
+    handled = []
+
+    async def handler(batch):
+        handled.append(batch)
+
+    sink = SinkQueue("alarms", handler)
+    await sink.put(1)
+    assert handled == [1]
+
+@pytest.mark.asyncio
+async def test_conflate_merges_into_newest_batch(pipeline_config):
+    pipeline_config.logic = SinkConfig(max_depth=2, overflow="conflate")
+    sink, handled, gate = slow_sink("logic", lambda old, new: {**old, **new})
+    sink.start()
+    for batch in ({"a": 1}, {"a": 2}, {"b": 1}, {"a": 3}):
+        await sink.put(batch)
+        await asyncio.sleep(0)
+
+    gate.set()
+    await settle(sink)
+    # The first batch was already taken by the consumer when the rest arrived
+    assert handled == [{"a": 1}, {"a": 2}, {"b": 1, "a": 3}]
+    await sink.stop()
+
+@pytest.mark.asyncio
+async def test_drop_oldest(pipeline_config):
+    pipeline_config.realtime = SinkConfig(max_depth=2, overflow="drop_oldest")
+    sink, handled, gate = slow_sink("realtime")
+    sink.start()
+    for batch in range(5):
+        await sink.put(batch)
+        await asyncio.sleep(0)
+
+    gate.set()
+    await settle(sink)
+    assert handled == [0, 3, 4]
+    await sink.stop()
+
+@pytest.mark.asyncio
+async def test_block_applies_backpressure(pipeline_config):
+    pipeline_config.historian = SinkConfig(max_depth=1, overflow="block")
+    sink, handled, gate = slow_sink("historian")
+    sink.start()
+    await sink.put(0)
+    await asyncio.sleep(0)
+    await sink.put(1)
+
+    producer = asyncio.create_task(sink.put(2))
+    await asyncio.sleep(0.01)
+    assert not producer.done()
+
+    gate.set()
+    await asyncio.wait_for(producer, 1)
+    await settle(sink)
+    assert handled == [0, 1, 2]
+    await sink.stop()
+
+@pytest.mark.asyncio
+async def test_stop_finishes_batch_in_flight_and_rejects_new_ones(pipeline_config):
+    pipeline_config.historian = SinkConfig(max_depth=1, overflow="block")
+    sink, handled, gate = slow_sink("historian")
+    sink.start()
+    await sink.put(0)
+    await asyncio.sleep(0)  # The consumer takes 0 and waits in the handler
+    await sink.put(1)
+    producer = asyncio.create_task(sink.put(2))  # Blocked on space
+    await asyncio.sleep(0.01)
+
+    stopping = asyncio.create_task(sink.stop(timeout=1.0))
+    await asyncio.sleep(0.01)
+    assert not stopping.done()
+    gate.set()
+    await stopping
+    await producer
+
+    assert handled == [0, 1]
+    await sink.put(3)
+    assert handled == [0, 1]
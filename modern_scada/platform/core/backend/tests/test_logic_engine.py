@@ -0,0 +1,111 @@
+import json
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.services.current_value_table import CurrentValueTable
+from app.services.logic_engine import LogicEngine
+
+RULES = [
+    {"id": "static", "condition": {"tag": "temp", "operator": ">", "value": 28.0}, "actions": [{"device_id": "fan_1"}]},
+    {"id": "ref", "condition": {"tag": "temp", "operator": ">", "compareTo": "ref", "value": "outside", "offset": 2}, "actions": [{"device_id": "fan_2"}]},
+    {"id": "global", "condition": {"tag": "hum", "operator": ">", "global_ref": "hum_threshold"}, "actions": [{"device_id": "mister"}]},
+    {"id": "disabled", "enabled": False, "condition": {"tag": "temp", "operator": ">", "value": 0}, "actions": [{"device_id": "x"}]},
+]
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    path = tmp_path / "logic_rules.json"
+    path.write_text(json.dumps({"globals": {"hum_threshold": 80.0}, "rules": RULES}))
+    monkeypatch.setenv("LOGIC_RULES_PATH", str(path))
+    CurrentValueTable.get().initialize()
+    with patch("app.services.logic_engine.LogicStateStore"):
+        engine = LogicEngine()
+        engine.initialize()
+    with patch.object(engine, "execute_actions", AsyncMock()):
+        yield engine
+    CurrentValueTable.get().initialize()
+
+def started(engine):
+    return [call.args[0][0]["device_id"] for call in engine.execute_actions.await_args_list if call.args[1] == 1.0]
+
+def test_index_covers_primary_reference_and_global_dependencies(engine):
+    assert engine.rules_by_tag == {"temp": [0, 1], "outside": [1], "hum": [2]}
+    assert engine.rules_by_global == {"hum_threshold": [2]}
+
+@pytest.mark.asyncio
+async def test_only_dependent_rules_are_evaluated(engine):
+    with patch.object(engine, "process_rule", AsyncMock()) as process_rule:
+        await engine.evaluate_batch({"unrelated": 1.0})
+        process_rule.assert_not_awaited()
+
+        await engine.evaluate_batch({"hum": 50.0})
+        assert [call.args[0].id for call in process_rule.await_args_list] == ["global"]
+
+@pytest.mark.asyncio
+async def test_reference_change_reevaluates_rule(engine):
+    table = CurrentValueTable.get()
+    table.update_batch([("temp", 25.0), ("outside", 30.0)])
+    await engine.evaluate_batch({"temp": 25.0, "outside": 30.0})
+    assert started(engine) == []
+
+    # Only the reference moved: temp 25 > 20 + 2
+    table.update_batch([("outside", 20.0)])
+    await engine.evaluate_batch({"outside": 20.0})
+    assert started(engine) == ["fan_2"]
+
+@pytest.mark.asyncio
+async def test_global_update_reevaluates_rule(engine):
+    CurrentValueTable.get().update_batch([("hum", 75.0)])
+    await engine.evaluate_batch({"hum": 75.0})
+    assert started(engine) == []
+
+    await engine.update_rules(RULES, {"hum_threshold": 70.0})
+    assert started(engine) == ["mister"]
+
+def stopped(engine):
+    return [call.args[0][0]["device_id"] for call in engine.execute_actions.await_args_list if call.args[1] == 0.0]
+
+@pytest.mark.asyncio
+async def test_min_run_time_expiry_stops_rule_without_new_sample(engine):
+    now = [1000.0]
+    engine.clock = lambda: now[0]
+    rules = [{"id": "fan", "condition": {"tag": "temp", "operator": ">", "value": 28}, "constraints": {"min_run_time": 1}, "actions": [{"device_id": "fan_1"}]}]
+    await engine.update_rules(rules, {})
+    table = CurrentValueTable.get()
+
+    table.update_batch([("temp", 30.0)])
+    await engine.evaluate_batch({"temp": 30.0})
+    now[0] = 1010.0
+    table.update_batch([("temp", 20.0)])
+    await engine.evaluate_batch({"temp": 20.0})
+    assert stopped(engine) == []
+    assert engine.timers.next_deadline() == 1060.0
+
+    now[0] = 1059.0
+    assert await engine.fire_timers() == 0
+    now[0] = 1060.0
+    assert await engine.fire_timers() == 1
+    assert stopped(engine) == ["fan_1"]
+
+@pytest.mark.asyncio
+async def test_schedule_boundary_reevaluates_rule(engine):
+    midnight = time.mktime((2025, 1, 1, 0, 0, 0, 0, 0, -1))
+    now = [midnight + 7 * 3600 + 30 * 60]  # 07:30 local
+    engine.clock = lambda: now[0]
+    rules = [{
+        "id": "night",
+        "condition": {"tag": "temp", "operator": ">", "value": 30},
+        "schedules": [{"start": "08:00", "end": "17:59", "threshold": 20}],
+        "actions": [{"device_id": "fan_1"}],
+    }]
+    await engine.update_rules(rules, {})
+    CurrentValueTable.get().update_batch([("temp", 25.0)])
+    await engine.evaluate_batch({"temp": 25.0})
+    assert started(engine) == []
+    assert engine.timers.next_deadline() == midnight + 8 * 3600
+
+    now[0] = midnight + 8 * 3600
+    await engine.fire_timers()
+    assert started(engine) == ["fan_1"]
+    # Next wake-up: when the window closes
+    assert engine.timers.next_deadline() == midnight + 18 * 3600
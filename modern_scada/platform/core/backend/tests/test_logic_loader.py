@@ -0,0 +1,54 @@
+import asyncio
+import types
+import pytest
+from app.services.logic_loader import Hook, LogicLoader
+
+@pytest.fixture
+def loader():
+    loader = LogicLoader()
+    saved = loader.hooks
+    yield loader
+    loader.cancel_all()
+    loader.hooks = saved
+
+def make_hook(name, func, **module_attrs):
+    return Hook(name, func, types.SimpleNamespace(**module_attrs))
+
+@pytest.mark.asyncio
+async def test_async_hooks_run_once_per_burst_and_only_on_their_inputs(loader):
+    runs = {"climate": [], "mixer": []}
+
+    async def climate(context):
+        runs["climate"].append(context.get_tag_value("temp"))
+
+    async def mixer(context):
+        runs["mixer"].append(context.get_tag_value("level"))
+
+    loader.hooks = [make_hook("climate", climate, INPUTS=["temp"]), make_hook("mixer", mixer, INPUTS=["level"])]
+    tags = {"temp": 20.0, "level": 5.0}
+    loader.trigger(["temp"], tags)
+    tags["temp"] = 21.0
+    loader.trigger(["temp"], tags)
+    await asyncio.sleep(0.05)
+
+    assert runs == {"climate": [21.0], "mixer": []}
+
+@pytest.mark.asyncio
+async def test_slow_hook_times_out_without_blocking_others(loader):
+    finished = []
+
+    async def slow(context):
+        await asyncio.sleep(10)
+        finished.append("slow")
+
+    async def fast(context):
+        finished.append("fast")
+
+    loader.hooks = [make_hook("slow", slow, TIMEOUT=0.05), make_hook("fast", fast)]
+    loader.trigger(None, {})
+    await asyncio.sleep(0.01)
+    assert finished == ["fast"]
+
+    await asyncio.sleep(0.1)
+    assert loader.hooks[0].task.done()
+    assert finished == ["fast"]
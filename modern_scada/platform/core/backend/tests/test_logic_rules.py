@@ -0,0 +1,65 @@
+import time
+import pytest
+from app.services.logic_rules import STOP_HYSTERESIS, STOP_NEVER, CompiledGlobals, CompiledRule, compile_rules, next_boundary, parse_minute
+
+@pytest.fixture
+def berlin(monkeypatch):
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_schedule_windows_use_minutes_of_day():
+    rule = CompiledRule(0, {
+        "id": "r",
+        "condition": {"tag": "t", "operator": ">", "value": "28"},
+        "schedules": [{"start": "22:00", "end": "06:00", "threshold": 24}, {"start": "12:00", "end": "13:00"}],
+        "actions": [],
+    })
+    globals_ = CompiledGlobals({})
+    assert rule.threshold({}, globals_, parse_minute("23:30")) == 24.0
+    assert rule.threshold({}, globals_, parse_minute("06:00")) == 24.0
+    assert rule.threshold({}, globals_, parse_minute("06:01")) == 28.0
+    # A matching window without a threshold keeps the base value
+    assert rule.threshold({}, globals_, parse_minute("12:30")) == 28.0
+
+def test_reference_and_global_sources():
+    ref = CompiledRule(0, {"id": "ref", "condition": {"tag": "t", "operator": "<", "compareTo": "ref", "value": "out", "offset": "1.5"}})
+    assert ref.threshold({"out": 10.0}, CompiledGlobals({}), 0) == 11.5
+    assert ref.check(11.0, 11.5) and not ref.check(12.0, 11.5)
+
+    globals_ = CompiledGlobals({
+        "temp_threshold": "28",
+        "schedules": [{"start": "00:00", "end": "05:00", "humThreshold": 90}, {"start": "00:00", "end": "23:59", "tempThreshold": 20}],
+    })
+    rule = CompiledRule(1, {"id": "g", "condition": {"tag": "t", "operator": ">", "global_ref": "temp_threshold"}})
+    # The first window does not override temp_threshold, the second does
+    assert rule.threshold({}, globals_, 60) == 20.0
+    assert globals_.value("hum_threshold", 60) == 90.0
+    assert globals_.value("hum_threshold", 600) == 0.0
+
+def test_compile_rules_skips_disabled_and_invalid():
+    compiled = compile_rules([
+        {"id": "a", "condition": {"tag": "t", "value": 1}, "stop_condition": {"type": "hysteresis", "value": 2}, "constraints": {"min_run_time": 5}},
+        {"id": "b", "enabled": False},
+        {"id": "c", "condition": {"tag": "t", "value": "not a number"}},
+        {"id": "d", "condition": {"tag": "t", "value": 1}, "stop_condition": {"type": "manual"}},
+    ])
+    assert compiled[0].stop_type == STOP_HYSTERESIS and compiled[0].hysteresis == 2.0
+    assert compiled[0].min_run_time == 300.0
+    assert compiled[1] is None and compiled[2] is None
+    assert compiled[3].stop_type == STOP_NEVER
+
+def test_next_boundary_follows_dst_changes(berlin):
+    def local(*fields):
+        return time.mktime(fields + (0, 0, -1))
+
+    # Spring forward: 2024-03-31 has 23 hours in Berlin
+    assert next_boundary(local(2024, 3, 30, 12, 0, 0), [parse_minute("06:00")]) == local(2024, 3, 31, 6, 0, 0)
+    # Fall back: 2024-10-27 has 25 hours
+    assert next_boundary(local(2024, 10, 26, 22, 0, 30), [parse_minute("06:00")]) == local(2024, 10, 27, 6, 0, 0)
+    # A boundary in the skipped hour fires once the clock jumps past it
+    assert next_boundary(local(2024, 3, 31, 1, 30, 0), [parse_minute("02:30")]) == local(2024, 3, 31, 3, 30, 0)
+    # Same day, no change
+    assert next_boundary(local(2024, 6, 1, 8, 15, 10), [parse_minute("08:00"), parse_minute("20:00")]) == local(2024, 6, 1, 20, 0, 0)
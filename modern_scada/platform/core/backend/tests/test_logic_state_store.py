@@ -0,0 +1,109 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.config import LogicStateConfig, settings
+from app.services.logic_state_store import STATES_KEY, LogicStateStore
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hset(self, name, mapping):
+        self.commands.append((name, dict(mapping)))
+
+    async def execute(self):
+        if self.client.hang:
+            self.client.hang = False
+            self.client.executing.set()
+            await asyncio.Event().wait()
+        if self.client.down:
+            raise ConnectionError("redis down")
+        self.client.round_trips += 1
+        for name, mapping in self.commands:
+            self.client.hashes.setdefault(name, {}).update(mapping)
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.round_trips = 0
+        self.down = False
+        self.hang = False  # Block the next execute() until cancelled
+        self.executing = asyncio.Event()
+        self.closed = False
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def hscan_iter(self, name, count=None):
+        for item in self.hashes.get(name, {}).items():
+            yield item
+
+    async def aclose(self):
+        self.closed = True
+
+@pytest.fixture
+def store():
+    original = settings.app_config.logic_state
+    settings.app_config.logic_state = LogicStateConfig(batch_fields=2)
+    store = LogicStateStore.get()
+    store.initialize()
+    store.client = FakeRedis()
+    yield store
+    store.initialize()
+    settings.app_config.logic_state = original
+
+@pytest.mark.asyncio
+async def test_changes_are_coalesced_and_pipelined(store):
+    store.save("a", {"active": True})
+    store.save("a", {"active": False})
+    store.save("b", {"active": True})
+    store.save("c", {"active": True})
+
+    await store.flush()
+    assert store.client.round_trips == 1
+    assert json.loads(store.client.hashes[STATES_KEY]["a"]) == {"active": False}
+    assert set(store.client.hashes[STATES_KEY]) == {"a", "b", "c"}
+    assert store.dirty == {}
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_newest_state(store):
+    store.client.down = True
+    store.save("a", {"active": True})
+    await store.flush()
+    assert "a" in store.dirty
+
+    store.save("a", {"active": False})
+    store.client.down = False
+    await store.flush()
+    assert json.loads(store.client.hashes[STATES_KEY]["a"]) == {"active": False}
+
+@pytest.mark.asyncio
+async def test_load_reads_all_states(store):
+    store.client.hashes[STATES_KEY] = {"a": json.dumps({"active": True}), "bad": "{"}
+    assert await store.load() == {"a": {"active": True}}
+
+@pytest.mark.asyncio
+async def test_stop_keeps_states_of_an_interrupted_flush(store):
+    client = store.client
+    client.hang = True
+    pool = MagicMock(disconnect=AsyncMock())
+    store.redis.async_pool = pool
+    store.start()
+    store.save("a", {"active": True})
+    await client.executing.wait()
+
+    await store.stop()
+
+    assert json.loads(client.hashes[STATES_KEY]["a"]) == {"active": True}
+    assert store.dirty == {}
+    assert client.closed
+    pool.disconnect.assert_awaited_once()
+    assert store.redis.async_pool is None
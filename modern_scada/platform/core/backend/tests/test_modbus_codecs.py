@@ -0,0 +1,43 @@
+import struct
+from app.config import TagConfig
+from app.services.modbus_codecs import BlockDecoder, TagCodec
+
+def make_tag(name, tag_type, **kwargs):
+    return TagConfig(name=name, address=0, type=tag_type, unit="", **kwargs)
+
+def registers(fmt, value):
+    data = struct.pack(fmt, value)
+    return list(struct.unpack(f">{len(data) // 2}H", data))
+
+def test_float32_word_and_byte_orders():
+    abcd = registers(">f", 21.5)
+    assert TagCodec(make_tag("t", "float32")).decode(abcd) == 21.5
+    assert TagCodec(make_tag("t", "float32", word_order="little")).decode(abcd[::-1]) == 21.5
+    dcba = registers("<f", 21.5)
+    assert TagCodec(make_tag("t", "float32", word_order="little", byte_order="little")).decode(dcba) == 21.5
+
+def test_integer_bool_and_bitfield_types():
+    assert TagCodec(make_tag("t", "int16")).decode([0xFFFE]) == -2.0
+    assert TagCodec(make_tag("t", "uint32")).decode([0x0001, 0x0000]) == 65536.0
+    assert TagCodec(make_tag("t", "bool")).decode([0x3F80]) == 1.0
+    assert TagCodec(make_tag("t", "bitfield", bit=3)).decode([0b1000]) == 1.0
+    assert TagCodec(make_tag("t", "bitfield", bit=2)).decode([0b1000]) == 0.0
+
+def test_linear_scaling():
+    tag = make_tag("t", "uint16", scaling={"rawMin": 0, "rawMax": 1000, "engMin": 0, "engMax": 14})
+    assert TagCodec(tag).decode([500]) == 7.0
+
+def test_block_decoder_matches_per_tag_decoding():
+    tags = [
+        ("a", 0, make_tag("a", "float32")),
+        ("b", 3, make_tag("b", "int16")),
+        ("c", 4, make_tag("c", "float64", word_order="little")),
+    ]
+    block = [0] * 8
+    block[0:2] = registers(">f", 1.25)
+    block[3:4] = registers(">h", -7)
+    block[4:8] = registers(">d", 3.5)[::-1]
+
+    decoder = BlockDecoder(8, [(name, offset, TagCodec(tag)) for name, offset, tag in tags])
+
+    assert dict(decoder.decode(block)) == {"a": 1.25, "b": -7.0, "c": 3.5}
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.config import PLCConnection
+from app.services.modbus_connection_manager import ModbusConnectionManager
+
+@pytest.fixture
+def manager():
+    manager = ModbusConnectionManager.get()
+    manager.initialize()
+    yield manager
+    manager.initialize()
+
+def make_client(connected=True):
+    client = MagicMock()
+    client.connect = AsyncMock()
+    client.connected = connected
+    return client
+
+@pytest.mark.asyncio
+async def test_connection_is_reused(manager):
+    """A second request on the same PLC must not open a new socket."""
+    conn = PLCConnection(name="main", host="localhost", port=502, poll_interval=1.0)
+    with patch("app.services.modbus_connection_manager.AsyncModbusTcpClient") as mock_cls:
+        mock_cls.return_value = make_client()
+
+        first = await manager.get_client(conn)
+        second = await manager.get_client(conn)
+
+        assert first is second
+        assert mock_cls.call_count == 1
+
+@pytest.mark.asyncio
+async def test_failed_connect_opens_breaker(manager):
+    """Once the breaker opens, requests fail fast until the reset timeout expires."""
+    conn = PLCConnection(name="down", host="localhost", port=502, poll_interval=1.0,
+                         reconnect_delay=60.0, breaker_failure_threshold=1)
+    with patch("app.services.modbus_connection_manager.AsyncModbusTcpClient") as mock_cls:
+        mock_cls.return_value = make_client(connected=False)
+
+        assert await manager.get_client(conn) is None
+        assert await manager.get_client(conn) is None
+        assert mock_cls.call_count == 1
+        assert manager.status()[0]["state"] == "open"
+
+@pytest.mark.asyncio
+async def test_open_breaker_refuses_cached_connection(manager):
+    """A device that accepts TCP but times out every read must not keep costing a timeout per scan."""
+    conn = PLCConnection(name="slow", host="localhost", port=502, poll_interval=1.0,
+                         reconnect_delay=60.0, breaker_failure_threshold=2)
+    with patch("app.services.modbus_connection_manager.AsyncModbusTcpClient") as mock_cls:
+        mock_cls.return_value = make_client()
+
+        client = await manager.get_client(conn)
+        manager.record_failure(conn)
+        assert await manager.get_client(conn) is client
+        manager.record_failure(conn)
+
+        assert client.connected
+        assert await manager.get_client(conn) is None
+        assert manager.status()[0]["state"] == "open"
+
+@pytest.mark.asyncio
+async def test_accepting_but_silent_device_backs_off(manager):
+    """Reconnecting to a device that never answers must not reset the breaker or its backoff."""
+    async def silent(reader, writer):
+        await reader.read()  # Take requests, never reply
+        writer.close()
+
+    server = await asyncio.start_server(silent, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    conn = PLCConnection(name="silent", host="127.0.0.1", port=port, poll_interval=1.0, timeout=0.05,
+                         reconnect_delay=0.05, breaker_failure_threshold=2, breaker_jitter=0.0)
+    breaker = manager.breaker_for(conn)
+
+    async def scan():
+        client = await manager.get_client(conn)
+        if client is None:
+            return False
+        try:
+            await asyncio.wait_for(client.read_holding_registers(0, count=2), 0.1)
+        except Exception:
+            # The poller drops the socket the transport gave up on
+            manager.invalidate(conn.name)
+            manager.record_failure(conn)
+        else:
+            manager.record_success(conn)
+        return True
+
+    try:
+        assert await scan() and await scan()
+        assert breaker.state == "open"
+        assert not await scan()
+
+        await asyncio.sleep(0.08)
+        assert await scan()  # Half-open probe reconnects and times out again
+        assert breaker.state == "open"
+        assert breaker.current_timeout == 0.1
+        assert breaker.trips == 2
+    finally:
+        await manager.close_all()
+        server.close()
+        await server.wait_closed()
@@ -0,0 +1,128 @@
+import asyncio
+import struct
+import pytest
+from app.services.modbus_pipeline import MBAP_HEADER, PipelinedModbusClient
+
+async def start_fake_plc(latency=0.05, echo_tid=True, slow=None):
+    """
+    Modbus TCP server answering FC3 with register value == address, after
+    `latency` or, for the start addresses in `slow`, after slow[address].
+    """
+    slow = slow or {}
+    stats = {"in_flight": 0, "max_in_flight": 0}
+
+    async def answer(writer, tid, unit, pdu):
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        _, address, count = struct.unpack(">BHH", pdu)
+        await asyncio.sleep(slow.get(address, latency))
+        body = struct.pack(f">BB{count}H", 3, count * 2, *range(address, address + count))
+        writer.write(MBAP_HEADER.pack(tid if echo_tid else 0xBEEF, 0, len(body) + 1, unit) + body)
+        stats["in_flight"] -= 1
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                tid, _, length, unit = MBAP_HEADER.unpack(await reader.readexactly(MBAP_HEADER.size))
+                pdu = await reader.readexactly(length - 1)
+                asyncio.create_task(answer(writer, tid, unit, pdu))
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1], stats
+
+@pytest.mark.asyncio
+async def test_requests_are_pipelined_up_to_depth():
+    server, port, stats = await start_fake_plc()
+    client = PipelinedModbusClient("127.0.0.1", port=port, depth=4, timeout=1.0)
+    assert await client.connect()
+    try:
+        responses = await asyncio.gather(*(client.read_holding_registers(a * 10, count=2) for a in range(8)))
+
+        assert [r.registers for r in responses] == [[a * 10, a * 10 + 1] for a in range(8)]
+        assert stats["max_in_flight"] == 4
+    finally:
+        client.close()
+        server.close()
+
+@pytest.mark.asyncio
+async def test_falls_back_to_serial_when_transaction_ids_are_not_echoed():
+    server, port, _ = await start_fake_plc(latency=0.01, echo_tid=False)
+    client = PipelinedModbusClient("127.0.0.1", port=port, depth=4, timeout=0.2)
+    assert await client.connect()
+    try:
+        await asyncio.gather(*(client.read_holding_registers(0, count=1) for _ in range(2)), return_exceptions=True)
+
+        assert client.fell_back
+        assert client.depth == 1
+
+        # Serial reads keep working although the device still does not echo ids
+        responses = await asyncio.gather(*(client.read_holding_registers(a * 10, count=2) for a in range(3)))
+        assert [r.registers for r in responses] == [[a * 10, a * 10 + 1] for a in range(3)]
+        assert client.connected
+    finally:
+        client.close()
+        server.close()
+
+@pytest.mark.asyncio
+async def test_elapsed_excludes_waiting_for_a_slot():
+    server, port, _ = await start_fake_plc(latency=0.05)
+    client = PipelinedModbusClient("127.0.0.1", port=port, depth=1, timeout=1.0)
+    assert await client.connect()
+    try:
+        responses = await asyncio.gather(*(client.read_holding_registers(0, count=1) for _ in range(3)))
+
+        # The last request queued for two round trips but was on the wire for one
+        assert all(0.04 < r.elapsed < 0.09 for r in responses)
+    finally:
+        client.close()
+        server.close()
+
+@pytest.mark.asyncio
+async def test_late_answer_does_not_disable_pipelining():
+    server, port, _ = await start_fake_plc(latency=0.05, slow={99: 0.15})
+    client = PipelinedModbusClient("127.0.0.1", port=port, depth=4, timeout=0.1)
+    assert await client.connect()
+    try:
+        async def later_reads():
+            await asyncio.sleep(0.12)  # In flight when the late answer to 99 arrives
+            return await asyncio.gather(*(client.read_holding_registers(a * 10, count=2) for a in range(3)))
+
+        late, responses = await asyncio.gather(client.read_holding_registers(99, count=2), later_reads(),
+                                               return_exceptions=True)
+
+        assert isinstance(late, TimeoutError)
+        assert [r.registers for r in responses] == [[a * 10, a * 10 + 1] for a in range(3)]
+        assert not client.fell_back
+        assert client.depth == 4
+    finally:
+        client.close()
+        server.close()
+
+@pytest.mark.asyncio
+async def test_serial_late_answer_is_not_taken_for_the_next_request():
+    server, port, _ = await start_fake_plc(latency=0.05, slow={99: 0.13})
+    client = PipelinedModbusClient("127.0.0.1", port=port, depth=1, timeout=0.1)
+    assert await client.connect()
+    try:
+        with pytest.raises(TimeoutError):
+            await client.read_holding_registers(99, count=2)
+        # Sent before the late [99, 100] arrives, answered after it
+        response = await client.read_holding_registers(10, count=2)
+
+        assert response.registers == [10, 11]
+    finally:
+        client.close()
+        server.close()
+
+@pytest.mark.asyncio
+async def test_answer_with_another_function_code_is_not_matched():
+    client = PipelinedModbusClient("127.0.0.1", depth=1)
+    future = asyncio.get_running_loop().create_future()
+    client._pending[7] = (future, 3)
+
+    assert client._match(7, 1) is None
+    assert client._match(0xBEEF, 1) is None
+    assert client._match(0xBEEF, 3) is future
+    assert client.echoes_tids is False
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+from app.config import PLCConnection, TagConfig
+from app.services.modbus_read_plan import BlockOptimizer, ReadPlanCache, build_read_plan, due_classes, scan_tick
+
+def make_tag(name, address, connection="main", scan_rate_ms=None, **kwargs):
+    return TagConfig(name=name, address=address, type="float", unit="", connection_name=connection,
+                     scan_rate_ms=scan_rate_ms, **kwargs)
+
+def test_adjacent_tags_share_one_block():
+    tags = [make_tag("b", 2), make_tag("a", 0), make_tag("c", 10)]
+    plan = build_read_plan("main", tags, version=3)
+
+    assert plan.version == 3
+    assert len(plan.blocks) == 1
+    block = plan.blocks[0]
+    assert (block.start, block.count) == (0, 12)
+    assert [(s.name, s.offset) for s in block.slots] == [("a", 0), ("b", 2), ("c", 10)]
+
+def test_block_never_exceeds_protocol_limit():
+    tags = [make_tag("a", 0), make_tag("b", 200), make_tag("other", 4, connection="aux")]
+    plan = build_read_plan("main", tags)
+
+    assert [(b.start, b.count) for b in plan.blocks] == [(0, 2), (200, 2)]
+    assert plan.describe()["round_trips"] == 2
+
+def test_cost_model_decides_whether_to_bridge_gaps():
+    tags = [make_tag("a", 0), make_tag("b", 60)]
+
+    high_latency = BlockOptimizer()
+    high_latency.request_cost, high_latency.register_cost = 0.2, 0.0001
+    assert len(build_read_plan("main", tags, optimizer=high_latency).blocks) == 1
+
+    fast_link = BlockOptimizer()
+    fast_link.request_cost, fast_link.register_cost = 0.001, 0.001
+    assert len(build_read_plan("main", tags, optimizer=fast_link).blocks) == 2
+
+def test_bad_ranges_split_blocks_and_exclude_tags():
+    optimizer = BlockOptimizer()
+    optimizer.mark_bad(4, 8)
+    optimizer.mark_bad(20, 22)
+    tags = [make_tag("a", 0), make_tag("b", 10), make_tag("dead", 20)]
+
+    plan = build_read_plan("main", tags, optimizer=optimizer)
+
+    assert [(b.start, b.count) for b in plan.blocks] == [(0, 2), (10, 2)]
+    assert plan.excluded_tags == ("dead",)
+    assert not optimizer.dirty
+
+def test_optimizer_learns_cost_model_from_samples():
+    optimizer = BlockOptimizer()
+    for _ in range(20):
+        optimizer.observe(10, 0.05 + 10 * 0.001)
+        optimizer.observe(100, 0.05 + 100 * 0.001)
+
+    assert abs(optimizer.request_cost - 0.05) < 1e-6
+    assert abs(optimizer.register_cost - 0.001) < 1e-6
+    assert optimizer.dirty
+
+def test_scan_classes_merge_when_due_on_the_same_tick():
+    connection = PLCConnection(name="main", host="localhost", port=502, poll_interval=1.0)
+    tags = [make_tag("fast", 0, scan_rate_ms=100), make_tag("level", 2), make_tag("uv", 4, scan_rate_ms=10000)]
+    cache = ReadPlanCache.__new__(ReadPlanCache)
+    cache.initialize()
+    with patch("app.services.modbus_read_plan.settings") as settings:
+        settings.app_config.tags = tags
+        settings.app_config.plc.connections = [connection]
+        cache.rebuild()
+
+    rates = cache.scan_rates("main")
+    tick = scan_tick(rates)
+    assert (rates, tick) == ([100, 1000, 10000], 100)
+    assert due_classes(rates, 0, tick) == {100, 1000, 10000}
+    assert due_classes(rates, 3, tick) == {100}
+    assert due_classes(rates, 20, tick) == {100, 1000}
+
+    fast_only = cache.plan_for("main", due_classes(rates, 3, tick))
+    merged = cache.plan_for("main", due_classes(rates, 20, tick))
+    assert [(b.start, b.count) for b in fast_only.blocks] == [(0, 2)]
+    assert [(b.start, b.count) for b in merged.blocks] == [(0, 4)]
+    assert cache.plan_for("main", due_classes(rates, 0, tick)) is cache.plans["main"]
+    # Partial plans are built once per due set, not once per tick
+    assert cache.plan_for("main", due_classes(rates, 3, tick)) is fast_only
+    assert cache.plan_for("main", due_classes(rates, 20, tick)) is merged
+
+def test_each_unit_and_function_gets_its_own_blocks():
+    tags = [
+        make_tag("a", 0), make_tag("b", 2, unit_id=2),
+        make_tag("pump", 0, function="coil"), make_tag("door", 7, function="coil"),
+        make_tag("flow", 0, function="input"),
+    ]
+    plan = build_read_plan("main", tags)
+
+    assert [(b.unit, b.function, b.start, b.count) for b in plan.blocks] == [
+        (1, "coil", 0, 8), (1, "holding", 0, 2), (1, "input", 0, 2), (2, "holding", 2, 2)
+    ]
@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+import threading
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock
+from app.config import AppConfig, PLCConnection, SinkConfig, TagConfig, settings
+from app.services.ingest_pipeline import SinkQueue
+from app.workers.poll_shards import ShardSink, ShardSupervisor, assign_shards, merge_shard_messages, shard_config
+from domain_models import Scaling
+
+def test_assign_shards_balances_by_tag_count():
+    connections = [PLCConnection(name=n, host="localhost", port=502, poll_interval=1.0) for n in "abcd"]
+    counts = {"a": 40, "b": 30, "c": 20, "d": 10}
+    tags = [
+        TagConfig(name=f"{n}{i}", address=i * 2, type="float", unit="", connection_name=n)
+        for n, count in counts.items() for i in range(count)
+    ]
+
+    shards = assign_shards(connections, tags, 2)
+
+    assert shards == [["a", "d"], ["b", "c"]]
+    assert assign_shards(connections, tags, 8) == [["a"], ["b"], ["c"], ["d"]]
+
+@pytest.mark.asyncio
+async def test_shard_batches_reach_processor():
+    processor = AsyncMock()
+    supervisor = ShardSupervisor(processor)
+    supervisor.queue = SinkQueue("shards", supervisor._consume, merge_shard_messages)
+    supervisor.queue.start()
+    parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+    threading.Thread(target=supervisor._read, args=(parent_conn, asyncio.get_running_loop()), daemon=True).start()
+
+    sink = ShardSink(child_conn)
+    stamp = datetime(2024, 1, 1)
+    await sink.process_batch([("a", 1.0), ("b", 2.0)], stamp)
+    await sink.mark_bad_quality(["c"])
+    for _ in range(100):
+        if processor.mark_bad_quality.await_count:
+            break
+        await asyncio.sleep(0.01)
+
+    processor.process_batch.assert_awaited_once_with([("a", 1.0), ("b", 2.0)], stamp)
+    processor.mark_bad_quality.assert_awaited_once_with(["c"])
+    child_conn.close()
+    await supervisor.close()
+
+def test_shard_config_round_trips_scaled_tags():
+    scaling = Scaling(rawMin=0, rawMax=27648, engMin=0, engMax=100)
+    tag = TagConfig(name="level", address=0, type="int16", unit="%", scaling=scaling)
+    config = settings.app_config.model_copy(update={"tags": [tag]})
+
+    restored = AppConfig.model_validate(shard_config(config))
+
+    assert restored.tags[0].scaling == scaling
+
+class SlowExit:
+    def is_alive(self):
+        return False
+
+    def join(self, timeout=None):
+        import time
+        time.sleep(0.2)
+
+@pytest.mark.asyncio
+async def test_stop_does_not_block_event_loop():
+    supervisor = ShardSupervisor(AsyncMock())
+    supervisor.processes = [SlowExit()]
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    await supervisor.stop()
+    ticker.cancel()
+
+    assert ticks > 5
+    assert supervisor.processes == []
+
+@pytest.mark.asyncio
+async def test_full_shard_queue_conflates_per_tag():
+    original = settings.app_config.pipeline.shards
+    settings.app_config.pipeline.shards = SinkConfig(max_depth=1, overflow="conflate")
+    release = asyncio.Event()
+    handled = []
+
+    async def process_batch(samples, stamp):
+        handled.append((samples, stamp))
+        await release.wait()
+
+    processor = AsyncMock()
+    processor.process_batch = process_batch
+    supervisor = ShardSupervisor(processor)
+    supervisor.queue = SinkQueue("shards", supervisor._consume, merge_shard_messages)
+    supervisor.queue.start()
+    try:
+        first, second, third = datetime(2024, 1, 1, 0, 0, 1), datetime(2024, 1, 1, 0, 0, 2), datetime(2024, 1, 1, 0, 0, 3)
+        await supervisor.queue.put([("batch", [("a", 1.0)], first)])
+        await asyncio.sleep(0.01)  # The processor is now busy with the first batch
+        await supervisor.queue.put([("batch", [("a", 2.0), ("b", 1.0)], second)])
+        await supervisor.queue.put([("bad_quality", ["c"])])
+        await supervisor.queue.put([("batch", [("c", 5.0)], third)])
+        await supervisor.queue.put([("batch", [("b", 3.0)], third)])
+
+        assert len(supervisor.queue) == 1
+        release.set()
+        await supervisor.queue.stop()
+
+        assert handled == [([("a", 1.0)], first), ([("a", 2.0), ("b", 1.0)], second), ([("c", 5.0), ("b", 3.0)], third)]
+        processor.mark_bad_quality.assert_awaited_once_with(["c"])
+    finally:
+        settings.app_config.pipeline.shards = original
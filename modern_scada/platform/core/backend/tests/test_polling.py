@@ -0,0 +1,141 @@
+import asyncio
+import contextlib
+import struct
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.config import PLCConnection, TagConfig
+from app.services.modbus_read_plan import BlockOptimizer, build_read_plan
+from app.workers.polling import ILLEGAL_DATA_ADDRESS, RegisterSnapshot, poll_single_plc, read_block, scan_scheduler, snapshots
+
+CONNECTION = PLCConnection(name="main", host="localhost", port=502, poll_interval=1.0)
+
+class FakePLC:
+    """Holding registers with an unmapped hole the device refuses to read across."""
+    def __init__(self, values, unmapped):
+        self.registers = {}
+        for address, value in values.items():
+            hi, lo = struct.unpack(">HH", struct.pack(">f", value))
+            self.registers[address], self.registers[address + 1] = hi, lo
+        self.unmapped = unmapped
+        self.coils = set()
+        self.requests = []
+
+    async def read_coils(self, address, count=1, device_id=1):
+        self.requests.append(("coil", device_id, address, count))
+        rr = MagicMock()
+        rr.isError.return_value = False
+        rr.bits = [address + i in self.coils for i in range(count)] + [False] * (-count % 8)
+        return rr
+
+    async def read_holding_registers(self, address, count=1, device_id=1):
+        self.requests.append((address, count))
+        rr = MagicMock()
+        if any(address <= a < address + count for a in self.unmapped):
+            rr.isError.return_value = True
+            rr.exception_code = ILLEGAL_DATA_ADDRESS
+        else:
+            rr.isError.return_value = False
+            rr.registers = [self.registers.get(a, 0) for a in range(address, address + count)]
+        return rr
+
+@pytest.mark.asyncio
+async def test_illegal_address_splits_block_and_learns_gap():
+    tags = [TagConfig(name=n, address=a, type="float", unit="", connection_name="main") for n, a in (("a", 0), ("b", 10))]
+    plc = FakePLC({0: 1.5, 10: 2.5}, unmapped=range(4, 8))
+    optimizer = BlockOptimizer()
+    block = build_read_plan("main", tags, optimizer=optimizer).blocks[0]
+
+    samples, clean = await read_block(plc, CONNECTION, block, optimizer)
+
+    assert dict(samples) == {"a": 1.5, "b": 2.5}
+    assert not clean
+    assert plc.requests == [(0, 12), (0, 2), (10, 2)]
+    assert optimizer.bad_ranges == [(2, 10)]
+    assert optimizer.dirty
+
+@pytest.mark.asyncio
+async def test_report_by_exception_dispatches_only_changed_tags():
+    tags = [TagConfig(name=n, address=a, type="float", unit="", connection_name="main") for n, a in (("a", 0), ("b", 2))]
+    plc = FakePLC({0: 1.0, 2: 2.0}, unmapped=())
+    optimizer = BlockOptimizer()
+    block = build_read_plan("main", tags, optimizer=optimizer).blocks[0]
+    snapshot = RegisterSnapshot()
+
+    first, _ = await read_block(plc, CONNECTION, block, optimizer, snapshot, integrity=False)
+    unchanged, _ = await read_block(plc, CONNECTION, block, optimizer, snapshot, integrity=False)
+    plc.registers[2], plc.registers[3] = struct.unpack(">HH", struct.pack(">f", 4.0))
+    changed, _ = await read_block(plc, CONNECTION, block, optimizer, snapshot, integrity=False)
+    integrity, _ = await read_block(plc, CONNECTION, block, optimizer, snapshot, integrity=True)
+
+    assert dict(first) == {"a": 1.0, "b": 2.0}
+    assert unchanged == []
+    assert changed == [("b", 4.0)]
+    assert dict(integrity) == {"a": 1.0, "b": 4.0}
+
+@pytest.mark.asyncio
+async def test_scheduler_reads_each_scan_class_at_its_rate():
+    scans = []
+
+    async def fake_poll(connection, processor, due):
+        scans.append(due)
+
+    with patch("app.workers.polling.find_connection", return_value=CONNECTION), \
+         patch("app.workers.polling.poll_single_plc", side_effect=fake_poll), \
+         patch("app.workers.polling.ReadPlanCache") as cache:
+        cache.get.return_value.scan_rates.return_value = [20, 60]
+        task = asyncio.create_task(scan_scheduler("main", None))
+        while len(scans) < 6:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    assert scans[:6] == [{20, 60}, {20}, {20}, {20, 60}, {20}, {20}]
+
+@pytest.mark.asyncio
+async def test_coil_blocks_use_read_coils_with_unit_id():
+    tags = [
+        TagConfig(name=n, address=a, type="bool", unit="", connection_name="main", function="coil", unit_id=7)
+        for n, a in (("pump", 0), ("fan", 3))
+    ]
+    plc = FakePLC({}, unmapped=())
+    plc.coils = {3}
+    block = build_read_plan("main", tags).blocks[0]
+
+    samples, clean = await read_block(plc, CONNECTION, block, BlockOptimizer(bits=True))
+
+    assert plc.requests == [("coil", 7, 0, 4)]
+    assert dict(samples) == {"pump": 0.0, "fan": 1.0}
+
+@pytest.mark.asyncio
+async def test_tags_go_bad_when_every_block_times_out():
+    tags = [TagConfig(name=n, address=a, type="float", unit="", connection_name="main") for n, a in (("a", 0), ("b", 100))]
+    plc = FakePLC({0: 1.0, 100: 2.0}, unmapped=())
+    client = MagicMock(connected=True)
+    client.read_holding_registers = AsyncMock(side_effect=plc.read_holding_registers)
+    processor = AsyncMock()
+    snapshots.clear()
+
+    with patch("app.workers.polling.ReadPlanCache") as cache, \
+         patch("app.workers.polling.ModbusConnectionManager") as manager, \
+         patch("app.workers.polling.connection_tags", return_value=["a", "b"]):
+        cache.get.return_value.plan_for.return_value = build_read_plan("main", tags)
+        cache.get.return_value.optimizer_for.return_value = BlockOptimizer()
+        cache.get.return_value.needs_replan.return_value = False
+        manager.get.return_value.get_client = AsyncMock(return_value=client)
+        manager.get.return_value.lock.return_value = contextlib.nullcontext()
+
+        await poll_single_plc(CONNECTION, processor)
+        processor.reset_mock()
+        client.read_holding_registers.side_effect = TimeoutError("no response")
+        await poll_single_plc(CONNECTION, processor)
+
+        manager.get.return_value.record_failure.assert_called_once_with(CONNECTION)
+        processor.mark_bad_quality.assert_awaited_once_with(["a", "b"])
+        processor.process_batch.assert_not_awaited()
+
+        # Registers did not change while the device was silent; the first
+        # good scan still has to bring every tag back to good quality
+        client.read_holding_registers.side_effect = plc.read_holding_registers
+        await poll_single_plc(CONNECTION, processor)
+
+    samples, _ = processor.process_batch.await_args.args
+    assert dict(samples) == {"a": 1.0, "b": 2.0}
@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from app.services.current_value_table import CurrentValueTable
+from app.services.rule_replay import REPLAY_QUERY, ReplayJobs, RuleReplay
+
+START = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+END = START + timedelta(hours=1)
+
+RULES = [
+    {"id": "fan", "condition": {"tag": "temp", "operator": ">", "value": 28.0},
+     "constraints": {"min_run_time": 10}, "actions": [{"device_id": "fan_1"}]},
+    {"id": "mister", "condition": {"tag": "hum", "operator": ">", "global_ref": "hum_threshold"},
+     "actions": [{"device_id": "mister", "value": 50.0}]},
+]
+
+def history(rows, chunk_size):
+    """Fake PostgresDB.stream over (minute offset, tag, value) rows."""
+    calls = []
+
+    async def stream(query, *args, chunk_size=chunk_size):
+        calls.append((query, args))
+        records = [(START + timedelta(minutes=minute), tag, value) for minute, tag, value in rows]
+        for i in range(0, len(records), chunk_size):
+            yield records[i:i + chunk_size]
+    return stream, calls
+
+async def run(rows, rules=RULES, chunk_size=2, **kwargs):
+    stream, calls = history(rows, chunk_size)
+    with patch("app.services.rule_replay.PostgresDB.stream", stream):
+        replay = RuleReplay(START, END, rules, {"hum_threshold": 80.0}, chunk_size=chunk_size, **kwargs)
+        result = await replay.run()
+    return result, calls
+
+@pytest.mark.asyncio
+async def test_min_run_time_expires_on_virtual_clock():
+    # temp drops after one minute; the fan has to run 10 minutes anyway
+    result, _ = await run([(0, "temp", 30.0), (1, "temp", 25.0)])
+    assert [(a["rule"], a["device_id"], a["value"], a["time"]) for a in result["actions"]] == [
+        ("fan", "fan_1", 1.0, START.isoformat()),
+        ("fan", "fan_1", 0.0, (START + timedelta(minutes=10)).isoformat()),
+    ]
+    assert result["final_states"]["fan"]["active"] is False
+
+@pytest.mark.asyncio
+async def test_rows_sharing_a_timestamp_form_one_scan_across_chunks():
+    rows = [(0, "temp", 25.0), (0, "hum", 70.0), (0, "outside", 1.0), (5, "hum", 90.0), (5, "temp", 26.0)]
+    result, calls = await run(rows, chunk_size=2)
+    assert result["rows"] == 5
+    assert result["scans"] == 2
+    assert [(a["rule"], a["value"]) for a in result["actions"]] == [("mister", 50.0)]
+
+@pytest.mark.asyncio
+async def test_default_tags_are_the_rule_inputs():
+    result, calls = await run([])
+    assert result["tags"] == ["hum", "temp"]
+    assert calls == [(REPLAY_QUERY, (START, END, ["hum", "temp"]))]
+    assert result["actions"] == []
+
+@pytest.mark.asyncio
+async def test_replay_is_isolated_from_live_state():
+    table = CurrentValueTable.get()
+    table.initialize()
+    with patch("app.services.actuator_dispatcher.ActuatorDispatcher.send") as send:
+        result, _ = await run([(0, "temp", 30.0)])
+    send.assert_not_called()
+    assert len(result["actions"]) == 1
+    assert table.lookup("temp") is None
+
+@pytest.mark.asyncio
+async def test_naive_times_are_utc():
+    stream, _ = history([], 10)
+    with patch("app.services.rule_replay.PostgresDB.stream", stream):
+        replay = RuleReplay(START.replace(tzinfo=None), END.replace(tzinfo=None), RULES, {})
+    assert replay.start == START
+    assert replay.end == END
+
+@pytest.mark.asyncio
+async def test_replay_job_reports_progress_and_result():
+    stream, _ = history([(0, "temp", 30.0)], 10)
+    jobs = ReplayJobs.get()
+    jobs.initialize()
+    with patch("app.services.rule_replay.PostgresDB.stream", stream):
+        job_id = jobs.start(RuleReplay(START, END, RULES, {}))
+        assert jobs.status(job_id)["status"] == "running"
+        await jobs.jobs[job_id]["task"]
+    job = jobs.status(job_id)
+    assert job["status"] == "done"
+    assert job["progress"] == 1.0
+    assert job["result"]["actions"][0]["device_id"] == "fan_1"
+    assert "task" not in job
+    assert jobs.status("missing") is None
+
+@pytest.mark.asyncio
+async def test_failed_replay_job_keeps_error():
+    async def stream(query, *args, chunk_size=0):
+        raise ConnectionError("PostgreSQL pool is not initialized")
+        yield
+    jobs = ReplayJobs.get()
+    jobs.initialize()
+    with patch("app.services.rule_replay.PostgresDB.stream", stream):
+        job_id = jobs.start(RuleReplay(START, END, RULES, {}))
+        await jobs.jobs[job_id]["task"]
+    assert jobs.status(job_id)["status"] == "failed"
+    assert "not initialized" in jobs.status(job_id)["error"]
+
+@pytest.mark.asyncio
+async def test_running_jobs_are_limited_and_cancelled_at_shutdown():
+    started = asyncio.Event()
+
+    async def stream(query, *args, chunk_size=0):
+        started.set()
+        await asyncio.Event().wait()  # A long range still being read
+        yield []
+    jobs = ReplayJobs.get()
+    jobs.initialize()
+    with patch("app.services.rule_replay.PostgresDB.stream", stream):
+        job_id = jobs.start(RuleReplay(START, END, RULES, {}))
+        await started.wait()
+        assert jobs.start(RuleReplay(START, END, RULES, {})) is None
+
+        await jobs.cancel_all()
+    assert jobs.status(job_id)["status"] == "cancelled"
+    assert jobs.running() == 0
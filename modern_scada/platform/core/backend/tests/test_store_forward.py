@@ -0,0 +1,43 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from app.config import settings
+from app.services.store_forward import StoreForwardBuffer
+
+T0 = datetime(2025, 1, 1)
+
+def rows(start, count):
+    return [(T0 + timedelta(seconds=i), f"t{i}", float(i)) for i in range(start, start + count)]
+
+@pytest.fixture
+def buffer():
+    buffer = StoreForwardBuffer.get()
+    buffer.initialize(capacity=8)
+    yield buffer
+    buffer.initialize()
+
+@pytest.mark.asyncio
+async def test_ring_wraps_and_spills_oldest_in_bulk(buffer):
+    with patch("app.services.data_service.DataService.buffer_sensor_data_batch", new=AsyncMock()) as spill:
+        await buffer.push(rows(0, 6))
+        buffer._pop(4)
+        await buffer.push(rows(6, 6))  # Wraps around the end of the ring
+        assert buffer.peek(8) == rows(4, 8)
+        spill.assert_not_awaited()
+
+        await buffer.push(rows(12, 1))
+
+    # One bulk spill: the row that did not fit plus a quarter of the ring
+    spill.assert_awaited_once_with(rows(4, 3))
+    assert buffer.peek(8) == rows(7, 6)
+
+@pytest.mark.asyncio
+async def test_drop_policies(buffer):
+    with patch.object(settings.app_config.store_forward, "overflow", "drop_oldest"):
+        await buffer.push(rows(0, 10))
+    assert buffer.peek(8) == rows(2, 8)
+
+    buffer.initialize(capacity=8)
+    with patch.object(settings.app_config.store_forward, "overflow", "drop_newest"):
+        await buffer.push(rows(0, 10))
+    assert buffer.peek(8) == rows(0, 8)
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from app.config import TagConfig
+from app.services.current_value_table import QUALITY_BAD, CurrentValueTable
+from app.services.tag_filter import HEARTBEAT_GRACE, TagFilter, TagFilterBank
+
+T0 = datetime(2025, 1, 1)
+
+def feed(tag_filter, values, step=1.0):
+    """Offer values one `step` second apart; returns archived (seconds, value) points."""
+    points = []
+    for i, value in enumerate(values):
+        point = tag_filter.offer(T0 + timedelta(seconds=i * step), value)
+        if point is not None:
+            points.append(((point[0] - T0).total_seconds(), point[1]))
+    return points
+
+def test_absolute_deadband_and_heartbeat():
+    tag_filter = TagFilter("temp", deadband=0.5, max_interval=5.0)
+
+    points = feed(tag_filter, [20.0, 20.2, 20.4, 20.6, 20.7, 20.7, 20.7, 20.7, 20.7, 20.7])
+
+    assert points == [(0.0, 20.0), (3.0, 20.6), (8.0, 20.7)]
+
+def test_percent_deadband_and_min_interval():
+    tag_filter = TagFilter("flow", deadband_percent=10.0, min_interval=2.0)
+
+    points = feed(tag_filter, [100.0, 120.0, 120.0, 105.0, 135.0])
+
+    assert points == [(0.0, 100.0), (2.0, 120.0), (4.0, 135.0)]
+
+def test_swinging_door_archives_turning_points_only():
+    tag_filter = TagFilter("level", deadband=0.1, compression="swinging_door")
+
+    # Straight ramp up, then straight ramp down
+    points = feed(tag_filter, [0.0, 1.0, 2.0, 3.0, 4.0, 3.0, 2.0, 1.0])
+
+    assert points == [(0.0, 0.0), (4.0, 4.0)]
+
+def test_swinging_door_min_interval_keeps_held_point_in_the_corridor():
+    tag_filter = TagFilter("level", deadband=1.0, min_interval=3.0, compression="swinging_door")
+
+    # The jump to 10 arrives within min_interval and would close the door
+    points = feed(tag_filter, [0.0, 0.5, 10.0, 20.0])
+
+    assert points == [(0.0, 0.0), (1.0, 0.5)]
+
+def test_bank_heartbeats_tags_that_are_not_resent():
+    bank = TagFilterBank.__new__(TagFilterBank)
+    bank.initialize()
+    bank.configs = {"temp": TagConfig(name="temp", address=0, type="float", unit="", max_interval=10.0)}
+    bank.built = True
+    table = CurrentValueTable.standalone()
+    table.update_batch([("temp", 20.0), ("other", 1.0)], T0)
+    bank.apply({"temp": 20.0, "other": 1.0}, T0)
+
+    # Report by exception: no further samples, the heartbeat still comes
+    assert bank.heartbeats(table, T0 + timedelta(seconds=10)) == []
+    assert bank.heartbeats(table, T0 + timedelta(seconds=10 + HEARTBEAT_GRACE)) == [(T0 + timedelta(seconds=10), "temp", 20.0)]
+    assert bank.heartbeats(table, T0 + timedelta(seconds=11 + HEARTBEAT_GRACE)) == []
+
+    table.set_quality(["temp"], QUALITY_BAD)
+    assert bank.heartbeats(table, T0 + timedelta(seconds=30 + HEARTBEAT_GRACE)) == []
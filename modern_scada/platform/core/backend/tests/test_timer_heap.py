@@ -0,0 +1,24 @@
+from app.services.timer_heap import TimerHeap
+
+def test_pops_only_expired_timers_in_order():
+    timers = TimerHeap()
+    timers.schedule("b", 20.0)
+    timers.schedule("a", 10.0)
+    timers.schedule("c", 30.0)
+
+    assert timers.next_deadline() == 10.0
+    assert timers.pop_due(25.0) == ["a", "b"]
+    assert len(timers) == 1
+    assert timers.pop_due(25.0) == []
+
+def test_reschedule_and_cancel_skip_stale_entries():
+    timers = TimerHeap()
+    timers.schedule("a", 10.0)
+    timers.schedule("b", 15.0)
+    timers.schedule("a", 40.0)
+    timers.cancel("b")
+
+    assert timers.next_deadline() == 40.0
+    assert timers.pop_due(30.0) == []
+    assert timers.pop_due(40.0) == ["a"]
+    assert timers.next_deadline() is None
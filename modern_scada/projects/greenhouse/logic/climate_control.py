@@ -1,8 +1,12 @@
+import asyncio
 import logging
-from app.services.device_control_service import DeviceControlService
+from app.services.actuator_dispatcher import ActuatorDispatcher
 
 logger = logging.getLogger(__name__)
 
+# Only run when one of these tags changes
+INPUTS = [f"sensor_01_{level}_{kind}" for level in ("top", "mid", "bot") for kind in ("temp", "hum")]
+
 async def run(context):
     """
     Climate Control Logic
@@ -37,10 +41,13 @@ async def run(context):
         logger.info("Climate Control: Conditions OK -> Cooling OFF")
 
     # 3. Execute Control
-    # Control Fans
-    await DeviceControlService.send_control_command("fan_01", "SET", "status", target_state)
-    await DeviceControlService.send_control_command("fan_02", "SET", "status", target_state)
-    
-    # Control Water Walls
-    await DeviceControlService.send_control_command("ww_01", "SET", "status", target_state)
-    await DeviceControlService.send_control_command("ww_02", "SET", "status", target_state)
+    # Unchanged commands are skipped; the four devices are written concurrently
+    dispatcher = ActuatorDispatcher.get()
+    await asyncio.gather(
+        # Control Fans
+        dispatcher.send("fan_01", "SET", "status", target_state),
+        dispatcher.send("fan_02", "SET", "status", target_state),
+        # Control Water Walls
+        dispatcher.send("ww_01", "SET", "status", target_state),
+        dispatcher.send("ww_02", "SET", "status", target_state),
+    )
@@ -1,9 +1,11 @@
 import logging
 import asyncio
-from app.services.device_control_service import DeviceControlService
+from app.services.actuator_dispatcher import ActuatorDispatcher
 
 logger = logging.getLogger(__name__)
 
+INPUTS = ["mixer_level"]
+
 async def run(context):
     """
     Nutrient Control Logic
@@ -21,7 +23,7 @@ async def run(context):
         # 1. Open Dosing Valves (Simulated by writing to simulator registers if they existed)
         # The simulator logic increases mixer level if register 300 is 1.0
         
-        await DeviceControlService.send_control_command("mixer_main", "SET", "cmd_mix_start", 1.0)
+        await ActuatorDispatcher.get().send("mixer_main", "SET", "cmd_mix_start", 1.0)
         
         # Wait for a bit (in a real logic engine, we might not want to block, 
         # but this script runs in a background task so it's okay for short durations)
@@ -29,4 +31,4 @@ async def run(context):
         
     elif mixer_level > 15000:
         logger.info("Nutrient Control: Mixer full. Stopping batch.")
-        await DeviceControlService.send_control_command("mixer_main", "SET", "cmd_mix_start", 0.0)
+        await ActuatorDispatcher.get().send("mixer_main", "SET", "cmd_mix_start", 0.0)
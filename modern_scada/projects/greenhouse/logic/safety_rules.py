@@ -1,3 +1,5 @@
+INPUTS = ["temp_sensor_01"]
+
 def process_tags(tags):
     """
     Project specific logic hook.